@@ -0,0 +1,999 @@
+/* Native core of red_black.RedBlackTree
+ *
+ * - Node: the tree node stored as a C struct (key, value, left, right,
+ *   parent, red), with the same attributes as red_black.Node
+ * - search, insert and delete_node: the CLRS descent, fixups and
+ *   rotations of RedBlackTree.search, insert and delete_node, run over
+ *   those structs; red_black.py uses them when a tree's nodes come from
+ *   here and none of the methods they replace are overridden
+ * - walk: in-order (or reverse) iterator over nodes, keys, values or
+ *   items, following parent pointers like RedBlackTree._walk
+ *
+ * Keys are compared with < and == exactly as the Python code compares
+ * them, with a shortcut for pairs of small ints and pairs of floats.
+ * Every link is a strong reference; the parent/child cycles are left to
+ * the cyclic garbage collector, as with the pure-Python nodes.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stddef.h>
+
+#if PY_MAJOR_VERSION < 3
+#error "the _red_black extension needs Python 3; red_black.py falls back to pure Python"
+#endif
+
+typedef struct NodeObject {
+    PyObject_HEAD
+    PyObject *key;
+    PyObject *value;
+    struct NodeObject *left;
+    struct NodeObject *right;
+    struct NodeObject *parent;
+    char red;
+} NodeObject;
+
+static PyTypeObject NodeType;
+
+#define Node_Check(op) PyObject_TypeCheck(op, &NodeType)
+
+/* Replace the strong reference in field with one to value (may be NULL) */
+#define SET_LINK(field, value)              \
+    do {                                    \
+        NodeObject *_old = (field);         \
+        NodeObject *_new = (value);         \
+        Py_XINCREF(_new);                   \
+        (field) = _new;                     \
+        Py_XDECREF(_old);                   \
+    } while (0)
+
+static PyObject *
+corrupt(void)
+{
+    PyErr_SetString(PyExc_RuntimeError, "tree links are broken");
+    return NULL;
+}
+
+/* Key comparisons: 1 true, 0 false, -1 error */
+
+static int
+small_ints(PyObject *a, PyObject *b, long *x, long *y)
+{
+    int overflow;
+    if (!PyLong_CheckExact(a) || !PyLong_CheckExact(b))
+        return 0;
+    *x = PyLong_AsLongAndOverflow(a, &overflow);
+    if (overflow)
+        return 0;
+    *y = PyLong_AsLongAndOverflow(b, &overflow);
+    return !overflow;
+}
+
+static int
+compare(PyObject *a, PyObject *b, int op)
+{
+    long x, y;
+    PyObject *result;
+    int truth;
+
+    if (small_ints(a, b, &x, &y))
+        return op == Py_LT ? x < y : x == y;
+    if (PyFloat_CheckExact(a) && PyFloat_CheckExact(b)) {
+        double u = PyFloat_AS_DOUBLE(a), v = PyFloat_AS_DOUBLE(b);
+        return op == Py_LT ? u < v : u == v;
+    }
+    /* Not PyObject_RichCompareBool, whose identity shortcut would make
+     * a NaN key equal to itself where the Python code finds it unequal */
+    result = PyObject_RichCompare(a, b, op);
+    if (result == NULL)
+        return -1;
+    truth = PyObject_IsTrue(result);
+    Py_DECREF(result);
+    return truth;
+}
+
+/* Node */
+
+static PyObject *
+Node_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    NodeObject *self = (NodeObject *)type->tp_alloc(type, 0);
+    if (self == NULL)
+        return NULL;
+    Py_INCREF(Py_None);
+    self->key = Py_None;
+    Py_INCREF(Py_None);
+    self->value = Py_None;
+    return (PyObject *)self;
+}
+
+static int
+Node_init(NodeObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *keywords[] = {"key", "value", NULL};
+    PyObject *key, *value = Py_None, *old;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:Node", keywords, &key, &value))
+        return -1;
+    old = self->key;
+    Py_INCREF(key);
+    self->key = key;
+    Py_XDECREF(old);
+    old = self->value;
+    Py_INCREF(value);
+    self->value = value;
+    Py_XDECREF(old);
+    return 0;
+}
+
+static int
+Node_traverse(NodeObject *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->key);
+    Py_VISIT(self->value);
+    Py_VISIT(self->left);
+    Py_VISIT(self->right);
+    Py_VISIT(self->parent);
+    return 0;
+}
+
+static int
+Node_clear(NodeObject *self)
+{
+    Py_CLEAR(self->key);
+    Py_CLEAR(self->value);
+    Py_CLEAR(self->left);
+    Py_CLEAR(self->right);
+    Py_CLEAR(self->parent);
+    return 0;
+}
+
+static void
+Node_dealloc(NodeObject *self)
+{
+    PyObject_GC_UnTrack(self);
+    Node_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *
+Node_get_object(NodeObject *self, void *closure)
+{
+    PyObject *value = *(PyObject **)((char *)self + (Py_ssize_t)closure);
+    if (value == NULL)
+        value = Py_None;
+    Py_INCREF(value);
+    return value;
+}
+
+static int
+Node_set_object(NodeObject *self, PyObject *value, void *closure)
+{
+    PyObject **field = (PyObject **)((char *)self + (Py_ssize_t)closure);
+    PyObject *old = *field;
+    if (value == NULL) {
+        PyErr_SetString(PyExc_AttributeError, "node attributes cannot be deleted");
+        return -1;
+    }
+    Py_INCREF(value);
+    *field = value;
+    Py_XDECREF(old);
+    return 0;
+}
+
+/* left, right and parent hold nodes (None reads back as no link), so
+ * the C code can follow them without checking types at every step */
+static int
+Node_set_link(NodeObject *self, PyObject *value, void *closure)
+{
+    NodeObject **field = (NodeObject **)((char *)self + (Py_ssize_t)closure);
+    if (value == NULL) {
+        PyErr_SetString(PyExc_AttributeError, "node attributes cannot be deleted");
+        return -1;
+    }
+    if (value == Py_None) {
+        SET_LINK(*field, NULL);
+        return 0;
+    }
+    if (!Node_Check(value)) {
+        PyErr_Format(PyExc_TypeError, "links must be nodes, not %.200s", Py_TYPE(value)->tp_name);
+        return -1;
+    }
+    SET_LINK(*field, (NodeObject *)value);
+    return 0;
+}
+
+static PyObject *
+Node_get_red(NodeObject *self, void *closure)
+{
+    return PyBool_FromLong(self->red);
+}
+
+static int
+Node_set_red(NodeObject *self, PyObject *value, void *closure)
+{
+    int truth;
+    if (value == NULL) {
+        PyErr_SetString(PyExc_AttributeError, "node attributes cannot be deleted");
+        return -1;
+    }
+    truth = PyObject_IsTrue(value);
+    if (truth < 0)
+        return -1;
+    self->red = (char)truth;
+    return 0;
+}
+
+#define OFFSET(field) ((void *)offsetof(NodeObject, field))
+
+static PyGetSetDef Node_getset[] = {
+    {"key", (getter)Node_get_object, (setter)Node_set_object, NULL, OFFSET(key)},
+    {"value", (getter)Node_get_object, (setter)Node_set_object, NULL, OFFSET(value)},
+    {"left", (getter)Node_get_object, (setter)Node_set_link, NULL, OFFSET(left)},
+    {"right", (getter)Node_get_object, (setter)Node_set_link, NULL, OFFSET(right)},
+    {"parent", (getter)Node_get_object, (setter)Node_set_link, NULL, OFFSET(parent)},
+    {"red", (getter)Node_get_red, (setter)Node_set_red, NULL, NULL},
+    {NULL}
+};
+
+static PyTypeObject NodeType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_red_black.Node",
+    .tp_basicsize = sizeof(NodeObject),
+    .tp_dealloc = (destructor)Node_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC,
+    .tp_doc = "Red-Black Tree Node stored as a C struct",
+    .tp_traverse = (traverseproc)Node_traverse,
+    .tp_clear = (inquiry)Node_clear,
+    .tp_getset = Node_getset,
+    .tp_init = (initproc)Node_init,
+    .tp_new = Node_new,
+};
+
+/* Trees: the root is read from and written back to tree.root, nil is tree.nil */
+
+static PyObject *str_root;
+static PyObject *str_nil;
+
+typedef struct {
+    PyObject *tree;
+    NodeObject *root;  /* strong */
+    NodeObject *nil;   /* strong */
+    NodeObject *original_root;  /* borrowed, to see if root moved */
+} Tree;
+
+static int
+tree_open(Tree *t, PyObject *tree)
+{
+    PyObject *root, *nil;
+
+    t->tree = tree;
+    t->root = t->nil = NULL;
+    root = PyObject_GetAttr(tree, str_root);
+    if (root == NULL)
+        return -1;
+    nil = PyObject_GetAttr(tree, str_nil);
+    if (nil == NULL) {
+        Py_DECREF(root);
+        return -1;
+    }
+    if (!Node_Check(root) || !Node_Check(nil)) {
+        Py_DECREF(root);
+        Py_DECREF(nil);
+        PyErr_SetString(PyExc_TypeError, "tree nodes must come from _red_black.Node");
+        return -1;
+    }
+    t->root = (NodeObject *)root;
+    t->nil = (NodeObject *)nil;
+    t->original_root = t->root;
+    return 0;
+}
+
+/* Write a moved root back to the tree and drop the references; returns
+ * result, or NULL if result is NULL or writing the root failed */
+static PyObject *
+tree_close(Tree *t, PyObject *result)
+{
+    if (t->root != t->original_root && result != NULL) {
+        if (PyObject_SetAttr(t->tree, str_root, (PyObject *)t->root) < 0)
+            Py_CLEAR(result);
+    }
+    Py_XDECREF(t->root);
+    Py_XDECREF(t->nil);
+    return result;
+}
+
+static void
+left_rotate(Tree *t, NodeObject *x)
+{
+    NodeObject *nil = t->nil;
+    NodeObject *y = x->right;
+
+    Py_INCREF(x);
+    Py_INCREF(y);
+    SET_LINK(x->right, y->left);
+    if (y->left != nil)
+        SET_LINK(y->left->parent, x);
+    SET_LINK(y->parent, x->parent);
+    if (x->parent == nil)
+        SET_LINK(t->root, y);
+    else if (x == x->parent->left)
+        SET_LINK(x->parent->left, y);
+    else
+        SET_LINK(x->parent->right, y);
+    SET_LINK(y->left, x);
+    SET_LINK(x->parent, y);
+    Py_DECREF(y);
+    Py_DECREF(x);
+}
+
+static void
+right_rotate(Tree *t, NodeObject *y)
+{
+    NodeObject *nil = t->nil;
+    NodeObject *x = y->left;
+
+    Py_INCREF(x);
+    Py_INCREF(y);
+    SET_LINK(y->left, x->right);
+    if (x->right != nil)
+        SET_LINK(x->right->parent, y);
+    SET_LINK(x->parent, y->parent);
+    if (y->parent == nil)
+        SET_LINK(t->root, x);
+    else if (y == y->parent->right)
+        SET_LINK(y->parent->right, x);
+    else
+        SET_LINK(y->parent->left, x);
+    SET_LINK(x->right, y);
+    SET_LINK(y->parent, x);
+    Py_DECREF(y);
+    Py_DECREF(x);
+}
+
+/* RedBlackTree.insert_fixup; returns whether the black height grew */
+static int
+insert_fixup(Tree *t, NodeObject *node)
+{
+    NodeObject *uncle;
+    int grew;
+
+    while (node->parent->red) {
+        NodeObject *parent = node->parent;
+        NodeObject *grandparent = parent->parent;
+        if (parent == grandparent->left) {
+            uncle = grandparent->right;
+            if (uncle->red) {
+                parent->red = 0;
+                uncle->red = 0;
+                grandparent->red = 1;
+                node = grandparent;
+            }
+            else {
+                if (node == parent->right) {
+                    node = parent;
+                    left_rotate(t, node);
+                }
+                node->parent->red = 0;
+                node->parent->parent->red = 1;
+                right_rotate(t, node->parent->parent);
+            }
+        }
+        else {
+            uncle = grandparent->left;
+            if (uncle->red) {
+                parent->red = 0;
+                uncle->red = 0;
+                grandparent->red = 1;
+                node = grandparent;
+            }
+            else {
+                if (node == parent->left) {
+                    node = parent;
+                    right_rotate(t, node);
+                }
+                node->parent->red = 0;
+                node->parent->parent->red = 1;
+                left_rotate(t, node->parent->parent);
+            }
+        }
+    }
+    grew = t->root->red;
+    t->root->red = 0;
+    return grew;
+}
+
+static void
+transplant(Tree *t, NodeObject *u, NodeObject *v)
+{
+    if (u->parent == t->nil)
+        SET_LINK(t->root, v);
+    else if (u == u->parent->left)
+        SET_LINK(u->parent->left, v);
+    else
+        SET_LINK(u->parent->right, v);
+    if (v != t->nil)
+        SET_LINK(v->parent, u->parent);
+}
+
+/* RedBlackTree.delete_node_fixup; returns whether the black height shrank */
+static int
+delete_fixup(Tree *t, NodeObject *node, NodeObject *parent)
+{
+    NodeObject *sibling;
+    int rebalanced = 0, shrank;
+
+    while (node != t->root && !node->red) {
+        if (node == parent->left) {
+            sibling = parent->right;
+            if (sibling->red) {
+                sibling->red = 0;
+                parent->red = 1;
+                left_rotate(t, parent);
+                sibling = parent->right;
+            }
+            if (!sibling->left->red && !sibling->right->red) {
+                sibling->red = 1;
+                node = parent;
+                parent = node->parent;
+            }
+            else {
+                if (!sibling->right->red) {
+                    sibling->left->red = 0;
+                    sibling->red = 1;
+                    right_rotate(t, sibling);
+                    sibling = parent->right;
+                }
+                sibling->red = parent->red;
+                parent->red = 0;
+                sibling->right->red = 0;
+                left_rotate(t, parent);
+                node = t->root;
+                rebalanced = 1;
+            }
+        }
+        else {
+            sibling = parent->left;
+            if (sibling->red) {
+                sibling->red = 0;
+                parent->red = 1;
+                right_rotate(t, parent);
+                sibling = parent->left;
+            }
+            if (!sibling->right->red && !sibling->left->red) {
+                sibling->red = 1;
+                node = parent;
+                parent = node->parent;
+            }
+            else {
+                if (!sibling->left->red) {
+                    sibling->right->red = 0;
+                    sibling->red = 1;
+                    left_rotate(t, sibling);
+                    sibling = parent->left;
+                }
+                sibling->red = parent->red;
+                parent->red = 0;
+                sibling->left->red = 0;
+                right_rotate(t, parent);
+                node = t->root;
+                rebalanced = 1;
+            }
+        }
+    }
+    shrank = !rebalanced && !node->red;
+    node->red = 0;
+    return shrank;
+}
+
+/* Which way search goes from a node holding node_key: 0 found, 1 left,
+ * 2 right, -1 error; equality is tested first, as in RedBlackTree.search */
+static int
+direction(PyObject *key, PyObject *node_key)
+{
+    long x, y;
+    int result;
+
+    if (small_ints(key, node_key, &x, &y))
+        return x == y ? 0 : x < y ? 1 : 2;
+    result = compare(key, node_key, Py_EQ);
+    if (result != 0)
+        return result < 0 ? -1 : 0;
+    result = compare(key, node_key, Py_LT);
+    if (result < 0)
+        return -1;
+    return result ? 1 : 2;
+}
+
+PyDoc_STRVAR(search_doc,
+"search(root, nil, key)\n--\n\n"
+"Node holding key in the subtree at root, else nil");
+
+static PyObject *
+rb_search(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    NodeObject *node, *nil;
+    PyObject *key;
+
+    if (nargs != 3) {
+        PyErr_SetString(PyExc_TypeError, "search takes root, nil and key");
+        return NULL;
+    }
+    if (!Node_Check(args[0]) || !Node_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "root and nil must be _red_black.Node");
+        return NULL;
+    }
+    node = (NodeObject *)args[0];
+    nil = (NodeObject *)args[1];
+    key = args[2];
+    /* A comparison can run Python code that deletes nodes or rebinds
+     * keys, so the current node and its key are held across it, and the
+     * link taken afterwards is checked again */
+    Py_INCREF(node);
+    while (node != nil) {
+        NodeObject *next;
+        PyObject *node_key = node->key;
+        int way;
+        if (node_key == NULL) {
+            Py_DECREF(node);
+            return corrupt();
+        }
+        Py_INCREF(node_key);
+        way = direction(key, node_key);
+        Py_DECREF(node_key);
+        if (way < 0) {
+            Py_DECREF(node);
+            return NULL;
+        }
+        if (way == 0)
+            break;
+        next = way == 1 ? node->left : node->right;
+        if (next == NULL) {
+            Py_DECREF(node);
+            return corrupt();
+        }
+        Py_INCREF(next);
+        Py_DECREF(node);
+        node = next;
+    }
+    return (PyObject *)node;
+}
+
+PyDoc_STRVAR(bounds_doc,
+"bounds(root, nil, probes, upper)\n--\n\n"
+"For each probe of the ascending sequence probes, the last node in the\n"
+"subtree at root with a key <= probe (upper true) or else the first\n"
+"with a key >= probe, None where there is none, as a list");
+
+/* New reference to the bound of probe in the subtree at root, or to nil;
+ * NULL on error. The current node and its key are held across each
+ * comparison, as in search */
+static NodeObject *
+bound(NodeObject *root, NodeObject *nil, PyObject *probe, int upper)
+{
+    NodeObject *node = root, *found = nil;
+
+    Py_INCREF(found);
+    Py_INCREF(node);
+    while (node != nil) {
+        NodeObject *next;
+        PyObject *node_key = node->key;
+        int less;
+        if (node_key == NULL) {
+            Py_DECREF(node);
+            Py_DECREF(found);
+            return (NodeObject *)corrupt();
+        }
+        Py_INCREF(node_key);
+        less = upper ? compare(probe, node_key, Py_LT) : compare(node_key, probe, Py_LT);
+        Py_DECREF(node_key);
+        if (less < 0) {
+            Py_DECREF(node);
+            Py_DECREF(found);
+            return NULL;
+        }
+        if (!less) {
+            NodeObject *old = found;
+            Py_INCREF(node);
+            found = node;
+            Py_DECREF(old);
+        }
+        /* A floor goes left of keys above probe, a ceiling right of keys below */
+        next = less == upper ? node->left : node->right;
+        if (next == NULL) {
+            Py_DECREF(node);
+            Py_DECREF(found);
+            return (NodeObject *)corrupt();
+        }
+        Py_INCREF(next);
+        Py_DECREF(node);
+        node = next;
+    }
+    Py_DECREF(node);
+    return found;
+}
+
+static PyObject *
+rb_bounds(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    NodeObject *root, *nil;
+    PyObject *probes, *results, *previous = NULL;
+    Py_ssize_t i, n;
+    int upper;
+
+    if (nargs != 4) {
+        PyErr_SetString(PyExc_TypeError, "bounds takes root, nil, probes and upper");
+        return NULL;
+    }
+    if (!Node_Check(args[0]) || !Node_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "root and nil must be _red_black.Node");
+        return NULL;
+    }
+    root = (NodeObject *)args[0];
+    nil = (NodeObject *)args[1];
+    if ((upper = PyObject_IsTrue(args[3])) < 0)
+        return NULL;
+    /* A tuple, which no comparison can shrink under the loop */
+    probes = PySequence_Tuple(args[2]);
+    if (probes == NULL)
+        return NULL;
+    n = PyTuple_GET_SIZE(probes);
+    results = PyList_New(n);
+    if (results == NULL) {
+        Py_DECREF(probes);
+        return NULL;
+    }
+    for (i = 0; i < n; i++) {
+        PyObject *probe = PyTuple_GET_ITEM(probes, i);
+        NodeObject *node;
+        if (previous != NULL) {
+            int unsorted = compare(probe, previous, Py_LT);
+            if (unsorted) {
+                if (unsorted > 0)
+                    PyErr_SetString(PyExc_ValueError, "probes are not sorted");
+                goto error;
+            }
+        }
+        previous = probe;
+        node = bound(root, nil, probe, upper);
+        if (node == NULL)
+            goto error;
+        if (node == nil) {
+            Py_DECREF(node);
+            Py_INCREF(Py_None);
+            PyList_SET_ITEM(results, i, Py_None);
+        }
+        else
+            PyList_SET_ITEM(results, i, (PyObject *)node);
+    }
+    Py_DECREF(probes);
+    return results;
+
+error:
+    Py_DECREF(probes);
+    Py_DECREF(results);
+    return NULL;
+}
+
+PyDoc_STRVAR(insert_doc,
+"insert(tree, node, unique=False)\n--\n\n"
+"Descend to node.key, attach node as a red leaf and repair the tree,\n"
+"returning whether its black height grew\n\n"
+"With unique true, a node already holding an equal key ends the\n"
+"descent and is returned instead, node left unlinked");
+
+static PyObject *
+rb_insert(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    Tree t;
+    NodeObject *node, *nil, *x, *y;
+    int less = 0, grew, unique = 0;
+
+    if (nargs != 2 && nargs != 3) {
+        PyErr_SetString(PyExc_TypeError, "insert takes tree, node and optionally unique");
+        return NULL;
+    }
+    if (!Node_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "node must be a _red_black.Node");
+        return NULL;
+    }
+    if (nargs == 3 && (unique = PyObject_IsTrue(args[2])) < 0)
+        return NULL;
+    node = (NodeObject *)args[1];
+    if (tree_open(&t, args[0]) < 0)
+        return NULL;
+    nil = t.nil;
+
+    /* y and the keys are held across each comparison, as in search */
+    y = nil;
+    Py_INCREF(y);
+    x = t.root;
+    while (x != nil) {
+        PyObject *key = node->key, *x_key;
+        if (x == NULL || key == NULL || x->key == NULL) {
+            Py_DECREF(y);
+            return tree_close(&t, corrupt());
+        }
+        Py_INCREF(x);
+        Py_DECREF(y);
+        y = x;
+        x_key = y->key;
+        Py_INCREF(key);
+        Py_INCREF(x_key);
+        if (unique) {
+            int way = direction(key, x_key);
+            less = way < 0 ? -1 : way == 1;
+            if (way == 0) {
+                Py_DECREF(key);
+                Py_DECREF(x_key);
+                /* The reference held on y passes to the caller */
+                return tree_close(&t, (PyObject *)y);
+            }
+        }
+        else
+            less = compare(key, x_key, Py_LT);
+        Py_DECREF(key);
+        Py_DECREF(x_key);
+        if (less < 0) {
+            Py_DECREF(y);
+            return tree_close(&t, NULL);
+        }
+        x = less ? y->left : y->right;
+    }
+
+    SET_LINK(node->parent, y);
+    if (y == nil)
+        SET_LINK(t.root, node);
+    else if (less)
+        SET_LINK(y->left, node);
+    else
+        SET_LINK(y->right, node);
+    SET_LINK(node->left, nil);
+    SET_LINK(node->right, nil);
+    node->red = 1;
+
+    grew = insert_fixup(&t, node);
+    Py_DECREF(y);
+    return tree_close(&t, PyBool_FromLong(grew));
+}
+
+PyDoc_STRVAR(delete_node_doc,
+"delete_node(tree, node)\n--\n\n"
+"Remove node from tree and repair it, returning whether its black\n"
+"height shrank");
+
+static PyObject *
+rb_delete_node(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    Tree t;
+    NodeObject *node, *nil, *x, *x_parent, *y;
+    int y_was_red, shrank = 0;
+
+    if (nargs != 2) {
+        PyErr_SetString(PyExc_TypeError, "delete_node takes tree and node");
+        return NULL;
+    }
+    if (!Node_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "node must be a _red_black.Node");
+        return NULL;
+    }
+    node = (NodeObject *)args[1];
+    if (tree_open(&t, args[0]) < 0)
+        return NULL;
+    nil = t.nil;
+    if (node == nil || node->left == NULL || node->right == NULL || node->parent == NULL)
+        return tree_close(&t, corrupt());
+
+    /* y may lose its last reference while it is being moved */
+    y = node;
+    Py_INCREF(y);
+    y_was_red = y->red;
+    if (node->left == nil) {
+        x = node->right;
+        x_parent = node->parent;
+        transplant(&t, node, node->right);
+    }
+    else if (node->right == nil) {
+        x = node->left;
+        x_parent = node->parent;
+        transplant(&t, node, node->left);
+    }
+    else {
+        Py_DECREF(y);
+        y = node->right;
+        while (y->left != nil)
+            y = y->left;
+        Py_INCREF(y);
+        y_was_red = y->red;
+        x = y->right;
+        if (y->parent == node) {
+            x_parent = y;
+        }
+        else {
+            x_parent = y->parent;
+            transplant(&t, y, y->right);
+            SET_LINK(y->right, node->right);
+            SET_LINK(y->right->parent, y);
+        }
+        transplant(&t, node, y);
+        SET_LINK(y->left, node->left);
+        SET_LINK(y->left->parent, y);
+        y->red = node->red;
+    }
+
+    if (!y_was_red)
+        shrank = delete_fixup(&t, x, x_parent);
+    Py_DECREF(y);
+    return tree_close(&t, PyBool_FromLong(shrank));
+}
+
+/* walk */
+
+enum { WALK_NODES, WALK_KEYS, WALK_VALUES, WALK_ITEMS };
+
+typedef struct {
+    PyObject_HEAD
+    NodeObject *node;
+    NodeObject *nil;
+    int reverse;
+    int mode;
+} WalkObject;
+
+static PyTypeObject WalkType;
+
+static void
+Walk_dealloc(WalkObject *self)
+{
+    Py_XDECREF(self->node);
+    Py_XDECREF(self->nil);
+    PyObject_Free(self);
+}
+
+static PyObject *
+Walk_next(WalkObject *self)
+{
+    NodeObject *node = self->node, *nil = self->nil, *next, *parent;
+    PyObject *result;
+
+    if (node == nil)
+        return NULL;
+    switch (self->mode) {
+    case WALK_KEYS:
+        result = node->key;
+        Py_INCREF(result);
+        break;
+    case WALK_VALUES:
+        result = node->value;
+        Py_INCREF(result);
+        break;
+    case WALK_ITEMS:
+        result = PyTuple_Pack(2, node->key, node->value);
+        if (result == NULL)
+            return NULL;
+        break;
+    default:
+        result = (PyObject *)node;
+        Py_INCREF(result);
+    }
+
+    if (self->reverse) {
+        if (node->left != nil) {
+            next = node->left;
+            while (next != NULL && next->right != nil)
+                next = next->right;
+        }
+        else {
+            next = node;
+            parent = node->parent;
+            while (parent != NULL && parent != nil && next == parent->left) {
+                next = parent;
+                parent = next->parent;
+            }
+            next = parent;
+        }
+    }
+    else {
+        if (node->right != nil) {
+            next = node->right;
+            while (next != NULL && next->left != nil)
+                next = next->left;
+        }
+        else {
+            next = node;
+            parent = node->parent;
+            while (parent != NULL && parent != nil && next == parent->right) {
+                next = parent;
+                parent = next->parent;
+            }
+            next = parent;
+        }
+    }
+    if (next == NULL) {
+        Py_DECREF(result);
+        return corrupt();
+    }
+    Py_INCREF(next);
+    self->node = next;
+    Py_DECREF(node);
+    return result;
+}
+
+static PyTypeObject WalkType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_red_black.walk",
+    .tp_basicsize = sizeof(WalkObject),
+    .tp_dealloc = (destructor)Walk_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "In-order iterator over a tree's nodes",
+    .tp_iter = PyObject_SelfIter,
+    .tp_iternext = (iternextfunc)Walk_next,
+};
+
+PyDoc_STRVAR(walk_doc,
+"walk(node, nil, reverse=False, mode=0)\n--\n\n"
+"Iterator from node in order (reverse order if reverse) over the nodes\n"
+"(mode 0), keys (1), values (2) or (key, value) items (3)");
+
+static PyObject *
+rb_walk(PyObject *module, PyObject *args)
+{
+    PyObject *node, *nil;
+    int reverse = 0, mode = WALK_NODES;
+    WalkObject *walk;
+
+    if (!PyArg_ParseTuple(args, "O!O!|pi:walk", &NodeType, &node, &NodeType, &nil, &reverse, &mode))
+        return NULL;
+    if (mode < WALK_NODES || mode > WALK_ITEMS) {
+        PyErr_SetString(PyExc_ValueError, "mode must be 0, 1, 2 or 3");
+        return NULL;
+    }
+    walk = PyObject_New(WalkObject, &WalkType);
+    if (walk == NULL)
+        return NULL;
+    Py_INCREF(node);
+    walk->node = (NodeObject *)node;
+    Py_INCREF(nil);
+    walk->nil = (NodeObject *)nil;
+    walk->reverse = reverse;
+    walk->mode = mode;
+    return (PyObject *)walk;
+}
+
+static PyMethodDef module_methods[] = {
+    {"search", (PyCFunction)(void (*)(void))rb_search, METH_FASTCALL, search_doc},
+    {"bounds", (PyCFunction)(void (*)(void))rb_bounds, METH_FASTCALL, bounds_doc},
+    {"insert", (PyCFunction)(void (*)(void))rb_insert, METH_FASTCALL, insert_doc},
+    {"delete_node", (PyCFunction)(void (*)(void))rb_delete_node, METH_FASTCALL, delete_node_doc},
+    {"walk", (PyCFunction)rb_walk, METH_VARARGS, walk_doc},
+    {NULL}
+};
+
+static struct PyModuleDef module_definition = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_red_black",
+    .m_doc = "Native core of red_black.RedBlackTree",
+    .m_size = -1,
+    .m_methods = module_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__red_black(void)
+{
+    PyObject *module;
+
+    if (PyType_Ready(&NodeType) < 0 || PyType_Ready(&WalkType) < 0)
+        return NULL;
+    str_root = PyUnicode_InternFromString("root");
+    str_nil = PyUnicode_InternFromString("nil");
+    if (str_root == NULL || str_nil == NULL)
+        return NULL;
+    module = PyModule_Create(&module_definition);
+    if (module == NULL)
+        return NULL;
+    Py_INCREF(&NodeType);
+    if (PyModule_AddObject(module, "Node", (PyObject *)&NodeType) < 0) {
+        Py_DECREF(&NodeType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
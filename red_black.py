@@ -1,10 +1,98 @@
-import timeit
+import gc
+import heapq
+
+from itertools import chain, groupby, repeat
+from operator import attrgetter, itemgetter
+
+try:
+    from time import perf_counter as clock
+except ImportError:  # Python 2
+    from timeit import default_timer as clock
+
+try:
+    from itertools import imap
+except ImportError:  # Python 3
+    imap = map
+
+# Structural counters kept by RedBlackTree while collect_stats is set
+STAT_COUNTERS = (
+    'left_rotations', 'right_rotations', 'recolorings',
+    'insert_case_1', 'insert_case_2', 'insert_case_3',
+    'delete_case_1', 'delete_case_2', 'delete_case_3', 'delete_case_4',
+    'descents', 'descent_depth', 'max_descent_depth',
+)
+
+class Profiler(object):
+    """Per-phase timing sink for RedBlackTree
+    - Attach to RedBlackTree.profiler; any callable taking (phase, seconds) works too
+    - Phases: descent (insert's descent and attach, delete_key's
+      search), splice (delete_node unlinking the node), fixup, rotation,
+      transplant
+    - Each phase keeps a cumulative total, a sample count and a histogram
+      of sample durations in power-of-two nanosecond buckets"""
+    PHASES = ('descent', 'splice', 'fixup', 'rotation', 'transplant')
+    BUCKETS = 48
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.totals = dict((phase, 0.0) for phase in self.PHASES)
+        self.counts = dict((phase, 0) for phase in self.PHASES)
+        self.histograms = dict((phase, [0] * self.BUCKETS) for phase in self.PHASES)
+
+    def __call__(self, phase, elapsed):
+        if phase not in self.totals:
+            self.totals[phase] = 0.0
+            self.counts[phase] = 0
+            self.histograms[phase] = [0] * self.BUCKETS
+        self.totals[phase] += elapsed
+        self.counts[phase] += 1
+        bucket = int(elapsed * 1e9).bit_length()
+        self.histograms[phase][min(bucket, self.BUCKETS - 1)] += 1
+        if self.callback is not None:
+            self.callback(phase, elapsed)
+
+    def mean(self, phase):
+        """Mean seconds per sample of phase"""
+        if not self.counts[phase]:
+            return 0.0
+        return self.totals[phase] / self.counts[phase]
+
+    def percentile(self, phase, q):
+        """Upper bound in seconds of the histogram bucket holding
+        the qth percentile (0 < q <= 100) of phase"""
+        histogram = self.histograms[phase]
+        wanted = q / 100.0 * self.counts[phase]
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            seen += count
+            if count and seen >= wanted:
+                return (1 << bucket) / 1e9
+        return 0.0
+
+    def summary(self):
+        """Dict of phase -> {count, total, mean, p50, p99}"""
+        return dict((phase, {
+            'count': self.counts[phase],
+            'total': self.totals[phase],
+            'mean': self.mean(phase),
+            'p50': self.percentile(phase, 50),
+            'p99': self.percentile(phase, 99),
+        }) for phase in self.totals)
+
 
 class Node(object):
     """Red-Black Tree Node
-    - Similar to a binary tree node with additional color property"""
-    def __init__(self, key):
+    - Similar to a binary tree node with additional color property
+    - Slotted: no per-instance __dict__, the color is the single red flag
+    - value is an optional payload carried alongside key"""
+    __slots__ = ('key', 'value', 'left', 'right', 'parent', 'red')
+
+    def __init__(self, key, value=None):
         self.key = key
+        self.value = value
         self.right = None
         self.left = None
         self.red = False
@@ -26,29 +114,325 @@ class Node(object):
         return msg
 
 
+try:
+    import _red_black
+except ImportError:  # extension not built: pure Python throughout
+    _red_black = None
+
+if _red_black is not None:
+    class NativeNode(_red_black.Node):
+        """Red-Black Tree Node stored as a C struct by the _red_black
+        extension; trees built from it run search, insert, delete_node
+        and iteration natively"""
+        __slots__ = ()
+        __str__ = Node.__str__
+else:
+    NativeNode = None
+
+
+class KeyedNode(Node):
+    """Node of a tree with a key function: key is the sort key computed
+    from item, the object inserted (item defaults to key)"""
+    __slots__ = ('item',)
+
+    def __init__(self, key, value=None):
+        Node.__init__(self, key, value)
+        self.item = key
+
+
+if NativeNode is not None:
+    class KeyedNativeNode(NativeNode):
+        """KeyedNode stored by the _red_black extension"""
+        __slots__ = ('item',)
+
+        def __init__(self, key, value=None):
+            NativeNode.__init__(self, key, value)
+            self.item = key
+else:
+    KeyedNativeNode = None
+
+# What _red_black.walk and RedBlackTree._iterate yield
+WALK_NODES, WALK_KEYS, WALK_VALUES, WALK_ITEMS = range(4)
+_key_of = attrgetter('key')
+_item_of = attrgetter('item')
+_item_and_value_of = attrgetter('item', 'value')
+WALK_GETTERS = (None, _key_of, attrgetter('value'), attrgetter('key', 'value'))
+
+# RedBlackTree methods whose work _red_black does in C: a subclass
+# overriding any of them keeps the pure-Python path
+NATIVE_METHODS = ('_attach', 'insert_fixup', 'left_rotate', 'right_rotate',
+                  'transplant', 'delete_node', 'delete_node_fixup', 'search')
+
+
+_sentinels = {}
+
+
+def sentinel(create_node=Node):
+    """Return the nil sentinel shared by every tree built from create_node
+    - Trees never link nil to anything (delete tracks the parent of a
+      removed leaf itself instead of parking it on nil.parent), so one
+      sentinel can serve any number of trees"""
+    try:
+        return _sentinels[create_node]
+    except KeyError:
+        nil = _sentinels[create_node] = create_node(None)
+        return nil
+
+
 class RedBlackTree(object):
     """Non-Modified Red-Black Tree
     - Introduction to Algorithms 3620 Project
-    - Cormen, Thomas H.., et al. Introduction to Algorithms. 3rd ed., MIT Press, 2009."""
-    def __init__(self, create_node=Node):
-        self.nil = create_node(None)
+    - Cormen, Thomas H.., et al. Introduction to Algorithms. 3rd ed., MIT Press, 2009.
+    - key: function computing each inserted item's sort key, once, in
+      insert (and insert_many, from_sorted, from_iterable, join's pivot).
+      The sort key is stored in node.key and the item in node.item, and
+      iteration and irange yield items. Every other method taking a key
+      (search, delete_key, floor, irange bounds, map access) takes a
+      sort key, so descents compare plain keys as without key
+    - reverse: the tree's order is descending. Nodes are still stored in
+      ascending order; the order-dependent methods (iteration, irange,
+      minimum/maximum, successor/predecessor, floor/ceiling/lower/higher,
+      from_sorted, join, split) mirror it, so insert, search and
+      delete_key run exactly as without reverse"""
+    # insert_many/delete_many rebuild a tree without the native core once
+    # a batch outnumbers this share of it
+    rebuild_ratio = 0.25
+
+    def __init__(self, create_node=None, profiler=None, collect_stats=False, key=None, reverse=False):
+        """create_node defaults to NativeNode when the _red_black
+        extension is built, else Node (KeyedNativeNode and KeyedNode
+        with a key function, which needs nodes with an item slot)"""
+        if create_node is None:
+            if key is None:
+                create_node = NativeNode or Node
+            else:
+                create_node = KeyedNativeNode or KeyedNode
+        self.create_node = create_node
+        self.key_function = key
+        self.reverse = reverse
+        self.nil = sentinel(create_node)
         self.root = self.nil
+        # Leftmost and rightmost nodes, None until looked up
+        self._min = self._max = None
         self.levels = []
-        self.number_of_nodes = 0
-        self.nodes_considered = 0
+        self._number_of_nodes = 0
         self.insert_time = 0
         self.delete_time = 0
         self.insert_fixup_time = 0
         self.delete_fixup_time = 0
+        self.profiler = profiler
+        self.collect_stats = collect_stats
+        self._black_height = 0
+        self._core = self._native_core()
+        self.reset_stats()
+
+    def _native_core(self):
+        """The _red_black module if it can stand in for this tree's
+        search, insert and delete_node, else None
+        - Needs nodes from NativeNode and none of NATIVE_METHODS
+          overridden; a profiler, collect_stats or time=True still take
+          the pure-Python path, which works on native nodes too"""
+        if _red_black is None or not isinstance(self.nil, _red_black.Node):
+            return None
+        cls = type(self)
+        for name in NATIVE_METHODS:
+            if getattr(cls, name) is not getattr(RedBlackTree, name):
+                return None
+        return _red_black
+
+    def __getstate__(self):
+        """Pickle and copy state: the attributes, with the nodes replaced
+        by flat lists they are rebuilt from in O(n)
+        - Native nodes cannot be pickled, and flat lists spare pickle a
+          level of recursion per node"""
+        state = self.__dict__.copy()
+        for name in ('root', 'nil', '_core', '_min', '_max'):
+            del state[name]
+        state['_build_input'] = self._build_input()
+        state['_items'] = list(self._iterate(False, WALK_ITEMS))
+        return state
+
+    def __setstate__(self, state):
+        build_input = state.pop('_build_input')
+        items = state.pop('_items')
+        self.__dict__.update(state)
+        self.nil = sentinel(self.create_node)
+        self.root = self.nil
+        self._min = self._max = None
+        self._core = self._native_core()
+        self._build_sorted(build_input)
+        self._restore_values(items)
+
+    def _build_input(self):
+        """List _build_sorted rebuilds this tree from: the keys ascending
+        (items with a key function)"""
+        if self.key_function is not None:
+            return [node.item for node in self._iterate(False, WALK_NODES)]
+        return list(self._ascending_keys())
+
+    def reset_stats(self):
+        """Zero the structural counters read by stats()"""
+        self.counters = dict((name, 0) for name in STAT_COUNTERS)
+        self.nodes_considered = 0
+
+    def _count_descent(self, depth):
+        counters = self.counters
+        counters['descents'] += 1
+        counters['descent_depth'] += depth
+        if depth > counters['max_descent_depth']:
+            counters['max_descent_depth'] = depth
+
+    def stats(self, height=False):
+        """Snapshot of the tree's structural metrics
+        - Counters (collected only while collect_stats is set): rotations
+          by direction, recolorings, the insert_fixup cases 1-3 and
+          delete_node_fixup cases 1-4 that ran, and the nodes visited by
+          the descents of insert, search and delete_key
+        - black_height is kept current on every path, in O(1) per
+          operation: insert_fixup raises it when it blackens a red root
+          and delete_node_fixup lowers it when the missing black reaches
+          the root
+        - The height itself is not tracked: deletes can shorten the
+          longest path anywhere, so keeping it current would take a field
+          on every node. height_bound, twice the black height, is the O(1)
+          stand-in (no path has more nodes); height=True adds the exact
+          height, the nodes on the longest path, found by an O(n) walk"""
+        stats = dict(self.counters)
+        stats['rotations'] = stats['left_rotations'] + stats['right_rotations']
+        descents = stats['descents']
+        stats['mean_descent_depth'] = float(stats['descent_depth']) / descents if descents else 0.0
+        stats['black_height'] = self._black_height
+        stats['height_bound'] = 2 * self._black_height
+        stats['number_of_nodes'] = self.number_of_nodes
+        if height:
+            stats['height'] = self._height()
+        return stats
+
+    def _height(self):
+        """Nodes on the longest path down from the root, level by level"""
+        nil = self.nil
+        level = [] if self.root is nil else [self.root]
+        height = 0
+        while level:
+            height += 1
+            level = [child for node in level for child in (node.left, node.right) if child is not nil]
+        return height
+
+    @property
+    def number_of_nodes(self):
+        """Count of nodes in the tree
+        - split and the set operations cannot know the size of the trees
+          they produce without sizes cached per node, so they leave it
+          to be counted (in O(n)) on first use"""
+        if self._number_of_nodes is None:
+            self._number_of_nodes = self._count_nodes()
+        return self._number_of_nodes
+
+    @number_of_nodes.setter
+    def number_of_nodes(self, n):
+        self._number_of_nodes = n
+
+    def _add_nodes(self, n):
+        """Adjust the node count after linking (n > 0) or unlinking nodes
+        - A count left to be recounted stays so: the recount sees the
+          change already, and adding n on top would count it twice"""
+        if self._number_of_nodes is not None:
+            self.number_of_nodes = self._number_of_nodes + n
+
+    def _count_nodes(self):
+        return sum(1 for _ in self._walk(self._leftmost() or self.nil))
+
+    def _empty_like(self):
+        """New empty tree of the same type, node factory and order"""
+        return type(self)(create_node=self.create_node, profiler=self.profiler,
+                          collect_stats=self.collect_stats, key=self.key_function,
+                          reverse=self.reverse)
+
+    @classmethod
+    def from_sorted(cls, keys, **kwargs):
+        """Build a tree from keys in ascending order (descending with
+        reverse=True; items ordered by their sort keys with key=) in
+        O(n), with no descents and no rotations
+        - kwargs are passed on to the constructor"""
+        tree = cls(**kwargs)
+        keys = list(keys)
+        if tree.reverse:
+            keys.reverse()
+        sort_keys = keys if tree.key_function is None else [tree.key_function(item) for item in keys]
+        for i in range(1, len(keys)):
+            if sort_keys[i] < sort_keys[i - 1]:
+                i = len(keys) - i if tree.reverse else i
+                raise ValueError("keys are not sorted at index {}".format(i))
+        tree._build_sorted(keys)
+        return tree
+
+    def _build_sorted(self, keys):
+        """Replace the contents of the tree with the sorted list keys
+        (items in sort key order with a key function)
+        - Each subtree is rooted at the middle key of its range, so every
+          leaf sits on the bottom two levels; if the bottom level is
+          incomplete its nodes are red, every other node is black"""
+        n = len(keys)
+        self.root = self.nil
+        self._min = self._max = None
+        self.number_of_nodes = n
+        self._black_height = 0
+        if not n:
+            return
+        # A complete tree (n == 2**k - 1) has no partial level to color red
+        red_depth = n.bit_length() - 1 if (n + 1) & n else -1
+        create_node = self.create_node
+        key_function = self.key_function
+        nil = self.nil
+        if key_function is not None:
+            node_type = create_node
+
+            def create_node(item):
+                node = node_type(key_function(item))
+                node.item = item
+                return node
+
+        def build(lo, hi, depth, parent):
+            if lo > hi:
+                return nil
+            mid = (lo + hi) // 2
+            node = create_node(keys[mid])
+            node.parent = parent
+            node.red = depth == red_depth
+            node.left = build(lo, mid - 1, depth + 1, node)
+            node.right = build(mid + 1, hi, depth + 1, node)
+            return node
+
+        # n fresh nodes would otherwise set off repeated cyclic collections
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.root = build(0, n - 1, 0, nil)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self._black_height = self._spine_black_height(self.root)
+
+    @classmethod
+    def from_iterable(cls, keys, **kwargs):
+        """Sort keys, then build the tree with from_sorted"""
+        return cls.from_sorted(sorted(keys, key=kwargs.get('key'), reverse=kwargs.get('reverse', False)),
+                               **kwargs)
 
     def left_rotate(self, x):
-        """
+        r"""
         ...       ...
          x          y
           \   =>   /
            y      x
 
         """
+        profiler = self.profiler
+        if profiler is not None:
+            start = clock()
+        if self.collect_stats:
+            self.counters['left_rotations'] += 1
+
         y = x.right
         x.right = y.left
         if y.left != self.nil:
@@ -63,22 +447,30 @@ class RedBlackTree(object):
         y.left = x
         x.parent = y
 
+        if profiler is not None:
+            profiler('rotation', clock() - start)
+
     def right_rotate(self, y):
-        """
+        r"""
         ...       ...
          x          y
           \   <=   /
            y      x
 
         """
+        profiler = self.profiler
+        if profiler is not None:
+            start = clock()
+        if self.collect_stats:
+            self.counters['right_rotations'] += 1
+
         x = y.left
         y.left = x.right
-
         if x.right != self.nil:
             x.right.parent = y
         x.parent = y.parent
-        if y == self.nil:
-            y.parent.left = x
+        if y.parent == self.nil:
+            self.root = x
         elif y == y.parent.right:
             y.parent.right = x
         else:
@@ -86,12 +478,29 @@ class RedBlackTree(object):
         x.right = y
         y.parent = x
 
-    def insert(self, new_node, time=False):
-        """Insert new_node into a tree by way of binary search"""
-        if time:
-            insert_start_time = timeit.timeit()
+        if profiler is not None:
+            profiler('rotation', clock() - start)
+
+    def insert(self, key, time=False):
+        """Insert key into a tree by way of binary search, returning the
+        new node
+        - time=True stores this call's descent and fixup durations
+          (seconds) in insert_time and insert_fixup_time
+        - With a key function, key is the item to insert"""
+        key_function = self.key_function
+        if key_function is None:
+            new_node = self.create_node(key)
+        else:
+            new_node = self.create_node(key_function(key))
+            new_node.item = key
+        profiler = self.profiler
+        if self._core is not None and not (time or profiler is not None or self.collect_stats):
+            self._black_height += self._core.insert(self, new_node)
+            self._extend_extremes(new_node)
+            self._add_nodes(1)
+            return new_node
+        insert_start_time = clock() if time or profiler is not None else None
 
-        new_node = Node(new_node)
         y = self.nil
         x = self.root
 
@@ -101,33 +510,160 @@ class RedBlackTree(object):
                 x = x.left
             else:
                 x = x.right
-        new_node.parent = y
-        if y == self.nil:
+        self._link(y, new_node, time, insert_start_time)
+        return new_node
+
+    def _link(self, parent, new_node, time=False, insert_start_time=None):
+        """The rest of a pure-Python insert once its descent has found
+        parent: attach new_node, repair the tree and record the stats
+        and timings (insert_start_time is None when untimed)"""
+        self._attach(parent, new_node)
+        if self.collect_stats:
+            self._count_descent(self._depth(new_node))
+
+        timed = insert_start_time is not None
+        if timed:
+            insert_fixup_start_time = clock()
+
+        self.insert_fixup(new_node)
+
+        if timed:
+            insert_fixup_end_time = clock()
+            insert_time = insert_fixup_start_time - insert_start_time
+            insert_fixup_time = insert_fixup_end_time - insert_fixup_start_time
+            if time:
+                self.insert_time = insert_time
+                self.insert_fixup_time = insert_fixup_time
+            profiler = self.profiler
+            if profiler is not None:
+                profiler('descent', insert_time)
+                profiler('fixup', insert_fixup_time)
+        self._add_nodes(1)
+
+    def _depth(self, node):
+        """Nodes from the root down to node, both included"""
+        nil = self.nil
+        depth = 0
+        while node is not nil:
+            depth += 1
+            node = node.parent
+        return depth
+
+    def _attach(self, parent, new_node):
+        """Hang new_node under parent (as the root if parent is nil)
+        as a red leaf, ready for insert_fixup"""
+        nil = self.nil
+        new_node.parent = parent
+        if parent is nil:
             self.root = new_node
-        elif new_node.key < y.key:
-            y.left = new_node
+        elif new_node.key < parent.key:
+            parent.left = new_node
         else:
-            y.right = new_node
-
-        new_node.left = self.nil
-        new_node.right = self.nil
+            parent.right = new_node
+        new_node.left = nil
+        new_node.right = nil
         new_node.red = True
+        self._extend_extremes(new_node)
 
-        if time:
-            insert_end_time = timeit.timeit()
-            self.insert_time = insert_end_time - insert_start_time
-            insert_fixup_start_time = timeit.timeit()
+    def _extend_extremes(self, new_node):
+        """Make a newly linked node the cached leftmost or rightmost node
+        if it is one (equal keys go right: after the old minimum, and
+        after the old maximum)
+        - Fixups rotate but never reorder, so only linking and unlinking
+          nodes move the extremes"""
+        leftmost = self._min
+        if leftmost is not None and new_node.key < leftmost.key:
+            self._min = new_node
+        rightmost = self._max
+        if rightmost is not None and not new_node.key < rightmost.key:
+            self._max = new_node
 
-        self.insert_fixup(new_node)
+    def _finger(self, finger, key):
+        """Climb from finger to the lowest ancestor whose subtree spans key
+        - key must not be less than finger.key; the result is where a
+          descent for key may start instead of the root"""
+        nil = self.nil
+        parent = finger.parent
+        while parent is not nil:
+            if finger is parent.left and key < parent.key:
+                return finger
+            finger = parent
+            parent = finger.parent
+        return finger
+
+    def insert_many(self, keys):
+        """Insert every key of keys, returning the number inserted
+        - The batch is sorted; with the native core each key is inserted
+          by it, which outruns both of the paths below at any batch size
+        - Otherwise each descent starts from the previous insertion point
+          instead of the root, and a batch larger than rebuild_ratio *
+          number_of_nodes is merged with the tree's keys and rebuilt with
+          from_sorted instead. The rebuild replaces every node of the
+          tree (keeping their values): nodes held from before it are
+          no longer in the tree
+        - With a key function keys are items, inserted one by one"""
+        if self.key_function is not None:
+            count = 0
+            for item in keys:
+                self.insert(item)
+                count += 1
+            return count
+        keys = sorted(keys)
+        if not keys:
+            return 0
+        core = self._core
+        if core is not None and not (self.profiler is not None or self.collect_stats):
+            # A descent in C from the root outruns a climb from the finger in Python
+            create_node = self.create_node
+            nodes = [create_node(key) for key in keys]
+            for node in nodes:
+                self._black_height += core.insert(self, node)
+            # Sorted, so only the first can be a new minimum and the last a new maximum
+            self._extend_extremes(nodes[0])
+            self._extend_extremes(nodes[-1])
+            self._add_nodes(len(keys))
+            return len(keys)
+        if len(keys) > self.rebuild_ratio * self.number_of_nodes:
+            items = list(self._iterate(False, WALK_ITEMS))
+            self._build_sorted(list(heapq.merge(imap(itemgetter(0), items), keys)))
+            self._restore_values(items)
+            return len(keys)
 
-        if time:
-            insert_fixup_end_time = timeit.timeit()
-            self.insert_fixup_time = insert_fixup_end_time - insert_fixup_start_time
-        self.number_of_nodes += 1
+        nil = self.nil
+        create_node = self.create_node
+        finger = self.root
+        for key in keys:
+            x = self._finger(finger, key)
+            y = x.parent
+            while x is not nil:
+                y = x
+                if key < x.key:
+                    x = x.left
+                else:
+                    x = x.right
+            finger = create_node(key)
+            self._attach(y, finger)
+            self.insert_fixup(finger)
+        self._add_nodes(len(keys))
+        return len(keys)
+
+    def _restore_values(self, items):
+        """Give the values of the (key, value) pairs items, in ascending
+        order, back to a rebuilt tree: each to the next node holding its
+        key, so copies of a key keep their order"""
+        if all(value is None for _, value in items):
+            return
+        nodes = self._iterate(False, WALK_NODES)
+        for key, value in items:
+            node = next(nodes)
+            while node.key < key:
+                node = next(nodes)
+            node.value = value
 
     def insert_fixup(self, new_node):
         """Fix potential violations of Red-Black properties
-        resulting from insertion of new_node
+        resulting from insertion of new_node, returning True when
+        that raised the black height of the tree
 
         Red-Black Properties:
         - 1: Every node is either red or black
@@ -136,6 +672,7 @@ class RedBlackTree(object):
         - 4: If a node is red, then both its children are black
         - 5: For each node, all simple paths from the node to descendant
              leaves contain the same number of black nodes"""
+        counters = self.counters if self.collect_stats else None
 
         while new_node.parent.red:
             # Parent of new_node is a left child
@@ -148,17 +685,25 @@ class RedBlackTree(object):
                     uncle.red = False
                     new_node.parent.parent.red = True
                     new_node = new_node.parent.parent
+                    if counters is not None:
+                        counters['insert_case_1'] += 1
+                        counters['recolorings'] += 3
                 else:
                     # Case 2: new_node's uncle is black and new_node is a right child
                     # - left_rotate and continue as if new_node was its parent
                     if new_node == new_node.parent.right:
                         new_node = new_node.parent
                         self.left_rotate(new_node)
+                        if counters is not None:
+                            counters['insert_case_2'] += 1
                     # Case 3: new_node's uncle is black and new_node is a left child
                     # - right_rotate and continue as if new_node was its parent
                     new_node.parent.red = False
                     new_node.parent.parent.red = True
                     self.right_rotate(new_node.parent.parent)
+                    if counters is not None:
+                        counters['insert_case_3'] += 1
+                        counters['recolorings'] += 2
             # Parent of new_node is a right child: The same routine as above with L/R reversed
             else:
                 uncle = new_node.parent.parent.left
@@ -167,17 +712,57 @@ class RedBlackTree(object):
                     uncle.red = False
                     new_node.parent.parent.red = True
                     new_node = new_node.parent.parent
+                    if counters is not None:
+                        counters['insert_case_1'] += 1
+                        counters['recolorings'] += 3
                 else:
                     if new_node == new_node.parent.left:
                         new_node = new_node.parent
                         self.right_rotate(new_node)
+                        if counters is not None:
+                            counters['insert_case_2'] += 1
                     new_node.parent.red = False
                     new_node.parent.parent.red = True
                     self.left_rotate(new_node.parent.parent)
-        self.root.red = False
+                    if counters is not None:
+                        counters['insert_case_3'] += 1
+                        counters['recolorings'] += 2
+        # Only Case 1 reaching the root leaves it red
+        root = self.root
+        grew = root.red
+        root.red = False
+        if grew:
+            self._black_height += 1
+            if counters is not None:
+                counters['recolorings'] += 1
+        return grew
 
     def search(self, key, root=None):
-        """Binary Search to find key in tree rooted at root"""
+        """Binary Search to find key in tree rooted at root
+        - Read-only; with collect_stats set it instead leaves the number
+          of nodes passed on the way in nodes_considered"""
+        if self.collect_stats:
+            return self._search_counting(key, root)
+        if self._core is not None:
+            return self._core.search(self.root if root is None else root, self.nil, key)
+        return self._descend(key, root)
+
+    def _descend(self, key, root=None):
+        """search in pure Python, without the native core or stats
+        - Only reads the tree, and only from Python, so a reader racing a
+          writer (ConcurrentRedBlackTree's optimistic lookups) gets at
+          worst a torn result for its version check to reject"""
+        nil = self.nil
+        node = self.root if root is None else root
+        while node is not nil:
+            node_key = node.key
+            if key == node_key:
+                return node
+            node = node.left if key < node_key else node.right
+        return node
+
+    def _search_counting(self, key, root=None):
+        """search, counting the nodes passed into nodes_considered"""
         self.nodes_considered = 0
 
         if root is None:
@@ -190,12 +775,91 @@ class RedBlackTree(object):
             else:
                 root = root.right
 
+        self._count_descent(self.nodes_considered + (root is not self.nil))
         return root
 
     def minimum(self, root=None):
-        """Find the minimum node of a tree rooted at root"""
+        """Find the minimum node of a tree rooted at root
+        - The first node in the tree's order: the maximum with reverse"""
+        if self.reverse:
+            return self._rightmost(root)
+        return self._leftmost(root)
+
+    def maximum(self, root=None):
+        """Find the maximum node of a tree rooted at root
+        - The last node in the tree's order: the minimum with reverse"""
+        if self.reverse:
+            return self._leftmost(root)
+        return self._rightmost(root)
+
+    def successor(self, node):
+        """Node after node in the tree's order, or None after the last"""
+        if self.reverse:
+            return self._previous(node)
+        return self._next(node)
+
+    def predecessor(self, node):
+        """Node before node in the tree's order, or None before the first"""
+        if self.reverse:
+            return self._next(node)
+        return self._previous(node)
+
+    def peek_min(self):
+        """(key, value) of the first node in the tree's order, in O(1)
+        - IndexError if the tree is empty; item in place of key with a
+          key function, as in items()"""
+        node = self.minimum()
+        if node is None:
+            raise IndexError("peek at an empty tree")
+        return self._pair(node)
+
+    def peek_max(self):
+        """(key, value) of the last node in the tree's order, like peek_min"""
+        node = self.maximum()
+        if node is None:
+            raise IndexError("peek at an empty tree")
+        return self._pair(node)
+
+    def pop_min(self):
+        """Remove the first node in the tree's order and return its
+        (key, value), like peek_min
+        - Deletes the cached node itself: no search, and the new minimum
+          is its successor, one step away"""
+        node = self.minimum()
+        if node is None:
+            raise IndexError("pop from an empty tree")
+        pair = self._pair(node)
+        self._remove_node(node)
+        return pair
+
+    def pop_max(self):
+        """Remove the last node in the tree's order and return its
+        (key, value), like pop_min"""
+        node = self.maximum()
+        if node is None:
+            raise IndexError("pop from an empty tree")
+        pair = self._pair(node)
+        self._remove_node(node)
+        return pair
+
+    def _pair(self, node):
+        """What items() yields for node"""
+        if self.key_function is None:
+            return node.key, node.value
+        return node.item, node.value
+
+    def _remove_node(self, node):
+        self.delete_node(node)
+        self._add_nodes(-1)
+
+    def _leftmost(self, root=None):
+        """Node with the smallest key in the tree rooted at root, or None
+        - O(1) for the whole tree once looked up: the node is cached and
+          kept current by insert and delete_node"""
         if root is None:
-            root = self.root
+            if self._min is None:
+                self._min = self._leftmost(self.root)
+            return self._min
 
         if root == self.nil:
             return
@@ -204,10 +868,13 @@ class RedBlackTree(object):
 
         return root
 
-    def maximum(self, root=None):
-        """Find the maximum node of a tree rooted at root"""
+    def _rightmost(self, root=None):
+        """Node with the largest key in the tree rooted at root, or None
+        - Cached like _leftmost"""
         if root is None:
-            root = self.root
+            if self._max is None:
+                self._max = self._rightmost(self.root)
+            return self._max
 
         if root == self.nil:
             return
@@ -216,48 +883,518 @@ class RedBlackTree(object):
 
         return root
 
+    def _next(self, node):
+        """Node with the next key after node's, or None after the maximum"""
+        nil = self.nil
+        if node.right is not nil:
+            node = node.right
+            while node.left is not nil:
+                node = node.left
+            return node
+        parent = node.parent
+        while parent is not nil and node is parent.right:
+            node = parent
+            parent = node.parent
+        if parent is nil:
+            return None
+        return parent
+
+    def _previous(self, node):
+        """Node with the key before node's, or None before the minimum"""
+        nil = self.nil
+        if node.left is not nil:
+            node = node.left
+            while node.right is not nil:
+                node = node.right
+            return node
+        parent = node.parent
+        while parent is not nil and node is parent.left:
+            node = parent
+            parent = node.parent
+        if parent is nil:
+            return None
+        return parent
+
+    def _walk(self, node):
+        """Generate nodes in order from node, following parent pointers"""
+        nil = self.nil
+        while node is not nil:
+            yield node
+            if node.right is not nil:
+                node = node.right
+                while node.left is not nil:
+                    node = node.left
+            else:
+                parent = node.parent
+                while parent is not nil and node is parent.right:
+                    node = parent
+                    parent = node.parent
+                node = parent
+
+    def _walk_reversed(self, node):
+        """Generate nodes in reverse order from node, following parent pointers"""
+        nil = self.nil
+        while node is not nil:
+            yield node
+            if node.left is not nil:
+                node = node.left
+                while node.right is not nil:
+                    node = node.right
+            else:
+                parent = node.parent
+                while parent is not nil and node is parent.left:
+                    node = parent
+                    parent = node.parent
+                node = parent
+
+    def _lower_bound(self, key, inclusive=True, node=None):
+        """First node with a key >= key (> key if not inclusive) in the
+        subtree at node (default root), else nil"""
+        nil = self.nil
+        if node is None:
+            node = self.root
+        bound = nil
+        if inclusive:
+            while node is not nil:
+                if node.key < key:
+                    node = node.right
+                else:
+                    bound = node
+                    node = node.left
+        else:
+            while node is not nil:
+                if key < node.key:
+                    bound = node
+                    node = node.left
+                else:
+                    node = node.right
+        return bound
+
+    def _upper_bound(self, key, inclusive=True, node=None):
+        """Last node with a key <= key (< key if not inclusive) in the
+        subtree at node (default root), else nil"""
+        nil = self.nil
+        if node is None:
+            node = self.root
+        bound = nil
+        if inclusive:
+            while node is not nil:
+                if key < node.key:
+                    node = node.left
+                else:
+                    bound = node
+                    node = node.right
+        else:
+            while node is not nil:
+                if node.key < key:
+                    bound = node
+                    node = node.right
+                else:
+                    node = node.left
+        return bound
+
+    def _iterate(self, descending, mode):
+        """Nodes, keys, values or (key, value) pairs of the whole tree,
+        by mode (WALK_NODES...WALK_ITEMS), lazily in ascending key order,
+        or descending"""
+        nil = self.nil
+        start = (self._rightmost() if descending else self._leftmost()) or nil
+        if self._core is not None:
+            return self._core.walk(start, nil, descending, mode)
+        nodes = self._walk_reversed(start) if descending else self._walk(start)
+        if mode == WALK_NODES:
+            return nodes
+        return imap(WALK_GETTERS[mode], nodes)
+
+    def __iter__(self):
+        """Keys (items with a key function) in the tree's order, lazily
+        and without recursion"""
+        if self.key_function is not None:
+            return imap(_item_of, self._iterate(self.reverse, WALK_NODES))
+        return self._iterate(self.reverse, WALK_KEYS)
+
+    def __reversed__(self):
+        """Keys (items with a key function) in the reverse of the tree's
+        order, lazily and without recursion"""
+        if self.key_function is not None:
+            return imap(_item_of, self._iterate(not self.reverse, WALK_NODES))
+        return self._iterate(not self.reverse, WALK_KEYS)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        """(key, value) pairs in the tree's order, item in place of key
+        with a key function"""
+        if self.key_function is not None:
+            return imap(_item_and_value_of, self._iterate(self.reverse, WALK_NODES))
+        return self._iterate(self.reverse, WALK_ITEMS)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """Keys between lo and hi in order, None meaning unbounded
+        - inclusive is a pair saying whether lo and hi themselves qualify
+        - Seeks the first key in O(log n), so k results cost O(log n + k)
+        - lo and hi are sort keys, lo first in the tree's order (so not
+          less than hi with reverse); items are yielded with a key function"""
+        if self.reverse:
+            lo, hi, inclusive, reverse = hi, lo, (inclusive[1], inclusive[0]), not reverse
+        getter = _key_of if self.key_function is None else _item_of
+        return imap(getter, self._range_nodes(lo, hi, inclusive, reverse))
+
+    def _range_nodes(self, lo, hi, inclusive, reverse):
+        """Nodes of irange in ascending key order, or descending"""
+        nil = self.nil
+        if reverse:
+            node = self._upper_bound(hi, inclusive[1]) if hi is not None else self._rightmost() or nil
+            if lo is None:
+                for node in self._walk_reversed(node):
+                    yield node
+            elif inclusive[0]:
+                for node in self._walk_reversed(node):
+                    if node.key < lo:
+                        return
+                    yield node
+            else:
+                for node in self._walk_reversed(node):
+                    if not lo < node.key:
+                        return
+                    yield node
+        else:
+            node = self._lower_bound(lo, inclusive[0]) if lo is not None else self._leftmost() or nil
+            if hi is None:
+                for node in self._walk(node):
+                    yield node
+            elif inclusive[1]:
+                for node in self._walk(node):
+                    if hi < node.key:
+                        return
+                    yield node
+            else:
+                for node in self._walk(node):
+                    if not node.key < hi:
+                        return
+                    yield node
+
+    def floor(self, key):
+        """Node with the largest key <= key (smallest >= key with
+        reverse), or None"""
+        node = self._lower_bound(key) if self.reverse else self._upper_bound(key)
+        return None if node is self.nil else node
+
+    def ceiling(self, key):
+        """Node with the smallest key >= key (largest <= key with
+        reverse), or None"""
+        node = self._upper_bound(key) if self.reverse else self._lower_bound(key)
+        return None if node is self.nil else node
+
+    def lower(self, key):
+        """Node with the largest key < key (smallest > key with
+        reverse), or None"""
+        node = self._lower_bound(key, False) if self.reverse else self._upper_bound(key, False)
+        return None if node is self.nil else node
+
+    def higher(self, key):
+        """Node with the smallest key > key (largest < key with
+        reverse), or None"""
+        node = self._upper_bound(key, False) if self.reverse else self._lower_bound(key, False)
+        return None if node is self.nil else node
+
+    def floor_many(self, probes):
+        """floor of each probe of probes, in the tree's order, as a list"""
+        if self.reverse:
+            return self._mirrored_many(self._ceiling_many, probes)
+        return self._floor_many(probes)
+
+    def ceiling_many(self, probes):
+        """ceiling of each probe of probes, in the tree's order, as a list"""
+        if self.reverse:
+            return self._mirrored_many(self._floor_many, probes)
+        return self._ceiling_many(probes)
+
+    def _mirrored_many(self, find_many, probes):
+        """find_many over probes given in descending order"""
+        probes = list(probes)
+        probes.reverse()
+        results = find_many(probes)
+        results.reverse()
+        return results
+
+    def _floor_many(self, probes):
+        """floor of each probe of the ascending sequence probes, as a list
+        - With the native core, every probe is answered by a descent in C
+          within one call
+        - Else each descent starts from the lowest ancestor of the previous
+          answer whose subtree spans the probe (see _finger), not the root"""
+        if self._core is not None:
+            return self._core.bounds(self.root, self.nil, probes, True)
+        nil = self.nil
+        results = []
+        found = nil
+        previous = None
+        for probe in probes:
+            if previous is not None and probe < previous:
+                raise ValueError("probes are not sorted")
+            previous = probe
+            if found is nil:
+                node = self.root
+            else:
+                # found.key <= probe, so found's spanning subtree holds the floor
+                node = found
+                parent = node.parent
+                while parent is not nil and (node is parent.right or not probe < parent.key):
+                    node = parent
+                    parent = node.parent
+            while node is not nil:
+                if probe < node.key:
+                    node = node.left
+                else:
+                    found = node
+                    node = node.right
+            results.append(None if found is nil else found)
+        return results
+
+    def _ceiling_many(self, probes):
+        """ceiling of each probe of the ascending sequence probes, as a
+        list, found as by _floor_many"""
+        if self._core is not None:
+            return self._core.bounds(self.root, self.nil, probes, False)
+        nil = self.nil
+        results = []
+        found = None
+        previous = None
+        for probe in probes:
+            if previous is not None and probe < previous:
+                raise ValueError("probes are not sorted")
+            if previous is None:
+                node = self._lower_bound(probe)
+                found = None if node is nil else node
+            elif found is not None and found.key < probe:
+                node = found
+                parent = node.parent
+                while parent is not nil and (node is parent.right or not probe < parent.key):
+                    node = parent
+                    parent = node.parent
+                # Should nothing below node reach probe, the ancestor that
+                # bounds node's subtree from above is the next key
+                bound = parent
+                while node is not nil:
+                    if node.key < probe:
+                        node = node.right
+                    else:
+                        bound = node
+                        node = node.left
+                found = None if bound is nil else bound
+            previous = probe
+            results.append(found)
+        return results
+
+    def values(self):
+        """Values in the tree's order"""
+        return self._iterate(self.reverse, WALK_VALUES)
+
+    def __len__(self):
+        return self.number_of_nodes
+
+    def __contains__(self, key):
+        return self.search(key) is not self.nil
+
+    def __getitem__(self, key):
+        node = self.search(key)
+        if node is self.nil:
+            raise KeyError(key)
+        return node.value
+
+    def get(self, key, default=None):
+        node = self.search(key)
+        if node is self.nil:
+            return default
+        return node.value
+
+    def __setitem__(self, key, value):
+        """Map key to value, updating an existing node in place
+        - Unlike insert, never adds a second node for a key"""
+        self._set(key, value, True)
+
+    def setdefault(self, key, default=None):
+        """Value of key, first mapping key to default if it is absent"""
+        return self._set(key, default, False)
+
+    def _set(self, key, value, overwrite):
+        """Single descent shared by __setitem__ and setdefault, returning
+        the value key ends up mapped to"""
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            if key < x.key:
+                y = x
+                x = x.left
+            elif x.key < key:
+                y = x
+                x = x.right
+            else:
+                if overwrite:
+                    x.value = value
+                return x.value
+
+        new_node = self.create_node(key)
+        new_node.value = value
+        self._attach(y, new_node)
+        self.insert_fixup(new_node)
+        self._add_nodes(1)
+        return value
+
+    def __delitem__(self, key):
+        if not self.delete_key(key):
+            raise KeyError(key)
+
+    def pop(self, key, *default):
+        """Remove key and return its value, or default if given and key is absent"""
+        node = self.search(key)
+        if node is self.nil:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self.delete_node(node)
+        self._add_nodes(-1)
+        return node.value
+
     def transplant(self, u, v):
         """Replace subtree rooted at u with subtree rooted at v
         - Used in delete_node"""
+        profiler = self.profiler
+        if profiler is not None:
+            start = clock()
+
         if u.parent == self.nil:
             self.root = v
         elif u == u.parent.left:
             u.parent.left = v
         else:
             u.parent.right = v
-        v.parent = u.parent
+        if v != self.nil:
+            v.parent = u.parent
+
+        if profiler is not None:
+            profiler('transplant', clock() - start)
 
     def delete_key(self, key, time=False):
         """Precursor to delete_node, where we search for the node
         and exit appropriately if the node is not found"""
-        node = self.search(key)
+        profiler = self.profiler
+        if profiler is not None:
+            start = clock()
+            node = self.search(key)
+            profiler('descent', clock() - start)
+        else:
+            node = self.search(key)
         if node == self.nil:
             return False
         self.delete_node(node, time=time)
-        self.number_of_nodes -= 1
+        self._add_nodes(-1)
         return True
 
+    def delete_many(self, keys):
+        """Delete one node per key of keys, returning the number removed
+        - The batch is sorted; with the native core each key is searched
+          for and deleted by it, as in insert_many
+        - Otherwise each search starts from the predecessor of the
+          previously deleted node instead of the root, and a batch larger
+          than rebuild_ratio * number_of_nodes is removed in a single
+          merge over the tree's keys and the tree rebuilt with
+          from_sorted. The rebuild replaces every node of the tree (and
+          keeps their values, but not with a key function, whose items
+          the merge would lose): nodes held from before it are no longer
+          in the tree
+        - keys are sort keys"""
+        keys = sorted(keys)
+        if not keys or self.root is self.nil:
+            return 0
+        nil = self.nil
+        core = self._core
+        if core is not None and not (self.profiler is not None or self.collect_stats):
+            # As in insert_many, searches from the root in C beat fingers
+            removed = 0
+            search = core.search
+            for key in keys:
+                node = search(self.root, nil, key)
+                if node is not nil:
+                    self.delete_node(node)
+                    removed += 1
+            self._add_nodes(-removed)
+            return removed
+        if self.key_function is None and len(keys) > self.rebuild_ratio * self.number_of_nodes:
+            kept = []
+            removed = 0
+            i = 0
+            for item in self._iterate(False, WALK_ITEMS):
+                key = item[0]
+                while i < len(keys) and keys[i] < key:
+                    i += 1
+                if i < len(keys) and keys[i] == key:
+                    i += 1
+                    removed += 1
+                else:
+                    kept.append(item)
+            self._build_sorted([key for key, _ in kept])
+            self._restore_values(kept)
+            return removed
+
+        root = self.root
+        removed = 0
+        finger = None
+        for key in keys:
+            start = root if finger is None else self._finger(finger, key)
+            node = self.search(key, start)
+            if node is nil and start is not root:
+                # An ancestor above start may hold key when keys repeat
+                node = self.search(key)
+            if node is nil:
+                continue
+            # The predecessor survives the splice, unlike the successor
+            finger = self._previous(node)
+            self.delete_node(node)
+            root = self.root
+            removed += 1
+        self._add_nodes(-removed)
+        return removed
+
     def delete_node(self, node, time=False):
-        if time:
-            delete_node_start = timeit.timeit()
+        """Remove node from the tree
+        - time=True stores this call's splice and fixup durations
+          (seconds) in delete_time and delete_fixup_time"""
+        if node is self._min:
+            self._min = self._next(node)
+        if node is self._max:
+            self._max = self._previous(node)
+        profiler = self.profiler
+        timed = time or profiler is not None
+        if self._core is not None and not (timed or self.collect_stats):
+            self._black_height -= self._core.delete_node(self, node)
+            return
+        if timed:
+            delete_node_start = clock()
 
         y = node
         y_original_color = y.red
 
         if node.left == self.nil:
             x = node.right
+            x_parent = node.parent
             self.transplant(node, node.right)
         elif node.right == self.nil:
             x = node.left
+            x_parent = node.parent
             self.transplant(node, node.left)
 
         else:
-            y = self.minimum(node.right)
+            y = self._leftmost(node.right)
             y_original_color = y.red
             x = y.right
             if y.parent == node:
-                x.parent = y
+                x_parent = y
             else:
+                x_parent = y.parent
                 self.transplant(y, y.right)
                 y.right = node.right
                 y.right.parent = y
@@ -266,87 +1403,427 @@ class RedBlackTree(object):
             y.left.parent = y
             y.red = node.red
 
-        if time:
-            delete_node_end = timeit.timeit()
-            self.delete_time = delete_node_end - delete_node_start
-            delete_fixup_start = timeit.timeit()
+        if timed:
+            delete_fixup_start = clock()
 
         if not y_original_color:
-            self.delete_node_fixup(x)
+            self.delete_node_fixup(x, x_parent)
 
-        if time:
-            delete_fixup_end = timeit.timeit()
-            self.delete_fixup_time = delete_fixup_end - delete_fixup_start
+        if timed:
+            delete_fixup_end = clock()
+            delete_time = delete_fixup_start - delete_node_start
+            delete_fixup_time = delete_fixup_end - delete_fixup_start
+            if time:
+                self.delete_time = delete_time
+                self.delete_fixup_time = delete_fixup_time
+            if profiler is not None:
+                profiler('splice', delete_time)
+                profiler('fixup', delete_fixup_time)
 
-    def delete_node_fixup(self, node):
+    def delete_node_fixup(self, node, parent=None):
+        """Fix potential violations of Red-Black properties
+        resulting from removing a black node above node
+        - parent is node's parent, required when node is nil
+        - Returns True when the black height of the tree shrank"""
+        if parent is None:
+            parent = node.parent
+        counters = self.counters if self.collect_stats else None
+        rebalanced = False
         while node != self.root and not node.red:
             # node is a left child
-            if node == node.parent.left:
-                sibling = node.parent.right
+            if node == parent.left:
+                sibling = parent.right
                 # Case 1: Sibling  is red
                 # - Since w must have black children,
                 # -- Switch the color of node's sibling and parent
                 # -- Perform left_rotate on nodes parent
                 if sibling.red:
                     sibling.red = False
-                    node.parent.red = True
-                    self.left_rotate(node.parent)
-                    sibling = node.parent.right
+                    parent.red = True
+                    self.left_rotate(parent)
+                    sibling = parent.right
+                    if counters is not None:
+                        counters['delete_case_1'] += 1
+                        counters['recolorings'] += 2
                 # Case 2: Sibling is black, both sibling's children are black
                 if not sibling.left.red and not sibling.right.red:
                     sibling.red = True
-                    node = node.parent
+                    node = parent
+                    parent = node.parent
+                    if counters is not None:
+                        counters['delete_case_2'] += 1
+                        counters['recolorings'] += 1
                 else:
                     # Case 3: Sibling is black, and has a red left child and black right child
                     # - Switch the colors of sibling and its left child
                     # - Perform right_rotation on sibling
-                    if not sibling.red:
+                    if not sibling.right.red:
                         sibling.left.red = False
                         sibling.red = True
                         self.right_rotate(sibling)
-                        sibling = node.parent.right
+                        sibling = parent.right
+                        if counters is not None:
+                            counters['delete_case_3'] += 1
+                            counters['recolorings'] += 2
                     # Case 4: Sibling is black and sibling's right child is red
-                    sibling.red = node.parent.red
-                    node.parent.red = False
+                    sibling.red = parent.red
+                    parent.red = False
                     sibling.right.red = False
-                    self.left_rotate(node.parent)
+                    self.left_rotate(parent)
                     node = self.root
+                    rebalanced = True
+                    if counters is not None:
+                        counters['delete_case_4'] += 1
+                        counters['recolorings'] += 3
             # node is a right child, perform the same routine but with L/R exchanged
-            elif node == node.parent.right:
-                sibling = node.parent.left
+            else:
+                sibling = parent.left
                 if sibling.red:
                     sibling.red = False
-                    node.parent.red = True
-                    self.right_rotate(node.parent)
-                    sibling = node.parent.left
+                    parent.red = True
+                    self.right_rotate(parent)
+                    sibling = parent.left
+                    if counters is not None:
+                        counters['delete_case_1'] += 1
+                        counters['recolorings'] += 2
                 if not sibling.right.red and not sibling.left.red:
                     sibling.red = True
-                    node = node.parent
+                    node = parent
+                    parent = node.parent
+                    if counters is not None:
+                        counters['delete_case_2'] += 1
+                        counters['recolorings'] += 1
                 else:
                     if not sibling.left.red:
                         sibling.right.red = False
                         sibling.red = True
                         self.left_rotate(sibling)
-                        sibling = node.parent.left
-                    sibling.red = node.parent.red
-                    node.parent.red = False
+                        sibling = parent.left
+                        if counters is not None:
+                            counters['delete_case_3'] += 1
+                            counters['recolorings'] += 2
+                    sibling.red = parent.red
+                    parent.red = False
                     sibling.left.red = False
-                    self.right_rotate(node.parent)
+                    self.right_rotate(parent)
                     node = self.root
-        node.red = False
+                    rebalanced = True
+                    if counters is not None:
+                        counters['delete_case_4'] += 1
+                        counters['recolorings'] += 3
+        # The missing black reached the root, shortening every path
+        shrank = not rebalanced and not node.red
+        if node.red:
+            node.red = False
+            if counters is not None:
+                counters['recolorings'] += 1
+        elif shrank:
+            self._black_height -= 1
+        return shrank
+
+    def _spine_black_height(self, node):
+        """Black nodes from node down its left spine, node included
+        - O(log n), unlike black_height, by trusting property 5"""
+        nil = self.nil
+        height = 0
+        while node is not nil:
+            if not node.red:
+                height += 1
+            node = node.left
+        return height
+
+    def _check_compatible(self, other):
+        if other is self:
+            raise ValueError("cannot combine a tree with itself")
+        if other.nil is not self.nil:
+            raise ValueError("trees are built from different node types")
+        if other.key_function is not self.key_function or other.reverse != self.reverse:
+            raise ValueError("trees order their keys differently")
+
+    def _refresh(self, node):
+        """Hook for augmented trees: node was linked above existing
+        subtrees by _join, so whatever node and its ancestors cache about
+        their subtrees needs recomputing"""
+
+    def _detach(self, node, height):
+        """Make the subtree at node (black height height, node included)
+        a black-rooted tree of its own, returning it and its black height"""
+        if node is not self.nil:
+            node.parent = self.nil
+            if node.red:
+                node.red = False
+                height += 1
+        return node, height
+
+    def _join(self, left, left_height, node, right, right_height):
+        """Link node between black-rooted subtrees left and right, every
+        key of left before node and node before every key of right,
+        returning the new root and its black height
+        - The shorter tree hangs, under red node, off the first black
+          node of matching black height on the taller tree's facing
+          spine; insert_fixup repairs any red-red pair above it
+        - O(|left_height - right_height| + 1)
+        - Uses self.root as scratch space for the rotations"""
+        nil = self.nil
+        if left is not nil:
+            left.parent = nil
+        if right is not nil:
+            right.parent = nil
+
+        if left_height == right_height:
+            node.parent = nil
+            node.left = left
+            node.right = right
+            node.red = False
+            if left is not nil:
+                left.parent = node
+            if right is not nil:
+                right.parent = node
+            self._refresh(node)
+            return node, left_height + 1
+
+        if left_height > right_height:
+            root = left
+            parent = nil
+            child = left
+            height = left_height
+            while child.red or height != right_height:
+                if not child.red:
+                    height -= 1
+                parent = child
+                child = child.right
+            parent.right = node
+            node.left = child
+            node.right = right
+        else:
+            root = right
+            parent = nil
+            child = right
+            height = right_height
+            while child.red or height != left_height:
+                if not child.red:
+                    height -= 1
+                parent = child
+                child = child.left
+            parent.left = node
+            node.left = left
+            node.right = child
+        node.parent = parent
+        node.red = True
+        if node.left is not nil:
+            node.left.parent = node
+        if node.right is not nil:
+            node.right.parent = node
+        self._refresh(node)
+
+        self.root = root
+        grew = self.insert_fixup(node)
+        return self.root, max(left_height, right_height) + grew
+
+    def _split(self, node, height, key, inclusive=None):
+        """Split the subtree at node (black height height) around key
+        into black-rooted (left, left_height, found, right, right_height)
+        - inclusive=False sends keys equal to key right, True sends them
+          left, and None takes the first node holding key out as found
+          (None if there is none); O(log n) in all three cases, as the
+          joins on the way back up telescope"""
+        nil = self.nil
+        if node is nil:
+            return nil, 0, None, nil, 0
+        child_height = height if node.red else height - 1
+        node_key = node.key
+        if key < node_key or (inclusive is False and not node_key < key):
+            left, left_height, found, right, right_height = self._split(
+                node.left, child_height, key, inclusive)
+            subtree, subtree_height = self._detach(node.right, child_height)
+            right, right_height = self._join(right, right_height, node, subtree, subtree_height)
+        elif node_key < key or inclusive:
+            left, left_height, found, right, right_height = self._split(
+                node.right, child_height, key, inclusive)
+            subtree, subtree_height = self._detach(node.left, child_height)
+            left, left_height = self._join(subtree, subtree_height, node, left, left_height)
+        else:
+            found = node
+            left, left_height = self._detach(node.left, child_height)
+            right, right_height = self._detach(node.right, child_height)
+        return left, left_height, found, right, right_height
+
+    def _pop_last(self, node, height):
+        """Take the maximum node out of the subtree at node, returning the
+        remaining black-rooted subtree, its black height and the node"""
+        child_height = height if node.red else height - 1
+        if node.right is self.nil:
+            rest, rest_height = self._detach(node.left, child_height)
+            return rest, rest_height, node
+        rest, rest_height, last = self._pop_last(node.right, child_height)
+        subtree, subtree_height = self._detach(node.left, child_height)
+        rest, rest_height = self._join(subtree, subtree_height, node, rest, rest_height)
+        return rest, rest_height, last
+
+    def _join2(self, left, left_height, right, right_height):
+        """_join without a pivot: the maximum of left becomes it"""
+        if left is self.nil:
+            return right, right_height
+        left, left_height, last = self._pop_last(left, left_height)
+        return self._join(left, left_height, last, right, right_height)
+
+    def _take_root(self, other):
+        """Empty other, returning its root and black height"""
+        root = other.root
+        other.root = other.nil
+        other._min = other._max = None
+        other.number_of_nodes = 0
+        other._black_height = 0
+        return root, self._spine_black_height(root)
+
+    def join(self, pivot, right, value=None):
+        """Append pivot (mapped to value) and then every key of right to
+        this tree in O(log n), where no key of this tree may be greater
+        than pivot and no key of right less than it
+        - right is left empty: its nodes move into this tree
+        - RedBlackTree.join(left, pivot, right) reads as the usual join
+        - "Greater" and "less" follow the tree's order, and pivot is an
+          item with a key function"""
+        self._check_compatible(right)
+        if self.key_function is None:
+            node = self.create_node(pivot)
+        else:
+            node = self.create_node(self.key_function(pivot))
+            node.item = pivot
+        node.value = value
+        low, high = (right, self) if self.reverse else (self, right)
+        maximum = low._rightmost()
+        minimum = high._leftmost()
+        if (maximum is not None and node.key < maximum.key) or (minimum is not None and minimum.key < node.key):
+            raise ValueError("keys of the joined trees overlap the pivot")
+        left_count = self._number_of_nodes
+        right_count = right._number_of_nodes
+
+        left, left_height = self._take_root(low)
+        right, right_height = self._take_root(high)
+        self.root, self._black_height = self._join(left, left_height, node, right, right_height)
+        if left_count is None or right_count is None:
+            self.number_of_nodes = None
+        else:
+            self.number_of_nodes = left_count + right_count + 1
+
+    def split(self, key, inclusive=False):
+        """Move every key greater than key, and every key equal to it
+        unless inclusive, into a new tree of the same type and return it
+        - O(log n); the node counts of both trees are left to be
+          recounted unless the tree caches subtree sizes
+        - "Greater" follows the tree's order: with reverse the new tree
+          takes the smaller keys"""
+        root, height = self._take_root(self)
+        if self.reverse:
+            right, right_height, _, left, left_height = self._split(root, height, key, not inclusive)
+        else:
+            left, left_height, _, right, right_height = self._split(root, height, key, inclusive)
+        self.root = left
+        self.number_of_nodes = None
+        self._black_height = left_height
+        tree = self._empty_like()
+        tree.root = right
+        tree.number_of_nodes = None
+        tree._black_height = right_height
+        return tree
+
+    def _ascending_keys(self):
+        """Sort keys in ascending order, one per key held"""
+        return self._iterate(False, WALK_KEYS)
+
+    def freeze(self, eytzinger=False, dtype=None):
+        """Immutable snapshot of the keys answering whole arrays of probes
+        per call, a red_black_frozen.FrozenTree (needs NumPy)
+        - Freezing again after updates is one O(n) walk into an array
+        - dtype (default NumPy's guess) of the key array"""
+        from red_black_frozen import FrozenTree
+        return FrozenTree.from_keys(self._ascending_keys(), eytzinger, dtype)
+
+    def _union(self, a, a_height, b, b_height):
+        nil = self.nil
+        if a is nil:
+            return b, b_height
+        if b is nil:
+            return a, a_height
+        child_height = a_height - 1
+        left, left_height, _, right, right_height = self._split(b, b_height, a.key)
+        a_left, a_left_height = self._detach(a.left, child_height)
+        a_right, a_right_height = self._detach(a.right, child_height)
+        left, left_height = self._union(a_left, a_left_height, left, left_height)
+        right, right_height = self._union(a_right, a_right_height, right, right_height)
+        return self._join(left, left_height, a, right, right_height)
+
+    def _intersection(self, a, a_height, b, b_height):
+        nil = self.nil
+        if a is nil or b is nil:
+            return nil, 0
+        child_height = a_height - 1
+        left, left_height, found, right, right_height = self._split(b, b_height, a.key)
+        a_left, a_left_height = self._detach(a.left, child_height)
+        a_right, a_right_height = self._detach(a.right, child_height)
+        left, left_height = self._intersection(a_left, a_left_height, left, left_height)
+        right, right_height = self._intersection(a_right, a_right_height, right, right_height)
+        if found is None:
+            return self._join2(left, left_height, right, right_height)
+        return self._join(left, left_height, a, right, right_height)
+
+    def _difference(self, a, a_height, b, b_height):
+        nil = self.nil
+        if a is nil or b is nil:
+            return a, a_height
+        child_height = b_height - 1
+        left, left_height, _, right, right_height = self._split(a, a_height, b.key)
+        b_left, b_left_height = self._detach(b.left, child_height)
+        b_right, b_right_height = self._detach(b.right, child_height)
+        left, left_height = self._difference(left, left_height, b_left, b_left_height)
+        right, right_height = self._difference(right, right_height, b_right, b_right_height)
+        return self._join2(left, left_height, right, right_height)
+
+    def _combine(self, other, operation):
+        self._check_compatible(other)
+        a, a_height = self._take_root(self)
+        b, b_height = self._take_root(other)
+        self.root, self._black_height = operation(a, a_height, b, b_height)
+        self.number_of_nodes = None
+
+    def union(self, other):
+        """Add every key of other not already in this tree, in place
+        - Splits other at each root of this tree and joins the halves
+          back (Blelloch et al., "Just Join for Parallel Ordered Sets",
+          SPAA 2016): O(m log(n/m + 1)) for trees of m <= n keys
+        - Trees are treated as sets of distinct keys; for a key in both
+          this tree's node, and so its value, is kept
+        - other is left empty, its nodes reused or dropped"""
+        self._combine(other, self._union)
+
+    def intersection(self, other):
+        """Keep only the keys also in other, in place, like union"""
+        self._combine(other, self._intersection)
+
+    def difference(self, other):
+        """Remove every key that is in other, in place, like union"""
+        self._combine(other, self._difference)
 
     def in_order_walk(self, root=None, level=0):
         """In-order-walk the binary tree and make a list that
-        is an approximate representation of the tree """
-        if level == 0:
-            root = self.root
-            self.levels = []
-        if root:
-            self.in_order_walk(root.left, level+1)
-            self.levels.append([level, root.key])
-            self.in_order_walk(root.right, level+1)
-        if level == 0:
-            self._print_levels()
+        is an approximate representation of the tree
+        - Walks with an explicit stack rather than recursion"""
+        self.levels = []
+        nil = self.nil
+        node = self.root if root is None else root
+        stack = []
+        while stack or node is not nil:
+            if node is not nil:
+                stack.append((node, level))
+                node = node.left
+                level += 1
+            else:
+                node, level = stack.pop()
+                self.levels.append([level, node.key])
+                node = node.right
+                level += 1
+        self._print_levels()
 
     def _print_levels(self):
         def __find_max_level(levels):
@@ -357,10 +1834,10 @@ class RedBlackTree(object):
             return max_level
 
         def __draw_on_screen(levels, max_level):
-            print "-----"
+            print("-----")
             for i in range(max_level+1):
                 values = [x[1] for x in levels if x[0] == i]  # Group all nodes at ith level
-                print "Level {}: {}".format(i, values)
+                print("Level {}: {}".format(i, values))
 
         levels = self.levels
         max_level = __find_max_level(levels)
@@ -386,3 +1863,385 @@ class RedBlackTree(object):
             if root.red:
                 return left_black_height
             return left_black_height + 1
+
+
+class SizeNode(Node):
+    """Red-Black Tree Node that also counts the nodes in its subtree"""
+    __slots__ = ('size',)
+
+    def __init__(self, key):
+        Node.__init__(self, key)
+        self.size = 1
+
+
+class KeyedSizeNode(SizeNode):
+    """SizeNode for trees with a key function (see KeyedNode)"""
+    __slots__ = ('item',)
+
+    def __init__(self, key):
+        SizeNode.__init__(self, key)
+        self.item = key
+
+
+class OrderStatisticTree(RedBlackTree):
+    """Red-Black Tree augmented with subtree sizes
+    - Cormen et al. 14.1: Dynamic order statistics
+    - rank, select and count_range run in O(log n)
+    - Rotations, insert and delete keep every node's size current;
+      plain RedBlackTree pays none of this bookkeeping"""
+    def __init__(self, create_node=None, profiler=None, collect_stats=False, key=None, reverse=False):
+        if create_node is None:
+            create_node = SizeNode if key is None else KeyedSizeNode
+        RedBlackTree.__init__(self, create_node=create_node, profiler=profiler,
+                              collect_stats=collect_stats, key=key, reverse=reverse)
+        self.nil.size = 0
+
+    def left_rotate(self, x):
+        y = x.right
+        size = x.size
+        RedBlackTree.left_rotate(self, x)
+        y.size = size
+        x.size = x.left.size + x.right.size + 1
+
+    def right_rotate(self, y):
+        x = y.left
+        size = y.size
+        RedBlackTree.right_rotate(self, y)
+        x.size = size
+        y.size = y.left.size + y.right.size + 1
+
+    def _attach(self, parent, new_node):
+        RedBlackTree._attach(self, parent, new_node)
+        new_node.size = 1
+        nil = self.nil
+        while parent is not nil:
+            parent.size += 1
+            parent = parent.parent
+
+    def _build_sorted(self, keys):
+        RedBlackTree._build_sorted(self, keys)
+        nil = self.nil
+
+        def count(node):
+            if node is nil:
+                return 0
+            node.size = count(node.left) + count(node.right) + 1
+            return node.size
+
+        count(self.root)
+
+    def _count_nodes(self):
+        return self.root.size
+
+    def _refresh(self, node):
+        nil = self.nil
+        while node is not nil:
+            node.size = node.left.size + node.right.size + 1
+            node = node.parent
+
+    def delete_node(self, node, time=False):
+        """Shrink the sizes above the spliced-out position, then delete
+        - When node has two children its successor moves into its place
+          and takes over its (already shrunk) size"""
+        nil = self.nil
+        if node.left is nil or node.right is nil:
+            spliced = node
+        else:
+            spliced = self._leftmost(node.right)
+        parent = spliced.parent
+        while parent is not nil:
+            parent.size -= 1
+            parent = parent.parent
+        if spliced is not node:
+            spliced.size = node.size
+        RedBlackTree.delete_node(self, node, time=time)
+
+    def rank(self, key):
+        """Number of keys before key in the tree's order: less than key,
+        or greater with reverse"""
+        if self.reverse:
+            return self.root.size - self._rank_right(key)
+        return self._rank_left(key)
+
+    def _rank_left(self, key):
+        """Number of keys less than key"""
+        nil = self.nil
+        node = self.root
+        rank = 0
+        while node is not nil:
+            if node.key < key:
+                rank += node.left.size + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def _rank_right(self, key):
+        """Number of keys less than or equal to key"""
+        nil = self.nil
+        node = self.root
+        rank = 0
+        while node is not nil:
+            if key < node.key:
+                node = node.left
+            else:
+                rank += node.left.size + 1
+                node = node.right
+        return rank
+
+    def select(self, k):
+        """Node holding the kth key in the tree's order (0-based, negative
+        k counts from the end); IndexError if k is out of range"""
+        size = self.root.size
+        if k < 0:
+            k += size
+        if not 0 <= k < size:
+            raise IndexError("select index out of range")
+        if self.reverse:
+            k = size - 1 - k
+        node = self.root
+        while True:
+            left_size = node.left.size
+            if k < left_size:
+                node = node.left
+            elif k == left_size:
+                return node
+            else:
+                k -= left_size + 1
+                node = node.right
+
+    def count_range(self, lo, hi):
+        """Number of keys k with lo <= k <= hi (hi <= k <= lo with reverse)"""
+        if self.reverse:
+            lo, hi = hi, lo
+        if hi < lo:
+            return 0
+        return self._rank_right(hi) - self._rank_left(lo)
+
+
+class CountedNode(Node):
+    """Red-Black Tree Node holding count copies of its key"""
+    __slots__ = ('count',)
+
+    def __init__(self, key, value=None):
+        Node.__init__(self, key, value)
+        self.count = 1
+
+
+if NativeNode is not None:
+    class CountedNativeNode(NativeNode):
+        """CountedNode stored by the _red_black extension"""
+        __slots__ = ('count',)
+
+        def __init__(self, key, value=None):
+            NativeNode.__init__(self, key, value)
+            self.count = 1
+else:
+    CountedNativeNode = None
+
+
+def _copies(node):
+    return repeat(node.key, node.count)
+
+
+class MultisetTree(RedBlackTree):
+    """Red-Black Tree keeping one node per distinct key, with a count
+    - Inserting a key already present increments its node's count: no
+      node linked, no insert_fixup. delete_key decrements it and only
+      removes the node with the last copy
+    - len(), iteration and irange repeat each key count times;
+      number_of_nodes, items() and values() see distinct keys, a key's
+      value being shared by its copies
+    - union, intersection and difference see distinct keys too; a key
+      kept from this tree keeps its count
+    - No key function: items with equal sort keys could not share a node"""
+    def __init__(self, create_node=None, profiler=None, collect_stats=False, key=None, reverse=False):
+        if key is not None:
+            raise ValueError("MultisetTree does not take a key function")
+        if create_node is None:
+            create_node = CountedNativeNode or CountedNode
+        # Copies beyond the first of each key; None when split or the set
+        # operations leave it to be counted, like number_of_nodes
+        self._duplicates = 0
+        # Node the native core left unlinked, reused by the next insert
+        self._spare = None
+        RedBlackTree.__init__(self, create_node=create_node, profiler=profiler,
+                              collect_stats=collect_stats, reverse=reverse)
+
+    def __getstate__(self):
+        state = RedBlackTree.__getstate__(self)
+        state['_spare'] = None
+        return state
+
+    @property
+    def number_of_nodes(self):
+        return RedBlackTree.number_of_nodes.fget(self)
+
+    @number_of_nodes.setter
+    def number_of_nodes(self, n):
+        self._number_of_nodes = n
+        if not n:  # emptied (0) or left to be recounted (None)
+            self._duplicates = n
+
+    def _add_duplicates(self, n):
+        if self._duplicates is not None:
+            self._duplicates += n
+
+    def __len__(self):
+        if self._duplicates is None:
+            self._duplicates = sum(node.count - 1 for node in self._iterate(False, WALK_NODES))
+        return self.number_of_nodes + self._duplicates
+
+    def count(self, key):
+        """Number of copies of key in the tree"""
+        node = self.search(key)
+        return 0 if node is self.nil else node.count
+
+    def counts(self):
+        """(key, count) pairs in the tree's order"""
+        return imap(attrgetter('key', 'count'), self._iterate(self.reverse, WALK_NODES))
+
+    def insert(self, key, time=False):
+        """Add a copy of key, returning its node: a single descent that
+        stops at key's node to bump its count, else attaches a new one
+        - The native core is handed a node to attach up front; one it
+          leaves unlinked, key being present, is kept for the next call"""
+        profiler = self.profiler
+        if self._core is not None and not (time or profiler is not None or self.collect_stats):
+            new_node = self._spare
+            if new_node is None:
+                new_node = self.create_node(key)
+            else:
+                new_node.key = key
+            # The present node, else whether new_node raised the black height
+            node = self._core.insert(self, new_node, True)
+            if node is True or node is False:
+                self._spare = None
+                self._black_height += node
+                self._extend_extremes(new_node)
+                self._add_nodes(1)
+                return new_node
+            self._spare = new_node
+        else:
+            insert_start_time = clock() if time or profiler is not None else None
+            nil = self.nil
+            parent = nil
+            node = self.root
+            while node is not nil:
+                node_key = node.key
+                if key == node_key:
+                    break
+                parent = node
+                node = node.left if key < node_key else node.right
+            else:
+                new_node = self.create_node(key)
+                self._link(parent, new_node, time, insert_start_time)
+                return new_node
+            if self.collect_stats:
+                self._count_descent(self._depth(node))
+        node.count += 1
+        self._add_duplicates(1)
+        return node
+
+    def insert_many(self, keys):
+        """Insert every key of keys, returning the number inserted
+        - The batch is sorted and each run of equal keys costs one insert
+        - A batch larger than rebuild_ratio * number_of_nodes is merged
+          with the tree's keys and rebuilt, as in RedBlackTree"""
+        keys = sorted(keys)
+        if len(keys) > self.rebuild_ratio * self.number_of_nodes:
+            items = list(self._iterate(False, WALK_ITEMS))
+            self._build_sorted(list(heapq.merge(self._ascending_keys(), keys)))
+            self._restore_values(items)
+            return len(keys)
+        for key, run in groupby(keys):
+            extra = sum(1 for _ in run) - 1
+            node = self.insert(key)
+            if extra:
+                node.count += extra
+                self._add_duplicates(extra)
+        return len(keys)
+
+    def _ascending_keys(self):
+        return chain.from_iterable(imap(_copies, self._iterate(False, WALK_NODES)))
+
+    def _build_sorted(self, keys):
+        """Build from sorted keys, one node per run of equal keys"""
+        distinct = []
+        counts = []
+        for key, run in groupby(keys):
+            distinct.append(key)
+            counts.append(sum(1 for _ in run))
+        RedBlackTree._build_sorted(self, distinct)
+        for node, count in zip(self._iterate(False, WALK_NODES), counts):
+            node.count = count
+        self._duplicates = len(keys) - len(distinct)
+
+    def delete_key(self, key, time=False):
+        """Remove one copy of key, returning False if there is none"""
+        node = self.search(key)
+        if node is not self.nil and node.count > 1:
+            node.count -= 1
+            self._add_duplicates(-1)
+            return True
+        return RedBlackTree.delete_key(self, key, time=time)
+
+    def _remove_node(self, node):
+        """Remove one copy of node's key (pop_min, pop_max)"""
+        if node.count > 1:
+            node.count -= 1
+            self._add_duplicates(-1)
+        else:
+            RedBlackTree._remove_node(self, node)
+
+    def delete_many(self, keys):
+        """Remove one copy per key of keys, returning the number removed"""
+        removed = 0
+        for key, run in groupby(sorted(keys)):
+            copies = sum(1 for _ in run)
+            node = self.search(key)
+            if node is self.nil:
+                continue
+            if copies < node.count:
+                node.count -= copies
+                self._add_duplicates(-copies)
+                removed += copies
+            else:
+                self._add_duplicates(1 - node.count)
+                removed += node.count
+                self.delete_node(node)
+                self._add_nodes(-1)
+        return removed
+
+    def pop(self, key, *default):
+        """Remove one copy of key and return its value, or default if
+        given and key is absent"""
+        node = self.search(key)
+        if node is self.nil:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = node.value
+        self.delete_key(key)
+        return value
+
+    def __iter__(self):
+        return chain.from_iterable(imap(_copies, self._iterate(self.reverse, WALK_NODES)))
+
+    def __reversed__(self):
+        return chain.from_iterable(imap(_copies, self._iterate(not self.reverse, WALK_NODES)))
+
+    def keys(self):
+        return iter(self)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        if self.reverse:
+            lo, hi, inclusive, reverse = hi, lo, (inclusive[1], inclusive[0]), not reverse
+        return chain.from_iterable(imap(_copies, self._range_nodes(lo, hi, inclusive, reverse)))
+
+    def join(self, pivot, right, value=None):
+        duplicates = None
+        if self._duplicates is not None and right._duplicates is not None:
+            duplicates = self._duplicates + right._duplicates
+        RedBlackTree.join(self, pivot, right, value)
+        self._duplicates = duplicates
@@ -0,0 +1,337 @@
+from array import array
+
+NIL = 0
+
+
+class ArrayRedBlackTree(object):
+    """Red-Black Tree stored in parallel typed arrays
+    - A node is an integer slot into the key, left, right, parent and red
+      arrays; slot 0 is the nil sentinel
+    - Deleted slots are chained through right into a free list and reused
+    - Same CLRS rotations and fixups as RedBlackTree, over slots
+    - Keys must fit typecode ('d' float64 by default, 'l' for integers)"""
+    def __init__(self, typecode='d'):
+        self.typecode = typecode
+        self.key = array(typecode, [0])
+        self.left = array('i', [NIL])
+        self.right = array('i', [NIL])
+        self.parent = array('i', [NIL])
+        self.red = array('b', [0])
+        self.nil = NIL
+        self.root = NIL
+        self.free = NIL
+        self.number_of_nodes = 0
+
+    def _allocate(self, key):
+        """Return a fresh red slot holding key, reusing the free list first"""
+        slot = self.free
+        if slot != NIL:
+            self.free = self.right[slot]
+            self.key[slot] = key
+            self.left[slot] = NIL
+            self.right[slot] = NIL
+            self.parent[slot] = NIL
+            self.red[slot] = 1
+            return slot
+
+        slot = len(self.key)
+        self.key.append(key)
+        self.left.append(NIL)
+        self.right.append(NIL)
+        self.parent.append(NIL)
+        self.red.append(1)
+        return slot
+
+    def _release(self, slot):
+        """Push slot onto the free list"""
+        self.red[slot] = 0
+        self.left[slot] = NIL
+        self.parent[slot] = NIL
+        self.right[slot] = self.free
+        self.free = slot
+
+    def left_rotate(self, x):
+        left, right, parent = self.left, self.right, self.parent
+        y = right[x]
+        right[x] = left[y]
+        if left[y] != NIL:
+            parent[left[y]] = x
+        parent[y] = parent[x]
+        if parent[x] == NIL:
+            self.root = y
+        elif x == left[parent[x]]:
+            left[parent[x]] = y
+        else:
+            right[parent[x]] = y
+        left[y] = x
+        parent[x] = y
+
+    def right_rotate(self, y):
+        left, right, parent = self.left, self.right, self.parent
+        x = left[y]
+        left[y] = right[x]
+        if right[x] != NIL:
+            parent[right[x]] = y
+        parent[x] = parent[y]
+        if parent[y] == NIL:
+            self.root = x
+        elif y == right[parent[y]]:
+            right[parent[y]] = x
+        else:
+            left[parent[y]] = x
+        right[x] = y
+        parent[y] = x
+
+    def insert(self, key):
+        """Insert key into the tree by way of binary search"""
+        keys, left, right = self.key, self.left, self.right
+        y = NIL
+        x = self.root
+        while x != NIL:
+            y = x
+            if key < keys[x]:
+                x = left[x]
+            else:
+                x = right[x]
+
+        new_node = self._allocate(key)
+        self.parent[new_node] = y
+        if y == NIL:
+            self.root = new_node
+        elif key < keys[y]:
+            left[y] = new_node
+        else:
+            right[y] = new_node
+
+        self.insert_fixup(new_node)
+        self.number_of_nodes += 1
+        return new_node
+
+    def insert_fixup(self, new_node):
+        """RedBlackTree.insert_fixup over slots"""
+        left, right, parent, red = self.left, self.right, self.parent, self.red
+        while red[parent[new_node]]:
+            p = parent[new_node]
+            g = parent[p]
+            if p == left[g]:
+                uncle = right[g]
+                # Case 1: uncle is red
+                if red[uncle]:
+                    red[p] = 0
+                    red[uncle] = 0
+                    red[g] = 1
+                    new_node = g
+                else:
+                    # Case 2: uncle is black and new_node is a right child
+                    if new_node == right[p]:
+                        new_node = p
+                        self.left_rotate(new_node)
+                    # Case 3: uncle is black and new_node is a left child
+                    p = parent[new_node]
+                    g = parent[p]
+                    red[p] = 0
+                    red[g] = 1
+                    self.right_rotate(g)
+            else:
+                uncle = left[g]
+                if red[uncle]:
+                    red[p] = 0
+                    red[uncle] = 0
+                    red[g] = 1
+                    new_node = g
+                else:
+                    if new_node == left[p]:
+                        new_node = p
+                        self.right_rotate(new_node)
+                    p = parent[new_node]
+                    g = parent[p]
+                    red[p] = 0
+                    red[g] = 1
+                    self.left_rotate(g)
+        red[self.root] = 0
+
+    def search(self, key, root=None):
+        """Binary Search for key, returning its slot or nil"""
+        keys, left, right = self.key, self.left, self.right
+        if root is None:
+            root = self.root
+
+        while root != NIL and key != keys[root]:
+            if key < keys[root]:
+                root = left[root]
+            else:
+                root = right[root]
+
+        return root
+
+    def __contains__(self, key):
+        return self.search(key) != NIL
+
+    def minimum(self, root=None):
+        """Find the minimum slot of a tree rooted at root"""
+        if root is None:
+            root = self.root
+
+        if root == NIL:
+            return
+        left = self.left
+        while left[root] != NIL:
+            root = left[root]
+
+        return root
+
+    def maximum(self, root=None):
+        """Find the maximum slot of a tree rooted at root"""
+        if root is None:
+            root = self.root
+
+        if root == NIL:
+            return
+        right = self.right
+        while right[root] != NIL:
+            root = right[root]
+
+        return root
+
+    def transplant(self, u, v):
+        """Replace subtree rooted at u with subtree rooted at v"""
+        parent = self.parent
+        if parent[u] == NIL:
+            self.root = v
+        elif u == self.left[parent[u]]:
+            self.left[parent[u]] = v
+        else:
+            self.right[parent[u]] = v
+        if v != NIL:
+            parent[v] = parent[u]
+
+    def delete_key(self, key):
+        """Delete one slot holding key, returning False if there is none"""
+        node = self.search(key)
+        if node == NIL:
+            return False
+        self.delete_node(node)
+        self.number_of_nodes -= 1
+        return True
+
+    def delete_node(self, node):
+        left, right, parent, red = self.left, self.right, self.parent, self.red
+        y = node
+        y_original_color = red[y]
+
+        if left[node] == NIL:
+            x = right[node]
+            x_parent = parent[node]
+            self.transplant(node, x)
+        elif right[node] == NIL:
+            x = left[node]
+            x_parent = parent[node]
+            self.transplant(node, x)
+        else:
+            y = self.minimum(right[node])
+            y_original_color = red[y]
+            x = right[y]
+            if parent[y] == node:
+                x_parent = y
+            else:
+                x_parent = parent[y]
+                self.transplant(y, x)
+                right[y] = right[node]
+                parent[right[y]] = y
+            self.transplant(node, y)
+            left[y] = left[node]
+            parent[left[y]] = y
+            red[y] = red[node]
+
+        self._release(node)
+        if not y_original_color:
+            self.delete_node_fixup(x, x_parent)
+
+    def delete_node_fixup(self, node, parent_node):
+        """RedBlackTree.delete_node_fixup over slots"""
+        left, right, parent, red = self.left, self.right, self.parent, self.red
+        while node != self.root and not red[node]:
+            if node == left[parent_node]:
+                sibling = right[parent_node]
+                # Case 1: sibling is red
+                if red[sibling]:
+                    red[sibling] = 0
+                    red[parent_node] = 1
+                    self.left_rotate(parent_node)
+                    sibling = right[parent_node]
+                # Case 2: sibling is black, both sibling's children are black
+                if not red[left[sibling]] and not red[right[sibling]]:
+                    red[sibling] = 1
+                    node = parent_node
+                    parent_node = parent[node]
+                else:
+                    # Case 3: sibling is black, its right child is black
+                    if not red[right[sibling]]:
+                        red[left[sibling]] = 0
+                        red[sibling] = 1
+                        self.right_rotate(sibling)
+                        sibling = right[parent_node]
+                    # Case 4: sibling is black and its right child is red
+                    red[sibling] = red[parent_node]
+                    red[parent_node] = 0
+                    red[right[sibling]] = 0
+                    self.left_rotate(parent_node)
+                    node = self.root
+            else:
+                sibling = left[parent_node]
+                if red[sibling]:
+                    red[sibling] = 0
+                    red[parent_node] = 1
+                    self.right_rotate(parent_node)
+                    sibling = left[parent_node]
+                if not red[right[sibling]] and not red[left[sibling]]:
+                    red[sibling] = 1
+                    node = parent_node
+                    parent_node = parent[node]
+                else:
+                    if not red[left[sibling]]:
+                        red[right[sibling]] = 0
+                        red[sibling] = 1
+                        self.left_rotate(sibling)
+                        sibling = left[parent_node]
+                    red[sibling] = red[parent_node]
+                    red[parent_node] = 0
+                    red[left[sibling]] = 0
+                    self.right_rotate(parent_node)
+                    node = self.root
+        red[node] = 0
+
+    def black_height(self, root):
+        """Find the height of a tree counting only black nodes,
+        0 if the tree rooted at root is unbalanced"""
+        if root == NIL:
+            return 1
+
+        left_black_height = self.black_height(self.left[root])
+        if left_black_height == 0:
+            return left_black_height
+
+        right_black_height = self.black_height(self.right[root])
+        if right_black_height == 0:
+            return right_black_height
+
+        if left_black_height != right_black_height:
+            return 0
+        if self.red[root]:
+            return left_black_height
+        return left_black_height + 1
+
+    def snapshot(self):
+        """Independent copy of the tree: one buffer copy per array"""
+        copy = ArrayRedBlackTree.__new__(ArrayRedBlackTree)
+        copy.typecode = self.typecode
+        copy.key = self.key[:]
+        copy.left = self.left[:]
+        copy.right = self.right[:]
+        copy.parent = self.parent[:]
+        copy.red = self.red[:]
+        copy.nil = NIL
+        copy.root = self.root
+        copy.free = self.free
+        copy.number_of_nodes = self.number_of_nodes
+        return copy
@@ -0,0 +1,314 @@
+"""Headless benchmarks for the Red-Black Trees
+
+    python -m red_black_bench --sizes 10000 100000 --format json --output run.json
+    python -m red_black_bench --baseline run.json
+
+Each workload runs over keys in sequential, random or adversarial order
+and reports ops/sec (best of --repeat untimed runs), per-operation
+latency percentiles (a separate timed run), rotations per operation
+(a run with a Profiler attached) and, for inserts, bytes per key.
+Against a --baseline the exit status is 1 when any matching result lost
+more than --threshold of its ops/sec."""
+import argparse
+import collections
+import csv
+import gc
+import json
+import platform
+import random
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from red_black import OrderStatisticTree, Profiler, RedBlackTree, clock
+
+TREES = {
+    'RedBlackTree': RedBlackTree,
+    'OrderStatisticTree': OrderStatisticTree,
+}
+ORDERS = ('sequential', 'random', 'adversarial')
+FIELDS = ('tree', 'workload', 'order', 'n', 'ops_per_sec', 'p50_us', 'p90_us', 'p99_us',
+          'rotations_per_op', 'bytes_per_key')
+
+
+def key_order(order, n, rng):
+    """n distinct integer keys in the given order
+    - adversarial alternates between the two ends of the range, working
+      inward, so every insert lands at the bottom of the tree's outermost
+      paths and the fixups keep rotating near both spines"""
+    keys = list(range(n))
+    if order == 'random':
+        rng.shuffle(keys)
+    elif order == 'adversarial':
+        keys = [keys[i // 2] if i % 2 == 0 else keys[n - 1 - i // 2] for i in range(n)]
+    return keys
+
+
+def exhaust(iterable):
+    collections.deque(iterable, maxlen=0)
+
+
+def setup_insert(create_tree, keys, rng):
+    tree = create_tree()
+    return tree, [(tree.insert, key) for key in keys]
+
+
+def setup_delete(create_tree, keys, rng):
+    tree = create_tree.from_iterable(keys)
+    return tree, [(tree.delete_key, key) for key in keys]
+
+
+def setup_search(create_tree, keys, rng):
+    tree = create_tree.from_iterable(keys)
+    return tree, [(tree.search, key) for key in keys]
+
+
+def setup_iterate(create_tree, keys, rng):
+    tree = create_tree.from_iterable(keys)
+    return tree, [(exhaust, tree)]
+
+
+def setup_mixed(create_tree, keys, rng):
+    """Half searches, a quarter inserts and a quarter deletes, over keys
+    half of which are in the tree to begin with"""
+    tree = create_tree.from_iterable(keys[::2])
+    operations = []
+    for key in keys:
+        choice = rng.random()
+        if choice < 0.5:
+            operations.append((tree.search, key))
+        elif choice < 0.75:
+            operations.append((tree.insert, key))
+        else:
+            operations.append((tree.delete_key, key))
+    return tree, operations
+
+
+WORKLOADS = collections.OrderedDict([
+    ('insert', setup_insert),
+    ('delete', setup_delete),
+    ('search', setup_search),
+    ('iterate', setup_iterate),
+    ('mixed', setup_mixed),
+])
+
+
+def percentile(ordered, q):
+    """qth percentile (0 < q <= 100) of the sorted list ordered"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def measure(create_tree, workload, order, n, repeat=3, seed=0):
+    """One result row for workload over n keys in order"""
+    setup = WORKLOADS[workload]
+
+    def prepare(factory=create_tree):
+        rng = random.Random(seed)
+        tree, operations = setup(factory, key_order(order, n, rng), rng)
+        gc.collect()
+        return tree, operations
+
+    best = None
+    for _ in range(repeat):
+        tree, operations = prepare()
+        start = clock()
+        for operation, argument in operations:
+            operation(argument)
+        elapsed = clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del tree, operations
+
+    latencies = []
+    tree, operations = prepare()
+    if len(operations) > 1:
+        for operation, argument in operations:
+            start = clock()
+            operation(argument)
+            latencies.append(clock() - start)
+        latencies.sort()
+    del tree, operations
+
+    profiler = Profiler()
+    tree, operations = prepare(ProfiledFactory(create_tree, profiler))
+    profiler.reset()
+    for operation, argument in operations:
+        operation(argument)
+    del tree, operations
+
+    row = {
+        'tree': create_tree.__name__,
+        'workload': workload,
+        'order': order,
+        'n': n,
+        'ops_per_sec': n / best if best else None,
+        'p50_us': None,
+        'p90_us': None,
+        'p99_us': None,
+        'rotations_per_op': float(profiler.counts['rotation']) / n if n else 0.0,
+        'bytes_per_key': bytes_per_key(create_tree, order, n, seed) if workload == 'insert' else None,
+    }
+    for q in (50, 90, 99):
+        value = percentile(latencies, q)
+        row['p{}_us'.format(q)] = None if value is None else value * 1e6
+    return row
+
+
+class ProfiledFactory(object):
+    """Stands in for a tree class, building its trees with profiler attached"""
+    def __init__(self, create_tree, profiler):
+        self.create_tree = create_tree
+        self.profiler = profiler
+
+    def __call__(self):
+        return self.create_tree(profiler=self.profiler)
+
+    def from_iterable(self, keys):
+        return self.create_tree.from_iterable(keys, profiler=self.profiler)
+
+
+def bytes_per_key(create_tree, order, n, seed=0):
+    """Bytes of tree structure per key after inserting n keys, or None
+    without tracemalloc"""
+    if tracemalloc is None or not n:
+        return None
+    keys = key_order(order, n, random.Random(seed))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tree = create_tree()
+        for key in keys:
+            tree.insert(key)
+        return float(tracemalloc.get_traced_memory()[0] - before) / n
+    finally:
+        tracemalloc.stop()
+
+
+def run(trees, workloads, orders, sizes, repeat=3, seed=0, progress=None):
+    rows = []
+    for name in trees:
+        for workload in workloads:
+            for order in orders:
+                for n in sizes:
+                    row = measure(TREES[name], workload, order, n, repeat, seed)
+                    rows.append(row)
+                    if progress is not None:
+                        progress(row)
+    return rows
+
+
+def format_row(row):
+    def number(value, width, precision):
+        if value is None:
+            return '-'.rjust(width)
+        return '{:{}.{}f}'.format(value, width, precision)
+
+    return '{:<18} {:<8} {:<11} {:>8} {} ops/s  p50 {} p90 {} p99 {} us  {} rot/op  {} B/key'.format(
+        row['tree'], row['workload'], row['order'], row['n'],
+        number(row['ops_per_sec'], 10, 0), number(row['p50_us'], 7, 2),
+        number(row['p90_us'], 7, 2), number(row['p99_us'], 7, 2),
+        number(row['rotations_per_op'], 5, 2), number(row['bytes_per_key'], 6, 1))
+
+
+def write_results(rows, output_format, stream):
+    if output_format == 'json':
+        json.dump({
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'results': rows,
+        }, stream, indent=2, sort_keys=True)
+        stream.write('\n')
+    elif output_format == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    else:
+        for row in rows:
+            stream.write(format_row(row) + '\n')
+
+
+def load_results(path):
+    """Result rows of a JSON or CSV file written by write_results"""
+    with open(path) as f:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+            for row in rows:
+                row['n'] = int(row['n'])
+                row['ops_per_sec'] = float(row['ops_per_sec']) if row['ops_per_sec'] else None
+            return rows
+        return json.load(f)['results']
+
+
+def compare(rows, baseline, threshold=0.1):
+    """(row, baseline ops/sec, ratio, regressed) for each row that has a
+    counterpart in baseline"""
+    def identity(row):
+        return row['tree'], row['workload'], row['order'], int(row['n'])
+
+    previous = dict((identity(row), row) for row in baseline)
+    comparisons = []
+    for row in rows:
+        old = previous.get(identity(row))
+        if old is None or not old['ops_per_sec'] or not row['ops_per_sec']:
+            continue
+        ratio = row['ops_per_sec'] / float(old['ops_per_sec'])
+        comparisons.append((row, old['ops_per_sec'], ratio, ratio < 1 - threshold))
+    return comparisons
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m red_black_bench',
+                                     description="Headless Red-Black Tree benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 5],
+                        help="numbers of keys (default: 10000 100000)")
+    parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--orders', nargs='+', choices=ORDERS, default=list(ORDERS))
+    parser.add_argument('--trees', nargs='+', choices=sorted(TREES), default=['RedBlackTree'])
+    parser.add_argument('--repeat', type=int, default=3, help="untimed runs, best one reported")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=('table', 'json', 'csv'), default='table')
+    parser.add_argument('--output', help="file to write results to (default: stdout)")
+    parser.add_argument('--baseline', help="JSON or CSV results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fractional ops/sec loss counted as a regression (default: 0.1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if arguments.output is not None:
+        progress_stream = sys.stderr
+    elif arguments.format == 'table':
+        progress_stream = sys.stdout
+    else:
+        progress_stream = None
+    progress = None if progress_stream is None else (
+        lambda row: progress_stream.write(format_row(row) + '\n'))
+    rows = run(arguments.trees, arguments.workloads, arguments.orders, arguments.sizes,
+               arguments.repeat, arguments.seed, progress)
+
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as f:
+            write_results(rows, arguments.format, f)
+    elif arguments.format != 'table':
+        write_results(rows, arguments.format, sys.stdout)
+
+    if arguments.baseline is None:
+        return 0
+    regressions = 0
+    for row, old, ratio, regressed in compare(rows, load_results(arguments.baseline), arguments.threshold):
+        regressions += regressed
+        sys.stderr.write('{:<18} {:<8} {:<11} {:>8} {:10.0f} -> {:10.0f} ops/s ({:+.1%}){}\n'.format(
+            row['tree'], row['workload'], row['order'], row['n'], old, row['ops_per_sec'],
+            ratio - 1, '  REGRESSION' if regressed else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import threading
+from contextlib import contextmanager
+
+from red_black import RedBlackTree
+
+_missing = object()
+
+
+class ReadWriteLock(object):
+    """Many readers or one writer
+    - Writer-preferring: once a writer waits, new readers queue behind
+      it, so a steady stream of searches cannot starve inserts"""
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class ConcurrentRedBlackTree(object):
+    """RedBlackTree shared between threads
+    - Point lookups are optimistic and lock-free: a writer bumps version
+      to odd before mutating and back to even after, and a lookup that
+      saw the same even version before and after its descent stands.
+      Descents stay safe mid-rotation because child links never form a
+      cycle and nil links nowhere. A lookup that keeps colliding with
+      writers falls back to the shared lock
+    - Lookups write nothing: the cached minimum and maximum nodes are
+      only filled in under the exclusive lock, so a torn read cannot
+      leave a stale one behind. search, get and [] descend in the native
+      core when the tree has one, which holds every node it compares
+      against, so a descent racing a writer is memory safe and at worst
+      torn; without it they descend in pure Python
+    - Scans (iteration, irange, items) are collected under one shared
+      lock and returned as lists, so each is a consistent view
+    - Inserts, deletes and rotations run alone under the exclusive lock
+    - The wrapped tree must not collect search stats, which would make
+      every lookup a write"""
+    optimistic_attempts = 3
+
+    def __init__(self, tree=None, **kwargs):
+        if tree is None:
+            tree = RedBlackTree(**kwargs)
+        if tree.collect_stats:
+            raise ValueError("searches of a collect_stats tree are not read-only")
+        self.tree = tree
+        self.lock = ReadWriteLock()
+        self.version = 0
+        self._core_search = tree._core.search if tree._core is not None else None
+
+    @contextmanager
+    def read_locked(self):
+        """Run read-only code against the underlying tree"""
+        with self.lock.read_locked():
+            yield self.tree
+
+    @contextmanager
+    def write_locked(self):
+        """Run arbitrary code against the underlying tree, exclusively"""
+        with self.lock.write_locked():
+            self.version += 1
+            try:
+                yield self.tree
+                self._fill_extremes()
+            finally:
+                self.version += 1
+
+    def _fill_extremes(self):
+        """Cache the extreme nodes (O(1) while they are cached already)
+        for the lock-free minimum and maximum"""
+        self.tree._leftmost()
+        self.tree._rightmost()
+
+    def _lookup(self, read, *args):
+        """Run read(*args) optimistically, under the shared lock if need be"""
+        # The first attempt inline: no writer, no retry loop
+        version = self.version
+        if not version & 1:
+            try:
+                result = read(*args)
+            except Exception:
+                if self.version == version:
+                    raise
+            else:
+                if self.version == version:
+                    return result
+        for _ in range(self.optimistic_attempts - 1):
+            version = self.version
+            if version & 1:
+                continue
+            try:
+                result = read(*args)
+            except Exception:
+                # Only a read torn by a writer may fail spuriously
+                if self.version == version:
+                    raise
+                continue
+            if self.version == version:
+                return result
+        with self.lock.read_locked():
+            return read(*args)
+
+    # Readers
+
+    def _search(self, key):
+        core_search = self._core_search
+        if core_search is None:
+            return self.tree._descend(key)
+        tree = self.tree
+        return core_search(tree.root, tree.nil, key)
+
+    def search(self, key):
+        # The first attempt of _lookup, inlined for the common case
+        version = self.version
+        if not version & 1:
+            try:
+                node = self._search(key)
+            except Exception:
+                pass
+            else:
+                if self.version == version:
+                    return node
+        return self._lookup(self._search, key)
+
+    def __contains__(self, key):
+        return self.search(key) is not self.tree.nil
+
+    def _get(self, key, default):
+        node = self._search(key)
+        return default if node is self.tree.nil else node.value
+
+    def __getitem__(self, key):
+        value = self._lookup(self._get, key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self._lookup(self._get, key, default)
+
+    def __len__(self):
+        # A pending recount walks the tree, which must not race a writer
+        with self.lock.read_locked():
+            return self.tree.number_of_nodes
+
+    def _extreme(self, rightmost):
+        """The cached leftmost or rightmost node, else found by a descent
+        that leaves the cache alone"""
+        tree = self.tree
+        node = tree._max if rightmost else tree._min
+        if node is None:
+            node = tree._rightmost(tree.root) if rightmost else tree._leftmost(tree.root)
+        return node
+
+    def minimum(self):
+        return self._lookup(self._extreme, self.tree.reverse)
+
+    def maximum(self):
+        return self._lookup(self._extreme, not self.tree.reverse)
+
+    def floor(self, key):
+        return self._lookup(self.tree.floor, key)
+
+    def ceiling(self, key):
+        return self._lookup(self.tree.ceiling, key)
+
+    def keys(self):
+        with self.lock.read_locked():
+            return list(self.tree)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        with self.lock.read_locked():
+            return list(self.tree.items())
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        with self.lock.read_locked():
+            return list(self.tree.irange(lo, hi, inclusive, reverse))
+
+    def black_height(self):
+        with self.lock.read_locked():
+            return self.tree.black_height(self.tree.root)
+
+    # Writers
+
+    def insert(self, key):
+        with self.write_locked() as tree:
+            tree.insert(key)
+
+    def delete_key(self, key):
+        with self.write_locked() as tree:
+            return tree.delete_key(key)
+
+    def __setitem__(self, key, value):
+        with self.write_locked() as tree:
+            tree[key] = value
+
+    def __delitem__(self, key):
+        with self.write_locked() as tree:
+            del tree[key]
+
+    def pop(self, key, *default):
+        with self.write_locked() as tree:
+            return tree.pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        with self.write_locked() as tree:
+            return tree.setdefault(key, default)
+
+    def insert_many(self, keys):
+        with self.write_locked() as tree:
+            return tree.insert_many(keys)
+
+    def delete_many(self, keys):
+        with self.write_locked() as tree:
+            return tree.delete_many(keys)
@@ -0,0 +1,131 @@
+from red_black import RedBlackTree, clock
+
+
+class ExpiryIndex(object):
+    """Key-value cache whose entries expire at a deadline
+    - A dict maps each key to its entry and a RedBlackTree orders the
+      entries by deadline (node.key, with the cache key as node.value),
+      so expire(now) is one split at now: the expired entries come off
+      as a whole tree in O(log n), leaving O(k) dict deletions for k of
+      them instead of k rebalancing deletes
+    - touch re-keys an entry to a new deadline: its node is deleted
+      directly (the dict holds it, no search) and a new one inserted
+    - maxsize bounds the number of entries: set evicts the entry with
+      the earliest deadline, through the tree's cached minimum, until
+      the new entry fits
+    - lru=True makes expiry sliding: get and touch push an entry's
+      deadline to now + its ttl. With one ttl for every entry the
+      earliest deadline is then the least recently used entry, so
+      maxsize evicts in LRU order
+    - Expired entries stay until expire removes them: get and
+      __contains__ ignore them, len counts them
+    - timer gives the current time (default red_black.clock), in the
+      unit of ttl"""
+    def __init__(self, ttl=None, maxsize=None, lru=False, timer=clock):
+        """ttl is the default time to live of set"""
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lru = lru
+        self.timer = timer
+        self.tree = RedBlackTree()
+        # key: [node, value, ttl]
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _insert(self, key, deadline):
+        node = self.tree.insert(deadline)
+        node.value = key
+        return node
+
+    def _remove(self, node):
+        self.tree.delete_node(node)
+        self.tree._add_nodes(-1)
+
+    def set(self, key, value, ttl=None):
+        """Map key to value until ttl (default self.ttl) from now"""
+        if ttl is None:
+            ttl = self.ttl
+            if ttl is None:
+                raise ValueError("no ttl given and no default ttl")
+        deadline = self.timer() + ttl
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._remove(entry[0])
+            entry[0] = self._insert(key, deadline)
+            entry[1] = value
+            entry[2] = ttl
+            return
+        maxsize = self.maxsize
+        if maxsize is not None:
+            while len(self._entries) >= maxsize:
+                _, evicted = self.tree.pop_min()
+                del self._entries[evicted]
+        self._entries[key] = [self._insert(key, deadline), value, ttl]
+
+    def get(self, key, default=None):
+        """Value of key, or default if it is absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        now = self.timer()
+        if not now < entry[0].key:
+            return default
+        if self.lru:
+            self._rekey(key, entry, now + entry[2])
+        return entry[1]
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and self.timer() < entry[0].key
+
+    def _rekey(self, key, entry, deadline):
+        self._remove(entry[0])
+        entry[0] = self._insert(key, deadline)
+
+    def touch(self, key, ttl=None):
+        """Move key's deadline to ttl (default the entry's own ttl) from
+        now, returning False if key is absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        now = self.timer()
+        if not now < entry[0].key:
+            return False
+        if ttl is not None:
+            entry[2] = ttl
+        self._rekey(key, entry, now + entry[2])
+        return True
+
+    def deadline(self, key):
+        """When key expires; KeyError if it is absent"""
+        return self._entries[key][0].key
+
+    def delete(self, key):
+        """Remove key, returning False if it is absent"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._remove(entry[0])
+        return True
+
+    def expire(self, now=None):
+        """Remove every entry whose deadline is at or before now (default
+        timer()), returning their (key, value) pairs in deadline order
+        - One split: the tree keeps the later deadlines and the expired
+          ones are dropped with the split-off tree"""
+        if now is None:
+            now = self.timer()
+        tree = self.tree
+        minimum = tree.minimum()
+        if minimum is None or now < minimum.key:
+            return []
+        live = tree.split(now, inclusive=True)
+        entries = self._entries
+        expired = []
+        for key in tree.values():
+            expired.append((key, entries.pop(key)[1]))
+        live.number_of_nodes = len(entries)
+        self.tree = live
+        return expired
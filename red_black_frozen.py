@@ -0,0 +1,115 @@
+import numpy as np
+
+
+def eytzinger_order(n):
+    """Heap indexes (1-based, children of k at 2k and 2k + 1) of a
+    complete binary tree of n nodes, in in-order sequence
+    - In a perfect tree of depth d the in-order position of node k on
+      level l is (2 (k - 2**l) + 1) 2**(d - 1 - l) - 1; a complete tree
+      is a perfect one with the indexes above n cut off, which leaves
+      the in-order sequence otherwise intact"""
+    depth = n.bit_length()
+    k = np.arange(1, 2 ** depth, dtype=np.int64)
+    level = np.zeros(len(k), dtype=np.int64)
+    shifted = k >> 1
+    while shifted.any():
+        level += shifted > 0
+        shifted >>= 1
+    positions = (2 * (k - (1 << level)) + 1) * (1 << (depth - 1 - level)) - 1
+    order = np.empty(len(k), dtype=np.int64)
+    order[positions] = k
+    return order[order <= n]
+
+
+class FrozenTree(object):
+    """Immutable snapshot of a tree's keys for vectorized batch lookups
+    - keys is a sorted NumPy array; every query takes a whole array of
+      probes (or a scalar) and answers it in one call, elementwise
+    - eytzinger=True also lays the keys out in heap (BFS) order and
+      searches that with a branch-free descent per level over all probes
+      at once, so each level reads one contiguous region of the array
+      (Khuong and Morin, "Array Layouts for Comparison-Based Searching",
+      2017); without it searches are numpy.searchsorted on keys
+    - Re-freezing after updates is one walk of the tree into an array
+      (plus the layout, vectorized, with eytzinger)
+    - Made by RedBlackTree.freeze: the sort keys in ascending order
+      whatever the tree's reverse, every copy of a MultisetTree key"""
+    def __init__(self, keys, eytzinger=False):
+        """keys must be sorted"""
+        self.keys = np.asarray(keys)
+        n = len(self.keys)
+        self.eytzinger = eytzinger
+        if eytzinger:
+            order = eytzinger_order(n)
+            # layout[k] is the key at heap index k; rank_of[k] its index
+            # in keys, rank_of[0] == n standing for "past the end"
+            self.layout = np.empty(n + 1, dtype=self.keys.dtype)
+            self.layout[order] = self.keys
+            if n:
+                self.layout[0] = self.keys[0]
+            self.rank_of = np.empty(n + 1, dtype=np.int64)
+            self.rank_of[order] = np.arange(n, dtype=np.int64)
+            self.rank_of[0] = n
+
+    @classmethod
+    def from_keys(cls, keys, eytzinger=False, dtype=None):
+        """Snapshot of an iterable of sorted keys; dtype defaults to
+        NumPy's guess"""
+        if dtype is None:
+            keys = np.array(list(keys))
+        else:
+            keys = np.fromiter(keys, dtype=dtype)
+        return cls(keys, eytzinger)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _search(self, probes, side):
+        """numpy.searchsorted(keys, probes, side)"""
+        if not self.eytzinger:
+            return np.searchsorted(self.keys, probes, side)
+        layout = self.layout
+        n = len(layout) - 1
+        probes = np.asarray(probes)
+        k = np.ones(probes.shape, dtype=np.int64)
+        for _ in range(n.bit_length()):
+            inside = k <= n
+            node_keys = layout[np.minimum(k, n)]
+            right = node_keys < probes if side == 'left' else node_keys <= probes
+            k = np.where(inside, 2 * k + right, k)
+        # Undo the right turns after the last left one: what remains is
+        # the heap index of the bound, 0 if there is none
+        k //= 2 * (~k & (k + 1))
+        return self.rank_of[k]
+
+    def rank(self, probes):
+        """Number of keys less than each probe"""
+        return self._search(probes, 'left')
+
+    def count_range(self, lo, hi):
+        """Number of keys k with lo <= k <= hi, elementwise"""
+        return np.maximum(self._search(hi, 'right') - self._search(lo, 'left'), 0)
+
+    def contains(self, probes):
+        """Boolean array: is each probe a key"""
+        keys = self.keys
+        if not len(keys):
+            return np.zeros(np.shape(probes), dtype=bool)
+        i = self._search(probes, 'left')
+        return (i < len(keys)) & (keys[np.minimum(i, len(keys) - 1)] == probes)
+
+    def floor(self, probes):
+        """Greatest key <= each probe, masked where there is none"""
+        i = self._search(probes, 'right') - 1
+        return self._take(i, i < 0)
+
+    def ceiling(self, probes):
+        """Least key >= each probe, masked where there is none"""
+        i = self._search(probes, 'left')
+        return self._take(i, i >= len(self.keys))
+
+    def _take(self, i, missing):
+        keys = self.keys
+        if not len(keys):
+            return np.ma.masked_all(np.shape(i), dtype=keys.dtype)
+        return np.ma.array(keys[np.clip(i, 0, len(keys) - 1)], mask=missing)
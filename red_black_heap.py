@@ -0,0 +1,98 @@
+from itertools import islice
+
+from red_black import RedBlackTree
+
+
+class RedBlackHeap(object):
+    """Priority queue over a RedBlackTree, shaped like a heapq list
+    - push and pop are O(log n), the smallest item (heap[0]) is O(1)
+      through the tree's cached minimum, and pop deletes that node
+      without a search
+    - Unlike heapq, equal items pop in insertion order, any item can be
+      removed in O(log n) and the largest is as cheap as the smallest
+    - key orders items by key(item), computed once per push"""
+    def __init__(self, iterable=(), key=None):
+        self.tree = RedBlackTree.from_iterable(iterable, key=key)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __bool__(self):
+        return bool(self.tree.number_of_nodes)
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        """Items in pop order"""
+        return iter(self.tree)
+
+    def __getitem__(self, index):
+        """heap[0] is the smallest item; no other index is supported"""
+        if index != 0:
+            raise IndexError("only heap[0] is supported")
+        return self.peek()
+
+    def push(self, item):
+        self.tree.insert(item)
+
+    def pop(self):
+        """Remove and return the smallest item; IndexError if empty"""
+        return self.tree.pop_min()[0]
+
+    def peek(self):
+        return self.tree.peek_min()[0]
+
+    def pop_max(self):
+        return self.tree.pop_max()[0]
+
+    def peek_max(self):
+        return self.tree.peek_max()[0]
+
+    def pushpop(self, item):
+        """Push item, then pop and return the smallest item, faster than
+        the two calls (item itself if it is not greater than heap[0])"""
+        tree = self.tree
+        minimum = tree.minimum()
+        sort_key = item if tree.key_function is None else tree.key_function(item)
+        if minimum is None or not minimum.key < sort_key:
+            return item
+        smallest = tree.pop_min()[0]
+        tree.insert(item)
+        return smallest
+
+    def replace(self, item):
+        """Pop and return the smallest item, then push item; IndexError if empty"""
+        smallest = self.tree.pop_min()[0]
+        self.tree.insert(item)
+        return smallest
+
+    def remove(self, sort_key):
+        """Remove one item with sort key sort_key (the item itself without
+        a key function), returning False if there is none"""
+        return self.tree.delete_key(sort_key)
+
+    def nsmallest(self, n):
+        return list(islice(self.tree, n))
+
+    def nlargest(self, n):
+        return list(islice(reversed(self.tree), n))
+
+
+def heappush(heap, item):
+    """heapq.heappush for a RedBlackHeap"""
+    heap.push(item)
+
+
+def heappop(heap):
+    """heapq.heappop for a RedBlackHeap"""
+    return heap.pop()
+
+
+def heappushpop(heap, item):
+    """heapq.heappushpop for a RedBlackHeap"""
+    return heap.pushpop(item)
+
+
+def heapreplace(heap, item):
+    """heapq.heapreplace for a RedBlackHeap"""
+    return heap.replace(item)
@@ -0,0 +1,218 @@
+from operator import attrgetter
+
+from red_black import Node, RedBlackTree, imap
+
+_interval_of = attrgetter('key', 'end')
+
+
+def _endpoints(interval):
+    """(start, end) of interval, which must be a pair"""
+    try:
+        start, end = interval
+    except (TypeError, ValueError):
+        raise TypeError("intervals are (start, end) pairs, not {!r}".format(interval))
+    return start, end
+
+
+class IntervalNode(Node):
+    """Red-Black Tree Node holding the closed interval [key, end]
+    - max_end is the greatest end in the node's subtree
+    - Built from a (start, end) pair, so create_node(interval) works
+      wherever RedBlackTree calls create_node(key)"""
+    __slots__ = ('end', 'max_end')
+
+    def __init__(self, interval, value=None):
+        if interval is None:  # the nil sentinel
+            start = end = None
+        else:
+            start, end = _endpoints(interval)
+            if end < start:
+                raise ValueError("interval ends before it starts: {!r}".format(interval))
+        Node.__init__(self, start, value)
+        self.end = end
+        self.max_end = end
+
+
+def _interval_and_value_of(node):
+    return (node.key, node.end), node.value
+
+
+class IntervalTree(RedBlackTree):
+    """Red-Black Tree of closed intervals keyed by start
+    - Cormen et al. 14.3: Interval trees
+    - Every node caches the greatest end in its subtree (max_end), kept
+      current by rotations, insert, delete and the joins behind split
+      and the set operations, so overlap queries skip every subtree
+      ending before the query starts
+    - insert, the bulk loads (from_sorted, from_iterable) and join's
+      pivot take (start, end) pairs; iteration and irange yield them.
+      search, delete_key, lookups by [] and the irange bounds take
+      starts; delete_interval removes an exact interval, and assigning
+      by [] and setdefault map one, inserting it if need be"""
+    # Rebuilds merge the tree's keys alone, which would drop the ends
+    rebuild_ratio = float('inf')
+
+    def __init__(self, create_node=IntervalNode, profiler=None, collect_stats=False, key=None,
+                 reverse=False):
+        if key is not None or reverse:
+            raise ValueError("IntervalTree orders intervals by start alone")
+        RedBlackTree.__init__(self, create_node=create_node, profiler=profiler,
+                              collect_stats=collect_stats)
+
+    def _update(self, node):
+        """Recompute node's max_end from its own end and its children"""
+        nil = self.nil
+        max_end = node.end
+        left = node.left
+        if left is not nil and max_end < left.max_end:
+            max_end = left.max_end
+        right = node.right
+        if right is not nil and max_end < right.max_end:
+            max_end = right.max_end
+        node.max_end = max_end
+
+    def left_rotate(self, x):
+        y = x.right
+        max_end = x.max_end
+        RedBlackTree.left_rotate(self, x)
+        y.max_end = max_end
+        self._update(x)
+
+    def right_rotate(self, y):
+        x = y.left
+        max_end = y.max_end
+        RedBlackTree.right_rotate(self, y)
+        x.max_end = max_end
+        self._update(y)
+
+    def _attach(self, parent, new_node):
+        RedBlackTree._attach(self, parent, new_node)
+        end = new_node.max_end = new_node.end
+        nil = self.nil
+        while parent is not nil and parent.max_end < end:
+            parent.max_end = end
+            parent = parent.parent
+
+    def _build_sorted(self, keys):
+        RedBlackTree._build_sorted(self, keys)
+        nil = self.nil
+        update = self._update
+
+        def fill(node):
+            if node is not nil:
+                fill(node.left)
+                fill(node.right)
+                update(node)
+
+        fill(self.root)
+
+    def _refresh(self, node):
+        nil = self.nil
+        while node is not nil:
+            self._update(node)
+            node = node.parent
+
+    def delete_node(self, node, time=False):
+        """Delete, then recompute max_end from the splice point up
+        - The splice point is where delete_node_fixup starts (the parent
+          of the node moved up); its ancestors are exactly the nodes
+          whose subtrees lost an interval. The fixup's rotations carry
+          the stale values with them and stay on that path, so one pass
+          to the root afterwards repairs them all"""
+        nil = self.nil
+        if node.left is nil or node.right is nil:
+            spliced_parent = node.parent
+        else:
+            successor = self._leftmost(node.right)
+            spliced_parent = successor if successor.parent is node else successor.parent
+        RedBlackTree.delete_node(self, node, time=time)
+        self._refresh(spliced_parent)
+
+    def _build_input(self):
+        return list(self)
+
+    def _find_interval(self, interval):
+        """First node holding exactly interval, or None"""
+        start, end = _endpoints(interval)
+        for node in self._walk(self._lower_bound(start)):
+            if start < node.key:
+                break
+            if node.end == end:
+                return node
+        return None
+
+    def delete_interval(self, interval):
+        """Remove one node holding exactly interval, returning False if
+        there is none"""
+        node = self._find_interval(interval)
+        if node is None:
+            return False
+        self.delete_node(node)
+        self._add_nodes(-1)
+        return True
+
+    def _set(self, interval, value, overwrite):
+        """__setitem__ and setdefault by exact interval"""
+        node = self._find_interval(interval)
+        if node is None:
+            node = self.insert(interval)
+            node.value = value
+        elif overwrite:
+            node.value = value
+        return node.value
+
+    def insert_many(self, keys):
+        """Insert every interval of keys one by one, returning the number
+        inserted"""
+        count = 0
+        for interval in keys:
+            self.insert(interval)
+            count += 1
+        return count
+
+    def __iter__(self):
+        """Intervals as (start, end) pairs in order of start"""
+        return imap(_interval_of, self._walk(self._leftmost() or self.nil))
+
+    def __reversed__(self):
+        return imap(_interval_of, self._walk_reversed(self._rightmost() or self.nil))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        """((start, end), value) pairs in order of start"""
+        return imap(_interval_and_value_of, self._walk(self._leftmost() or self.nil))
+
+    _pair = staticmethod(_interval_and_value_of)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """Intervals whose starts lie between lo and hi, as in RedBlackTree"""
+        return imap(_interval_of, self._range_nodes(lo, hi, inclusive, reverse))
+
+    def overlap(self, point):
+        """Intervals containing point, lazily in order of start"""
+        return self.overlap_range(point, point)
+
+    def overlap_range(self, lo, hi):
+        """Intervals sharing at least one point with [lo, hi], lazily in
+        order of start
+        - An in-order walk that never enters a subtree whose max_end is
+          below lo and stops at the first start above hi: k results
+          cost O(log n + k log(n / k)), since every subtree entered
+          holds a result"""
+        nil = self.nil
+        stack = []
+        node = self.root
+        while True:
+            while node is not nil and not node.max_end < lo:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if hi < node.key:
+                return
+            if not node.end < lo:
+                yield node.key, node.end
+            node = node.right
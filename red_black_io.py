@@ -0,0 +1,288 @@
+import mmap
+import os
+import struct
+from itertools import islice
+from operator import lt
+
+from red_black import RedBlackTree
+
+try:
+    text_type = unicode
+except NameError:  # Python 3
+    text_type = str
+
+try:
+    from itertools import imap
+except ImportError:  # Python 3
+    imap = map
+
+# Overwrites an existing file on Windows too, where os.rename refuses
+_replace = getattr(os, 'replace', os.rename)
+
+MAGIC = b'RBTK'
+VERSION = 1
+# magic, version, codec, reserved, key count, offset of the string offsets
+HEADER = struct.Struct('<4sBcHQQ')
+CHUNK = 1 << 16
+
+# codec -> struct format of one fixed-width key; None marks variable width
+CODECS = {
+    b'i': 'q',  # int64
+    b'f': 'd',  # float64
+    b's': None,  # utf-8 text
+    b'b': None,  # bytes
+}
+
+
+def codec_of(key):
+    """Codec that stores keys like key"""
+    if isinstance(key, bool):
+        raise TypeError("bool keys are not supported")
+    if isinstance(key, float):
+        return b'f'
+    if isinstance(key, bytes):
+        return b'b'
+    if isinstance(key, text_type):
+        return b's'
+    if isinstance(key, int) or type(key).__name__ == 'long':
+        return b'i'
+    raise TypeError("no codec for keys of type {}".format(type(key).__name__))
+
+
+def dump(tree, path, codec=None):
+    """Write the keys of tree to path, streaming them in order
+    - Layout: HEADER, then the key block. Fixed-width keys (codec 'i'
+      int64, 'f' float64) are packed little-endian back to back; text
+      ('s', utf-8) and bytes ('b') keys are concatenated and followed by
+      n + 1 uint64 offsets into the block
+    - Values are not stored, and neither are colors: load rebuilds the
+      midpoint layout of from_sorted, whose colors follow from n alone
+    - codec defaults to the one matching the smallest key
+    - Keys are stored ascending whatever the tree's order: load a
+      reverse tree with reverse=True. Trees with a key function are
+      refused, as their items would be lost
+    - A MultisetTree is stored with every copy of its keys, so loading
+      with create_tree=MultisetTree restores the counts
+    - The file is written as path + '.tmp' and renamed to path once
+      complete, so a key that fails to encode leaves any earlier file
+      at path as it was"""
+    if tree.key_function is not None:
+        raise ValueError("cannot dump a tree with a key function: its items are not stored")
+    if codec is None:
+        minimum = tree._leftmost()
+        codec = b'i' if minimum is None else codec_of(minimum.key)
+    if isinstance(codec, text_type):
+        codec = codec.encode('ascii')
+    if codec not in CODECS:
+        raise ValueError("unknown codec {!r}".format(codec))
+    width_format = CODECS[codec]
+
+    temporary = path + '.tmp'
+    try:
+        _write(temporary, tree, codec, width_format)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    _replace(temporary, path)
+
+
+def _write(path, tree, codec, width_format):
+    """The body of dump, writing to path"""
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, codec, 0, 0, 0))
+        count = 0
+        offsets_position = 0
+        chunk = []
+        if width_format is not None:
+            for key in tree._ascending_keys():
+                chunk.append(key)
+                if len(chunk) == CHUNK:
+                    f.write(struct.pack('<{}{}'.format(len(chunk), width_format), *chunk))
+                    count += len(chunk)
+                    chunk = []
+            f.write(struct.pack('<{}{}'.format(len(chunk), width_format), *chunk))
+            count += len(chunk)
+        else:
+            offsets = [0]
+            position = 0
+            for key in tree._ascending_keys():
+                data = key.encode('utf-8') if codec == b's' else key
+                chunk.append(data)
+                position += len(data)
+                offsets.append(position)
+                if len(chunk) == CHUNK:
+                    f.write(b''.join(chunk))
+                    chunk = []
+            f.write(b''.join(chunk))
+            count = len(offsets) - 1
+            offsets_position = HEADER.size + position
+            for i in range(0, len(offsets), CHUNK):
+                block = offsets[i:i + CHUNK]
+                f.write(struct.pack('<{}Q'.format(len(block)), *block))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, codec, 0, count, offsets_position))
+
+
+def _read_header(header):
+    if len(header) < HEADER.size:
+        raise ValueError("file is too short for a tree header")
+    magic, version, codec, _, count, offsets_position = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError("not a serialized tree")
+    if version != VERSION:
+        raise ValueError("unsupported format version {}".format(version))
+    if codec not in CODECS:
+        raise ValueError("unknown codec {!r}".format(codec))
+    return codec, count, offsets_position
+
+
+def load_keys(path):
+    """Keys stored by dump, in order
+    - Raises ValueError if they are not ascending, which a tree built
+      from them would silently rely on"""
+    keys = _read_keys(path)
+    if any(imap(lt, islice(keys, 1, None), keys)):
+        raise ValueError("keys are not sorted")
+    return keys
+
+
+def _read_keys(path):
+    with open(path, 'rb') as f:
+        codec, count, offsets_position = _read_header(f.read(HEADER.size))
+        width_format = CODECS[codec]
+        keys = []
+        if width_format is not None:
+            width = struct.calcsize(width_format)
+            remaining = count
+            while remaining:
+                n = min(remaining, CHUNK)
+                data = f.read(n * width)
+                if len(data) != n * width:
+                    raise ValueError("key block is truncated")
+                keys.extend(struct.unpack('<{}{}'.format(n, width_format), data))
+                remaining -= n
+            return keys
+
+        data = f.read(offsets_position - HEADER.size)
+        if len(data) != offsets_position - HEADER.size:
+            raise ValueError("key block is truncated")
+        raw = f.read(8 * (count + 1))
+        if len(raw) != 8 * (count + 1):
+            raise ValueError("key offsets are truncated")
+        offsets = struct.unpack('<{}Q'.format(count + 1), raw)
+        for i in range(count):
+            key = data[offsets[i]:offsets[i + 1]]
+            keys.append(key.decode('utf-8') if codec == b's' else key)
+        return keys
+
+
+def load(path, create_tree=RedBlackTree, **kwargs):
+    """Tree of type create_tree (kwargs go to its constructor) holding
+    the keys at path, built in O(n) with no descents or rotations
+    - Every value is None: dump does not store values"""
+    tree = create_tree(**kwargs)
+    tree._build_sorted(load_keys(path))
+    return tree
+
+
+class MappedTree(object):
+    """Read-only view of a file written by dump
+    - The file is mmapped and searched in place: lookups and range
+      queries binary search the key block, decoding only the keys they
+      touch, so opening costs O(1) however large the file
+    - Positions are indexes into the sorted keys
+    - Unlike load, opening cannot afford to check that the keys are
+      ascending: the file is trusted to be one dump wrote"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.codec, self.number_of_nodes, self._offsets_position = _read_header(self._map)
+        width_format = CODECS[self.codec]
+        self._format = None if width_format is None else struct.Struct('<' + width_format)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.number_of_nodes
+
+    def key_at(self, i):
+        """ith smallest key"""
+        if self._offsets_position:
+            start, end = struct.unpack_from('<2Q', self._map, self._offsets_position + 8 * i)
+            key = self._map[HEADER.size + start:HEADER.size + end]
+            return key.decode('utf-8') if self.codec == b's' else key
+        return self._format.unpack_from(self._map, HEADER.size + self._format.size * i)[0]
+
+    def bisect_left(self, key):
+        """Position of the first key not less than key"""
+        lo, hi = 0, self.number_of_nodes
+        key_at = self.key_at
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_right(self, key):
+        """Position of the first key greater than key"""
+        lo, hi = 0, self.number_of_nodes
+        key_at = self.key_at
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < key_at(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def search(self, key):
+        """Position of key, or None"""
+        i = self.bisect_left(key)
+        if i < self.number_of_nodes and self.key_at(i) == key:
+            return i
+        return None
+
+    def __contains__(self, key):
+        return self.search(key) is not None
+
+    def floor(self, key):
+        """Greatest key less than or equal to key, or None"""
+        i = self.bisect_right(key)
+        return self.key_at(i - 1) if i else None
+
+    def ceiling(self, key):
+        """Least key greater than or equal to key, or None"""
+        i = self.bisect_left(key)
+        return self.key_at(i) if i < self.number_of_nodes else None
+
+    def __iter__(self):
+        for i in range(self.number_of_nodes):
+            yield self.key_at(i)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """Keys between lo and hi in order, None meaning unbounded,
+        with the same arguments as RedBlackTree.irange"""
+        if lo is None:
+            start = 0
+        else:
+            start = self.bisect_left(lo) if inclusive[0] else self.bisect_right(lo)
+        if hi is None:
+            stop = self.number_of_nodes
+        else:
+            stop = self.bisect_right(hi) if inclusive[1] else self.bisect_left(hi)
+        positions = range(start, stop)
+        if reverse:
+            positions = reversed(positions)
+        for i in positions:
+            yield self.key_at(i)
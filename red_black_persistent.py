@@ -0,0 +1,285 @@
+class PersistentNode(object):
+    """Immutable Red-Black Tree Node
+    - No parent pointer, so one node can belong to many versions
+    - Empty subtrees are None"""
+    __slots__ = ('red', 'left', 'key', 'value', 'right')
+
+    def __init__(self, red, left, key, value, right):
+        self.red = red
+        self.left = left
+        self.key = key
+        self.value = value
+        self.right = right
+
+
+def _is_red(node):
+    return node is not None and node.red
+
+
+def _blacken(node):
+    if node.red:
+        return PersistentNode(False, node.left, node.key, node.value, node.right)
+    return node
+
+
+def _redden(node):
+    """Kahrs' sub1: recolor a black node red"""
+    assert not node.red, "invariance violation"
+    return PersistentNode(True, node.left, node.key, node.value, node.right)
+
+
+def _balance(a, key, value, b):
+    """Black node over a and b, rotating away a red-red pair below it
+    - The path-copying counterpart of insert_fixup's cases"""
+    if _is_red(a) and _is_red(b):
+        return PersistentNode(True, _blacken(a), key, value, _blacken(b))
+    if _is_red(a):
+        if _is_red(a.left):
+            return PersistentNode(True, _blacken(a.left), a.key, a.value,
+                                  PersistentNode(False, a.right, key, value, b))
+        if _is_red(a.right):
+            c = a.right
+            return PersistentNode(True, PersistentNode(False, a.left, a.key, a.value, c.left),
+                                  c.key, c.value, PersistentNode(False, c.right, key, value, b))
+    if _is_red(b):
+        if _is_red(b.right):
+            return PersistentNode(True, PersistentNode(False, a, key, value, b.left),
+                                  b.key, b.value, _blacken(b.right))
+        if _is_red(b.left):
+            c = b.left
+            return PersistentNode(True, PersistentNode(False, a, key, value, c.left),
+                                  c.key, c.value, PersistentNode(False, c.right, b.key, b.value, b.right))
+    return PersistentNode(False, a, key, value, b)
+
+
+def _balance_left(a, key, value, b):
+    """Rebalance after a's black height dropped by one"""
+    if _is_red(a):
+        return PersistentNode(True, _blacken(a), key, value, b)
+    if not b.red:
+        return _balance(a, key, value, _redden(b))
+    c = b.left
+    return PersistentNode(True, PersistentNode(False, a, key, value, c.left), c.key, c.value,
+                          _balance(c.right, b.key, b.value, _redden(b.right)))
+
+
+def _balance_right(a, key, value, b):
+    """Rebalance after b's black height dropped by one"""
+    if _is_red(b):
+        return PersistentNode(True, a, key, value, _blacken(b))
+    if not a.red:
+        return _balance(_redden(a), key, value, b)
+    c = a.right
+    return PersistentNode(True, _balance(_redden(a.left), a.key, a.value, c.left),
+                          c.key, c.value, PersistentNode(False, c.right, key, value, b))
+
+
+def _append(a, b):
+    """Fuse two subtrees of equal black height, every key of a before b"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.red and b.red:
+        middle = _append(a.right, b.left)
+        if _is_red(middle):
+            return PersistentNode(True, PersistentNode(True, a.left, a.key, a.value, middle.left),
+                                  middle.key, middle.value,
+                                  PersistentNode(True, middle.right, b.key, b.value, b.right))
+        return PersistentNode(True, a.left, a.key, a.value,
+                              PersistentNode(True, middle, b.key, b.value, b.right))
+    if not a.red and not b.red:
+        middle = _append(a.right, b.left)
+        if _is_red(middle):
+            return PersistentNode(True, PersistentNode(False, a.left, a.key, a.value, middle.left),
+                                  middle.key, middle.value,
+                                  PersistentNode(False, middle.right, b.key, b.value, b.right))
+        return _balance_left(a.left, a.key, a.value,
+                             PersistentNode(False, middle, b.key, b.value, b.right))
+    if b.red:
+        return PersistentNode(True, _append(a, b.left), b.key, b.value, b.right)
+    return PersistentNode(True, a.left, a.key, a.value, _append(a.right, b))
+
+
+def _insert(node, key, value):
+    if node is None:
+        return PersistentNode(True, None, key, value, None)
+    if key < node.key:
+        if node.red:
+            return PersistentNode(True, _insert(node.left, key, value), node.key, node.value, node.right)
+        return _balance(_insert(node.left, key, value), node.key, node.value, node.right)
+    if node.key < key:
+        if node.red:
+            return PersistentNode(True, node.left, node.key, node.value, _insert(node.right, key, value))
+        return _balance(node.left, node.key, node.value, _insert(node.right, key, value))
+    return PersistentNode(node.red, node.left, key, value, node.right)
+
+
+def _delete(node, key):
+    """Kahrs' del: key must be present below node"""
+    if key < node.key:
+        if node.left is not None and not node.left.red:
+            return _balance_left(_delete(node.left, key), node.key, node.value, node.right)
+        return PersistentNode(True, _delete(node.left, key), node.key, node.value, node.right)
+    if node.key < key:
+        if node.right is not None and not node.right.red:
+            return _balance_right(node.left, node.key, node.value, _delete(node.right, key))
+        return PersistentNode(True, node.left, node.key, node.value, _delete(node.right, key))
+    return _append(node.left, node.right)
+
+
+class PersistentRedBlackTree(object):
+    """Immutable Red-Black Tree with path copying
+    - insert and delete_key return a new version sharing every untouched
+      node with this one, so keeping a version is an O(1) snapshot
+    - Rebalancing follows Kahrs, "Red-black trees with types",
+      J. Functional Programming 11(4), 2001: the same red-red and
+      double-black repairs as insert_fixup/delete_node_fixup, expressed
+      as node rebuilds on the way back up instead of rotations
+    - Keys are unique: inserting a present key replaces its value"""
+    def __init__(self, root=None, number_of_nodes=0):
+        self.root = root
+        self.number_of_nodes = number_of_nodes
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """Build a version from keys in ascending order in O(n)"""
+        keys = list(keys)
+        for i in range(1, len(keys)):
+            if not keys[i - 1] < keys[i]:
+                raise ValueError("keys are not strictly ascending at index {}".format(i))
+
+        n = len(keys)
+        red_depth = n.bit_length() - 1 if (n + 1) & n else -1
+
+        def build(lo, hi, depth):
+            if lo > hi:
+                return None
+            mid = (lo + hi) // 2
+            return PersistentNode(depth == red_depth, build(lo, mid - 1, depth + 1),
+                                  keys[mid], None, build(mid + 1, hi, depth + 1))
+
+        return cls(build(0, n - 1, 0), n)
+
+    def insert(self, key, value=None):
+        """New version with key mapped to value"""
+        added = self.search(key) is None
+        root = _blacken(_insert(self.root, key, value))
+        return PersistentRedBlackTree(root, self.number_of_nodes + added)
+
+    def delete_key(self, key):
+        """New version without key, or this version if key is absent"""
+        if self.search(key) is None:
+            return self
+        root = _delete(self.root, key)
+        if root is not None:
+            root = _blacken(root)
+        return PersistentRedBlackTree(root, self.number_of_nodes - 1)
+
+    def search(self, key):
+        """Node holding key, or None"""
+        node = self.root
+        while node is not None:
+            node_key = node.key
+            if key == node_key:
+                return node
+            node = node.left if key < node_key else node.right
+        return None
+
+    def __contains__(self, key):
+        return self.search(key) is not None
+
+    def get(self, key, default=None):
+        node = self.search(key)
+        if node is None:
+            return default
+        return node.value
+
+    def __len__(self):
+        return self.number_of_nodes
+
+    def minimum(self):
+        node = self.root
+        if node is None:
+            return
+        while node.left is not None:
+            node = node.left
+        return node
+
+    def maximum(self):
+        node = self.root
+        if node is None:
+            return
+        while node.right is not None:
+            node = node.right
+        return node
+
+    def black_height(self):
+        """Black nodes on every root-to-leaf path, 0 if they differ"""
+        def height(node):
+            if node is None:
+                return 1
+            left = height(node.left)
+            right = height(node.right)
+            if not left or left != right:
+                return 0
+            return left if node.red else left + 1
+
+        return height(self.root)
+
+    def _nodes(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """Nodes between lo and hi in order, walking an explicit stack of
+        O(log n) ancestors since nodes have no parent pointers"""
+        near, far = ('right', 'left') if reverse else ('left', 'right')
+        start, end = (hi, lo) if reverse else (lo, hi)
+        start_inclusive, end_inclusive = inclusive[::-1] if reverse else inclusive
+
+        def before_start(key):
+            if start is None:
+                return False
+            if reverse:
+                return start < key or (not start_inclusive and key == start)
+            return key < start or (not start_inclusive and key == start)
+
+        def past_end(key):
+            if end is None:
+                return False
+            if reverse:
+                return key < end or (not end_inclusive and key == end)
+            return end < key or (not end_inclusive and key == end)
+
+        stack = []
+        node = self.root
+        while node is not None:
+            if before_start(node.key):
+                node = getattr(node, far)
+            else:
+                stack.append(node)
+                node = getattr(node, near)
+
+        while stack:
+            node = stack.pop()
+            if past_end(node.key):
+                return
+            yield node
+            node = getattr(node, far)
+            while node is not None:
+                stack.append(node)
+                node = getattr(node, near)
+
+    def __iter__(self):
+        for node in self._nodes():
+            yield node.key
+
+    def __reversed__(self):
+        for node in self._nodes(reverse=True):
+            yield node.key
+
+    def items(self):
+        for node in self._nodes():
+            yield node.key, node.value
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """Keys between lo and hi in order, None meaning unbounded"""
+        for node in self._nodes(lo, hi, inclusive, reverse):
+            yield node.key
@@ -1,10 +1,35 @@
+import bisect
+import copy
+import gc
+import heapq
+import multiprocessing
+import os
+import pickle
 import random
+import shutil
+import tempfile
+import threading
+from operator import itemgetter
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
 
 import matplotlib.pyplot as plt
 import numpy as np
 from pympler import asizeof
 
-from red_black import RedBlackTree
+from red_black import MultisetTree, NativeNode, Node, Profiler, RedBlackTree, clock
+from red_black_array import ArrayRedBlackTree
+from red_black_concurrent import ConcurrentRedBlackTree
+from red_black_expiry import ExpiryIndex
+from red_black_heap import RedBlackHeap
+from red_black_interval import IntervalTree
+import red_black_io
+from red_black_persistent import PersistentRedBlackTree
+from red_black_sharded import ShardedRedBlackTree
+from red_black_wal import SYNC_POLICIES, DurableRedBlackTree
 
 
 def plot_n_thousand_in_order_inserts():
@@ -26,7 +51,7 @@ def plot_n_thousand_in_order_inserts():
         plt.show()
 
 def plot_nodes_considered_during_repeated_search():
-    tree = RedBlackTree()
+    tree = RedBlackTree(collect_stats=True)
     for i in range(10000):
         tree.insert(i)
 
@@ -66,6 +91,704 @@ def plot_size_of_tree_in_memory_during_one_hundred_inserts():
     plt.legend()
     plt.show()
 
+def bytes_per_key(n, create_tree=RedBlackTree):
+    """Bytes of tree structure per key after n in-order inserts,
+    measured with tracemalloc (pympler on Python 2). Keys are
+    allocated up front, so only the tree's own memory is counted"""
+    keys = list(range(n))
+    gc.collect()
+    if tracemalloc is None:
+        tree = create_tree()
+        for i in keys:
+            tree.insert(i)
+        return float(asizeof.asizeof(tree, keys) - asizeof.asizeof(keys)) / n
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = create_tree()
+    for i in keys:
+        tree.insert(i)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return float(after - before) / n
+
+def report_bytes_per_key(sizes=(10 ** 4, 10 ** 5, 10 ** 6)):
+    """Prints bytes per key of the node-based and array-backed trees at each size"""
+    for create_tree in (RedBlackTree, ArrayRedBlackTree):
+        for n in sizes:
+            print("{:>17} {:>9} keys: {:6.1f} bytes/key".format(
+                create_tree.__name__, n, bytes_per_key(n, create_tree)))
+
+def report_bulk_load_speedup(sizes=(10 ** 4, 10 ** 5, 10 ** 6)):
+    """Prints the time to load n sorted keys with repeated insert
+    versus RedBlackTree.from_sorted"""
+    for n in sizes:
+        keys = list(range(n))
+
+        start = clock()
+        tree = RedBlackTree()
+        for i in keys:
+            tree.insert(i)
+        insert_time = clock() - start
+        del tree
+
+        start = clock()
+        tree = RedBlackTree.from_sorted(keys)
+        bulk_time = clock() - start
+        del tree
+
+        print("{:>9} keys: insert {:7.3f} s, from_sorted {:7.3f} s ({:.1f}x)".format(
+            n, insert_time, bulk_time, insert_time / bulk_time))
+
+def report_batch_throughput(n=10 ** 5, batch_sizes=(10 ** 3, 10 ** 4, 10 ** 5), repeats=3):
+    """Prints keys/sec of insert_many and delete_many against a per-key
+    insert/delete_key loop on a tree of n random keys, the best of
+    repeats runs each"""
+    base = random.sample(range(4 * n), n)
+    for batch_size in batch_sizes:
+        batch = random.sample(range(4 * n), batch_size)
+        for label, single, bulk in [
+                ("insert", lambda tree: [tree.insert(i) for i in batch],
+                 lambda tree: tree.insert_many(batch)),
+                ("delete", lambda tree: [tree.delete_key(i) for i in batch],
+                 lambda tree: tree.delete_many(batch))]:
+            timings = []
+            for operation in (single, bulk):
+                best = float('inf')
+                for _ in range(repeats):
+                    tree = RedBlackTree.from_iterable(base)
+                    gc.collect()
+                    start = clock()
+                    operation(tree)
+                    best = min(best, clock() - start)
+                    del tree
+                timings.append(best)
+            print("{} {:>7} keys into {}: loop {:9.0f} keys/s, batch {:9.0f} keys/s".format(
+                label, batch_size, n, batch_size / timings[0], batch_size / timings[1]))
+
+def report_iteration_throughput(n=10 ** 6, scans=10000, widths=(10, 100, 1000)):
+    """Prints keys/sec of full iteration over n keys and the mean
+    time of irange scans returning width keys"""
+    tree = RedBlackTree.from_sorted(range(n))
+    for label, iterate in [("forward", iter), ("reversed", reversed)]:
+        start = clock()
+        for _ in iterate(tree):
+            pass
+        print("full {} iteration of {} keys: {:10.0f} keys/s".format(
+            label, n, n / (clock() - start)))
+
+    for width in widths:
+        starts = [random.randint(0, n - width) for _ in range(scans)]
+        start = clock()
+        for lo in starts:
+            for _ in tree.irange(lo, lo + width - 1):
+                pass
+        print("irange of {:>5} keys: {:8.2f} u sec per scan".format(
+            width, (clock() - start) / scans * 1e6))
+
+class DictWithSortedKeys(object):
+    """The dict-plus-sorted-list pattern the tree's map mode replaces"""
+    def __init__(self):
+        self.values = {}
+        self.sorted_keys = []
+
+    def __setitem__(self, key, value):
+        if key not in self.values:
+            bisect.insort(self.sorted_keys, key)
+        self.values[key] = value
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __delitem__(self, key):
+        del self.values[key]
+        del self.sorted_keys[bisect.bisect_left(self.sorted_keys, key)]
+
+    def items(self):
+        for key in self.sorted_keys:
+            yield key, self.values[key]
+
+def report_map_against_dict_and_sorted_list(n=10 ** 5):
+    """Prints ops/sec of set, get, ordered items and delete for the tree's
+    map mode and a dict kept beside a bisect-sorted key list"""
+    keys = random.sample(range(10 * n), n)
+    for create_map in (RedBlackTree, DictWithSortedKeys):
+        mapping = create_map()
+        timings = []
+
+        start = clock()
+        for key in keys:
+            mapping[key] = key
+        timings.append(("set", n / (clock() - start)))
+
+        start = clock()
+        for key in keys:
+            mapping[key]
+        timings.append(("get", n / (clock() - start)))
+
+        start = clock()
+        for _ in mapping.items():
+            pass
+        timings.append(("items", n / (clock() - start)))
+
+        start = clock()
+        for key in keys:
+            del mapping[key]
+        timings.append(("delete", n / (clock() - start)))
+
+        print("{:>18}: ".format(create_map.__name__) + ", ".join(
+            "{} {:9.0f} ops/s".format(label, rate) for label, rate in timings))
+
+def report_floor_against_bisect(n=10 ** 6, probes=10 ** 5):
+    """Prints the mean time of a floor query on the tree (one at a time
+    and batched with floor_many) against bisect on a sorted list"""
+    keys = sorted(random.sample(range(10 * n), n))
+    tree = RedBlackTree.from_sorted(keys)
+    queries = sorted(random.randint(0, 10 * n) for _ in range(probes))
+
+    def floor_with_bisect():
+        for probe in queries:
+            i = bisect.bisect_right(keys, probe)
+            keys[i - 1] if i else None
+
+    def floor_with_tree():
+        for probe in queries:
+            tree.floor(probe)
+
+    for label, run in [("bisect", floor_with_bisect),
+                       ("RedBlackTree.floor", floor_with_tree),
+                       ("RedBlackTree.floor_many", lambda: tree.floor_many(queries))]:
+        start = clock()
+        run()
+        print("{:>24}: {:6.3f} u sec per probe".format(
+            label, (clock() - start) / probes * 1e6))
+
+def report_lookup_throughput(n=10 ** 6, lookups=10 ** 6):
+    """Prints searches/sec on n keys with the read-only search and with
+    the collect_stats search that counts nodes_considered"""
+    tree = RedBlackTree.from_sorted(range(n))
+    queries = [random.randrange(n) for _ in range(lookups)]
+    for collect_stats in (True, False):
+        tree.collect_stats = collect_stats
+        search = tree.search
+        start = clock()
+        for key in queries:
+            search(key)
+        print("search with collect_stats={!s:<5}: {:9.0f} lookups/s".format(
+            collect_stats, lookups / (clock() - start)))
+
+def report_stats_overhead(n=10 ** 5):
+    """Prints insert+delete throughput of n random keys with the
+    structural counters off and on, and the stats() they collect"""
+    keys = random.sample(range(n), n)
+    for collect_stats in (False, True):
+        tree = RedBlackTree(collect_stats=collect_stats)
+        start = clock()
+        for key in keys:
+            tree.insert(key)
+        for key in keys:
+            tree.delete_key(key)
+        print("collect_stats={!s:<5}: {:9.0f} ops/s".format(
+            collect_stats, 2 * n / (clock() - start)))
+    stats = tree.stats()
+    print("rotations/op {:.3f}, recolorings/op {:.3f}, mean descent {:.2f}, max descent {}".format(
+        stats['rotations'] / (2.0 * n), stats['recolorings'] / (2.0 * n),
+        stats['mean_descent_depth'], stats['max_descent_depth']))
+
+def report_native_speedup(n=10 ** 5):
+    """Prints ops/sec of insert, search, iteration and delete_key over n
+    random keys for pure-Python nodes and, when the _red_black extension
+    is built, for native ones, with the speedup"""
+    if NativeNode is None:
+        print("_red_black extension is not built (python setup.py build_ext --inplace)")
+        return
+    keys = random.sample(range(10 * n), n)
+    rates = {}
+    for create_node in (Node, NativeNode):
+        tree = RedBlackTree(create_node=create_node)
+        timings = []
+
+        start = clock()
+        for key in keys:
+            tree.insert(key)
+        timings.append(("insert", n / (clock() - start)))
+
+        start = clock()
+        for key in keys:
+            tree.search(key)
+        timings.append(("search", n / (clock() - start)))
+
+        start = clock()
+        for _ in tree:
+            pass
+        timings.append(("iterate", n / (clock() - start)))
+
+        start = clock()
+        for key in keys:
+            tree.delete_key(key)
+        timings.append(("delete_key", n / (clock() - start)))
+        rates[create_node] = timings
+
+    for (operation, python_rate), (_, native_rate) in zip(rates[Node], rates[NativeNode]):
+        print("{:>10}: python {:10.0f} ops/s, native {:10.0f} ops/s ({:.1f}x)".format(
+            operation, python_rate, native_rate, native_rate / python_rate))
+
+class ByScore(object):
+    """The wrapper-object baseline for key=: every comparison goes
+    through __lt__ and reads the score attribute"""
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = record
+
+    def __lt__(self, other):
+        return self.record[1] < other.record[1]
+
+    def __gt__(self, other):
+        return self.record[1] > other.record[1]
+
+    def __eq__(self, other):
+        return self.record[1] == other.record[1]
+
+    def __ne__(self, other):
+        return self.record[1] != other.record[1]
+
+def report_key_function_against_wrappers(n=10 ** 5):
+    """Prints ops/sec of insert, search and iteration over n (name, score)
+    records ordered by score, for plain keys, key=itemgetter(1) and a
+    wrapper class with rich comparisons"""
+    scores = random.sample(range(10 * n), n)
+    records = [("name%d" % score, score) for score in scores]
+    wrapped = [ByScore(record) for record in records]
+    cases = (
+        ("plain keys", RedBlackTree, scores, scores),
+        ("key=", lambda: RedBlackTree(key=itemgetter(1)), records, scores),
+        ("wrapper", RedBlackTree, wrapped, wrapped),
+    )
+    for name, create_tree, items, probes in cases:
+        tree = create_tree()
+        start = clock()
+        for item in items:
+            tree.insert(item)
+        insert_rate = n / (clock() - start)
+
+        start = clock()
+        for probe in probes:
+            tree.search(probe)
+        search_rate = n / (clock() - start)
+
+        start = clock()
+        for _ in tree:
+            pass
+        iterate_rate = n / (clock() - start)
+        print("{:>10}: insert {:10.0f} ops/s, search {:10.0f} ops/s, iterate {:10.0f} ops/s".format(
+            name, insert_rate, search_rate, iterate_rate))
+
+def zipf_keys(n, distinct, s=1.1):
+    """n keys from range(distinct), key k drawn with weight 1 / (k + 1) ** s"""
+    cumulative = []
+    total = 0.0
+    for k in range(distinct):
+        total += 1.0 / (k + 1) ** s
+        cumulative.append(total)
+    return [bisect.bisect_left(cumulative, random.random() * total) for _ in range(n)]
+
+def report_multiset_on_zipf(n=10 ** 6, distinct=10 ** 4, exponents=(0.8, 1.1, 1.5)):
+    """Prints insert throughput and tree memory per inserted key for n
+    Zipfian keys, with RedBlackTree (a node per copy) and MultisetTree
+    (a node per distinct key); memory is measured as in bytes_per_key,
+    on a second, untimed load"""
+    for s in exponents:
+        keys = zipf_keys(n, distinct, s)
+        for create_tree in (RedBlackTree, MultisetTree):
+            start = clock()
+            tree = create_tree()
+            for key in keys:
+                tree.insert(key)
+            elapsed = clock() - start
+            nodes = tree.number_of_nodes
+            del tree
+
+            gc.collect()
+            if tracemalloc is None:
+                tree = create_tree()
+                for key in keys:
+                    tree.insert(key)
+                memory = asizeof.asizeof(tree)
+            else:
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                tree = create_tree()
+                for key in keys:
+                    tree.insert(key)
+                memory = tracemalloc.get_traced_memory()[0] - before
+                tracemalloc.stop()
+            del tree
+            print("s={} {:>12}: {:8} nodes, insert {:9.0f} keys/s, {:6.1f} bytes/key".format(
+                s, create_tree.__name__, nodes, n / elapsed, float(memory) / n))
+
+def report_interval_overlap(n=10 ** 6, queries=10 ** 4, scans=20):
+    """Prints load times and overlap queries/sec for n random intervals
+    in an IntervalTree, against a linear scan of the interval list"""
+    span = 10 * n
+    intervals = []
+    for _ in range(n):
+        start = random.randrange(span)
+        intervals.append((start, start + int(random.expovariate(1.0 / 50))))
+
+    start = clock()
+    tree = IntervalTree.from_iterable(intervals)
+    print("from_iterable: {:7.3f} s".format(clock() - start))
+    start = clock()
+    inserted = IntervalTree()
+    for interval in intervals:
+        inserted.insert(interval)
+    print("       insert: {:7.3f} s".format(clock() - start))
+    del inserted
+
+    for width in (0, 100, 10000):
+        points = [random.randrange(span) for _ in range(queries)]
+        start = clock()
+        found = 0
+        for point in points:
+            for _ in tree.overlap_range(point, point + width):
+                found += 1
+        tree_rate = queries / (clock() - start)
+
+        start = clock()
+        for point in points[:scans]:
+            hi = point + width
+            [interval for interval in intervals if interval[0] <= hi and point <= interval[1]]
+        scan_rate = scans / (clock() - start)
+        print("width {:>5}: {:6.1f} results/query, tree {:8.0f} queries/s, scan {:6.1f} queries/s".format(
+            width, float(found) / queries, tree_rate, scan_rate))
+
+def report_pop_throughput(n=10 ** 5):
+    """Prints pops/sec draining n random keys: heapq, RedBlackHeap,
+    pop_min, and the minimum + delete_key pattern pop_min replaces"""
+    keys = [random.random() for _ in range(n)]
+
+    heap = list(keys)
+    heapq.heapify(heap)
+    start = clock()
+    while heap:
+        heapq.heappop(heap)
+    rates = [("heapq", n / (clock() - start))]
+
+    heap = RedBlackHeap(keys)
+    start = clock()
+    while heap:
+        heap.pop()
+    rates.append(("RedBlackHeap", n / (clock() - start)))
+
+    tree = RedBlackTree.from_iterable(keys)
+    start = clock()
+    while tree:
+        tree.pop_min()
+    rates.append(("pop_min", n / (clock() - start)))
+
+    tree = RedBlackTree.from_iterable(keys)
+    start = clock()
+    while tree:
+        tree.delete_key(tree.minimum().key)
+    rates.append(("minimum + delete_key", n / (clock() - start)))
+
+    for name, rate in rates:
+        print("{:>21}: {:10.0f} pops/s".format(name, rate))
+
+def report_sharded_throughput(n=10 ** 6, lookups=10 ** 6, batch=10 ** 4, shard_counts=(1, 2, 4, 8)):
+    """Prints lookups/sec over n keys for one in-process RedBlackTree and
+    for ShardedRedBlackTree with each shard count, batching lookups
+    through search_many, and the single-key round trip for comparison
+    - Scaling needs as many idle cores as shards"""
+    keys = random.sample(range(10 * n), n)
+    probes = [random.randrange(10 * n) for _ in range(lookups)]
+
+    tree = RedBlackTree.from_iterable(keys)
+    start = clock()
+    for probe in probes:
+        tree.search(probe)
+    print("{:>15}: {:10.0f} lookups/s".format("RedBlackTree", lookups / (clock() - start)))
+    del tree
+
+    for shards in shard_counts:
+        with ShardedRedBlackTree.from_iterable(keys, shards=shards) as tree:
+            start = clock()
+            for i in range(0, lookups, batch):
+                tree.search_many(probes[i:i + batch])
+            batched_rate = lookups / (clock() - start)
+
+            start = clock()
+            for probe in probes[:lookups // 100]:
+                tree.search(probe)
+            single_rate = (lookups // 100) / (clock() - start)
+        print("{:>9} shards: {:10.0f} lookups/s batched, {:8.0f} one at a time ({} CPUs)".format(
+            shards, batched_rate, single_rate, multiprocessing.cpu_count()))
+
+def report_expiry_latency(n=10 ** 6, evictions=(10 ** 3, 10 ** 4, 10 ** 5)):
+    """Prints the time to evict k of n live entries with
+    ExpiryIndex.expire (one split) and with the minimum + delete_key
+    loop it replaces"""
+    clock_now = [0.0]
+    timer = lambda: clock_now[0]
+    for k in evictions:
+        index = ExpiryIndex(timer=timer)
+        pairs = {}
+        tree = RedBlackTree()
+        for key in range(n):
+            ttl = random.random() * n
+            index.set(key, key, ttl)
+            pairs[key] = key
+            tree.insert(ttl).value = key
+        now = sorted(index.deadline(key) for key in range(n))[k - 1]
+
+        start = clock()
+        index.expire(now)
+        split_time = clock() - start
+
+        start = clock()
+        minimum = tree.minimum()
+        while minimum is not None and not now < minimum.key:
+            del pairs[minimum.value]
+            tree.delete_key(minimum.key)
+            minimum = tree.minimum()
+        loop_time = clock() - start
+        print("{:>7} of {} entries: expire {:8.2f} ms, minimum + delete_key {:8.2f} ms ({:.1f}x)".format(
+            k, n, 1000 * split_time, 1000 * loop_time, loop_time / split_time))
+
+def report_frozen_batch_lookups(n=10 ** 6, lookups=10 ** 6):
+    """Prints the time to answer a batch of membership, floor and rank
+    probes on a frozen snapshot, sorted and Eytzinger, against a loop of
+    searches on the live tree, and the time to freeze"""
+    tree = RedBlackTree.from_sorted(range(0, 2 * n, 2))
+    probes = np.random.randint(0, 2 * n, lookups)
+    search = tree.search
+    nil = tree.nil
+    start = clock()
+    [search(probe) is not nil for probe in probes.tolist()]
+    live_time = clock() - start
+    print("live tree: {} searches {:8.1f} ms".format(lookups, 1000 * live_time))
+    for eytzinger in (False, True):
+        start = clock()
+        frozen = tree.freeze(eytzinger, dtype=np.int64)
+        freeze_time = clock() - start
+        times = []
+        for query in (frozen.contains, frozen.floor, frozen.rank):
+            start = clock()
+            query(probes)
+            times.append(clock() - start)
+        print("{:>10}: freeze {:7.1f} ms, contains {:6.1f} ms ({:.0f}x), floor {:6.1f} ms, "
+              "rank {:6.1f} ms".format('eytzinger' if eytzinger else 'sorted', 1000 * freeze_time,
+                                       1000 * times[0], live_time / times[0],
+                                       1000 * times[1], 1000 * times[2]))
+
+class GloballyLockedTree(object):
+    """The single global lock baseline ConcurrentRedBlackTree replaces"""
+    def __init__(self, tree):
+        self.tree = tree
+        self.lock = threading.Lock()
+
+    def search(self, key):
+        with self.lock:
+            return self.tree.search(key)
+
+    def insert(self, key):
+        with self.lock:
+            self.tree.insert(key)
+
+def report_concurrent_read_throughput(n=10 ** 5, readers=(1, 2, 4, 8), seconds=1.0,
+                                      write_interval=0.001):
+    """Prints lookups/sec summed over reader threads while one writer
+    inserts every write_interval seconds (0: back to back), for the
+    readers-writer tree and the global lock baseline"""
+    for create_shared in (GloballyLockedTree, ConcurrentRedBlackTree):
+        for reader_count in readers:
+            shared = create_shared(RedBlackTree.from_sorted(range(0, 2 * n, 2)))
+            stop = threading.Event()
+            lookups = [0] * reader_count
+
+            def reader(i):
+                rng = random.Random(i)
+                while not stop.is_set():
+                    for _ in range(100):
+                        shared.search(rng.randrange(2 * n))
+                    lookups[i] += 100
+
+            def writer():
+                rng = random.Random()
+                while not stop.is_set():
+                    shared.insert(rng.randrange(2 * n))
+                    if write_interval:
+                        stop.wait(write_interval)
+
+            threads = [threading.Thread(target=reader, args=(i,)) for i in range(reader_count)]
+            threads.append(threading.Thread(target=writer))
+            for thread in threads:
+                thread.start()
+            stop.wait(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            print("{:>22} with {} readers: {:9.0f} lookups/s".format(
+                create_shared.__name__, reader_count, sum(lookups) / seconds))
+
+def report_set_operation_scaling(n=10 ** 5, sizes=(10, 100, 1000, 10 ** 4, 10 ** 5)):
+    """Prints the time to union a tree of m keys into one of n keys with
+    union, per-key insert and a full merge rebuild, then the mean time of
+    split and join on n keys"""
+    base = random.sample(range(10 * n), n)
+    for m in sizes:
+        small = random.sample(range(10 * n), m)
+        timings = []
+        for combine in [lambda tree, other: tree.union(other),
+                        lambda tree, other: [tree.insert(key) for key in other.keys()
+                                             if key not in tree],
+                        lambda tree, other: tree._build_sorted(sorted(set(tree.keys()) | set(other.keys())))]:
+            tree = RedBlackTree.from_iterable(base)
+            other = RedBlackTree.from_iterable(small)
+            start = clock()
+            combine(tree, other)
+            timings.append(clock() - start)
+        print("union of {:>6} into {} keys: union {:8.2f} ms, insert {:8.2f} ms, rebuild {:8.2f} ms".format(
+            m, n, timings[0] * 1e3, timings[1] * 1e3, timings[2] * 1e3))
+
+    tree = RedBlackTree.from_sorted(range(0, 2 * n, 2))
+    repeats = 1000
+    split_time = join_time = 0
+    for _ in range(repeats):
+        pivot = 2 * random.randrange(n) + 1
+        start = clock()
+        right = tree.split(pivot)
+        split_time += clock() - start
+        start = clock()
+        tree.join(pivot, right)
+        join_time += clock() - start
+    print("{} keys: split {:.1f} u sec, join {:.1f} u sec".format(
+        n, split_time / repeats * 1e6, join_time / repeats * 1e6))
+
+def resident_bytes():
+    """Resident set size of this process, from /proc (0 elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        return 0
+
+def report_serialization_against_pickle(n=10 ** 6, lookups=10 ** 5):
+    """Prints save and load times, file size and the RSS a load adds for
+    red_black_io against pickle on n keys, then lookups/sec of a
+    MappedTree reading the file in place"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tree')
+
+    def pickle_dump(tree, path):
+        with open(path, 'wb') as f:
+            pickle.dump(tree, f, 2)
+
+    def pickle_load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    try:
+        for label, save, restore in [("red_black_io", red_black_io.dump, red_black_io.load),
+                                     ("pickle", pickle_dump, pickle_load)]:
+            tree = RedBlackTree.from_sorted(range(n))
+            start = clock()
+            save(tree, path)
+            save_time = clock() - start
+            del tree
+            gc.collect()
+
+            rss = resident_bytes()
+            start = clock()
+            tree = restore(path)
+            load_time = clock() - start
+            rss = resident_bytes() - rss
+            del tree
+            gc.collect()
+            print("{:>12} {} keys: save {:6.2f} s, load {:6.2f} s, {:6.1f} MB file, {:6.1f} MB RSS".format(
+                label, n, save_time, load_time, os.path.getsize(path) / 1e6, rss / 1e6))
+
+        red_black_io.dump(RedBlackTree.from_sorted(range(n)), path)
+        queries = [random.randrange(n) for _ in range(lookups)]
+        start = clock()
+        with red_black_io.MappedTree(path) as mapped:
+            for key in queries:
+                key in mapped
+        print("MappedTree: {:9.0f} lookups/s including open".format(lookups / (clock() - start)))
+    finally:
+        shutil.rmtree(directory)
+
+def report_durable_throughput(operations=2 * 10 ** 4, directory=None):
+    """Prints inserts and deletes/sec of DurableRedBlackTree under each
+    sync policy against a plain RedBlackTree, logging to directory (a
+    temporary one by default: point it at the disk that matters)"""
+    keys = [random.randrange(10 * operations) for _ in range(operations)]
+    start = clock()
+    tree = RedBlackTree()
+    for i, key in enumerate(keys):
+        if i % 3 == 2:
+            tree.delete_key(key)
+        else:
+            tree.insert(key)
+    print("{:>16}: {:9.0f} ops/s".format("in memory", operations / (clock() - start)))
+
+    for sync in SYNC_POLICIES:
+        path = tempfile.mkdtemp(dir=directory)
+        try:
+            start = clock()
+            with DurableRedBlackTree(path, sync=sync) as tree:
+                for i, key in enumerate(keys):
+                    if i % 3 == 2:
+                        tree.delete_key(key)
+                    else:
+                        tree.insert(key)
+            print("{:>16}: {:9.0f} ops/s".format("sync=" + sync, operations / (clock() - start)))
+        finally:
+            shutil.rmtree(path)
+
+def report_persistent_snapshots(n=10 ** 5, versions=1000, copies=5):
+    """Prints bytes each retained PersistentRedBlackTree version adds on
+    n keys, and the cost of a snapshot: keeping the old version versus
+    copy.deepcopy of a RedBlackTree or ArrayRedBlackTree.snapshot"""
+    keys = [random.random() for _ in range(versions)]
+    tree = PersistentRedBlackTree.from_sorted(range(n))
+    gc.collect()
+    retained = [tree]
+    if tracemalloc is None:
+        before = asizeof.asizeof(retained)
+    else:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+    start = clock()
+    for key in keys:
+        retained.append(retained[-1].insert(key))
+    insert_time = clock() - start
+    if tracemalloc is None:
+        after = asizeof.asizeof(retained)
+    else:
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    print("{} keys: {:.0f} bytes and {:.1f} us per retained version".format(
+        n, float(after - before) / versions, insert_time / versions * 1e6))
+
+    mutable = RedBlackTree.from_sorted(range(n))
+    start = clock()
+    for _ in range(copies):
+        copy.deepcopy(mutable)
+    deepcopy_time = (clock() - start) / copies
+
+    array_tree = ArrayRedBlackTree('l')
+    for i in range(n):
+        array_tree.insert(i)
+    start = clock()
+    for _ in range(copies):
+        array_tree.snapshot()
+    array_time = (clock() - start) / copies
+
+    print("snapshot: persistent O(1), deepcopy {:.1f} ms, array snapshot {:.2f} ms".format(
+        deepcopy_time * 1e3, array_time * 1e3))
+
 def plot_insertion_time():
     """Plots microsecond time of inserting 100 nodes into a
     tree (n times), along with log(number of nodes)"""
@@ -79,9 +802,9 @@ def plot_insertion_time():
         tree = RedBlackTree()
         for i in range(100):
             tree.insert(i, time=True)
-            insert_fixup_times[j].append(abs(tree.insert_fixup_time))
-            insert_times[j].append(abs(tree.insert_time))
-            log_times[j].append(0.002* np.log2(tree.number_of_nodes))
+            insert_fixup_times[j].append(tree.insert_fixup_time * 1e6)
+            insert_times[j].append(tree.insert_time * 1e6)
+            log_times[j].append(np.log2(tree.number_of_nodes))
         del tree
 
     insert_times = average_list_of_lists(insert_times)
@@ -113,9 +836,9 @@ def plot_deletion_time():
         delete_range = list(range(40, 65))
         for i in delete_range:
             tree.delete_key(i, time=True)
-            delete_times[j].append(abs(tree.delete_time))
-            delete_fixup_times[j].append(abs(tree.delete_fixup_time))
-            log_times[j].append(0.001 * np.log2(tree.number_of_nodes))
+            delete_times[j].append(tree.delete_time * 1e6)
+            delete_fixup_times[j].append(tree.delete_fixup_time * 1e6)
+            log_times[j].append(np.log2(tree.number_of_nodes))
 
         del tree
 
@@ -130,6 +853,29 @@ def plot_deletion_time():
     plt.legend()
     plt.show()
 
+def plot_phase_profile_of_random_inserts_and_deletes():
+    """Plots the per-phase latency histograms recorded by a Profiler
+    during 10k random inserts followed by 5k deletes"""
+    profiler = Profiler()
+    tree = RedBlackTree(profiler=profiler)
+    keys = list(range(10000))
+    random.shuffle(keys)
+    for i in keys:
+        tree.insert(i)
+    for i in keys[:5000]:
+        tree.delete_key(i)
+
+    for phase in Profiler.PHASES:
+        histogram = profiler.histograms[phase]
+        plt.plot(histogram, label="{} (mean {:.2f} u sec)".format(
+            phase, profiler.mean(phase) * 1e6))
+
+    plt.title("Phase Latency Histogram, 10k Inserts and 5k Deletes")
+    plt.xlabel("log2(nanoseconds)")
+    plt.ylabel("Samples")
+    plt.legend()
+    plt.show()
+
 def average_list_of_lists(a):
     """Returns a list of the mean value of
     the ith value in a list of lists"""
@@ -139,12 +885,34 @@ def average_list_of_lists(a):
     return averages
 
 def return_list_of_n_lists(n):
-    return [[] for x in xrange(n)]
+    return [[] for x in range(n)]
 
 if __name__ == "__main__":
     """Creating all of these graphs can take up to one minute"""
+    report_bytes_per_key()
+    report_bulk_load_speedup()
+    report_batch_throughput()
+    report_iteration_throughput()
+    report_map_against_dict_and_sorted_list()
+    report_floor_against_bisect()
+    report_lookup_throughput()
+    report_stats_overhead()
+    report_native_speedup()
+    report_key_function_against_wrappers()
+    report_multiset_on_zipf()
+    report_interval_overlap()
+    report_pop_throughput()
+    report_sharded_throughput()
+    report_expiry_latency()
+    report_frozen_batch_lookups()
+    report_concurrent_read_throughput()
+    report_set_operation_scaling()
+    report_serialization_against_pickle()
+    report_durable_throughput()
+    report_persistent_snapshots()
     plot_n_thousand_in_order_inserts()
     plot_nodes_considered_during_repeated_search()
     plot_size_of_tree_in_memory_during_one_hundred_inserts()
     plot_insertion_time()
-    plot_deletion_time()
\ No newline at end of file
+    plot_deletion_time()
+    plot_phase_profile_of_random_inserts_and_deletes()
\ No newline at end of file
@@ -0,0 +1,396 @@
+import bisect
+import multiprocessing
+from itertools import islice
+
+from red_black import WALK_NODES, RedBlackTree
+
+
+def _build(keys, values, create_tree=RedBlackTree):
+    """Tree holding the sorted keys, each mapped to its value"""
+    tree = create_tree.from_sorted(keys)
+    for node, value in zip(tree._iterate(False, WALK_NODES), values):
+        node.value = value
+    return tree
+
+
+def _items(tree):
+    return list(tree), list(tree.values())
+
+
+def _split(tree, key):
+    """Keep the keys less than key, returning the rest as (keys, values)"""
+    return _items(tree.split(key))
+
+
+def _absorb(tree, keys, values):
+    """Append sorted keys, none less than the tree's, in O(m + log n)"""
+    if keys:
+        tree.join(keys[0], _build(keys[1:], values[1:]), values[0])
+
+
+def _median(tree):
+    """A key splitting the tree into two non-empty halves, or None"""
+    n = len(tree)
+    if n < 2:
+        return None
+    median = next(islice(iter(tree), n // 2, None))
+    return median if tree.minimum().key < median else None
+
+
+def _insert(tree, key):
+    tree.insert(key)  # not returning the node, which cannot be pickled
+
+
+def _set(tree, key, value):
+    tree[key] = value
+
+
+def _get(tree, key, default):
+    return tree.get(key, default)
+
+
+def _getitem(tree, key):
+    """(True, value) for a key in the tree, else (False, None)"""
+    node = tree.search(key)
+    if node is tree.nil:
+        return False, None
+    return True, node.value
+
+
+def _get_many(tree, keys, default):
+    get = tree.get
+    return [get(key, default) for key in keys]
+
+
+def _search_many(tree, keys):
+    search = tree.search
+    nil = tree.nil
+    return [search(key) is not nil for key in keys]
+
+
+def _irange(tree, lo, hi, inclusive):
+    return list(tree.irange(lo, hi, inclusive))
+
+
+OPERATIONS = {
+    'insert': _insert,
+    'insert_many': RedBlackTree.insert_many,
+    'delete_key': RedBlackTree.delete_key,
+    'delete_many': RedBlackTree.delete_many,
+    'contains': RedBlackTree.__contains__,
+    'len': RedBlackTree.__len__,
+    'set': _set,
+    'get': _get,
+    'getitem': _getitem,
+    'get_many': _get_many,
+    'search_many': _search_many,
+    'irange': _irange,
+    'items': _items,
+    'split': _split,
+    'absorb': _absorb,
+    'median': _median,
+}
+
+
+def _serve(connection, keys, values):
+    """Worker process: own one shard's tree and answer requests until
+    the connection closes or a close request arrives"""
+    tree = _build(keys, values)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request[0] == 'close':
+            break
+        try:
+            connection.send((True, OPERATIONS[request[0]](tree, *request[1:])))
+        except Exception as error:
+            connection.send((False, error))
+    connection.close()
+
+
+class Shard(object):
+    """A RedBlackTree in a worker process, driven over a pipe
+    - send and receive are split so a caller can start requests on
+      several shards before waiting for any of them"""
+    def __init__(self, keys=(), values=()):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child, list(keys), list(values)))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.load = 0
+
+    def send(self, operation, *args):
+        self.connection.send((operation,) + args)
+
+    def receive(self):
+        ok, result = self.connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def call(self, operation, *args):
+        self.send(operation, *args)
+        return self.receive()
+
+    def close(self):
+        try:
+            self.connection.send(('close',))
+        except (IOError, OSError):  # the worker is already gone
+            pass
+        self.process.join()
+        self.connection.close()
+
+
+class ShardedRedBlackTree(object):
+    """Range-partitioned RedBlackTree spread over worker processes
+    - Shard i holds the keys k with boundaries[i - 1] <= k <
+      boundaries[i]; insert, delete_key and the lookups go to the one
+      shard owning the key
+    - Batched lookups and range scans fan out: every shard involved gets
+      its request before any reply is awaited, so the shards work in
+      parallel, and as shards are ranges their sorted results merge by
+      concatenation
+    - rebalance splits shards that took much more than their share of
+      the operations since the last rebalance at their median key, and
+      merges neighbours that took much less, moving keys between worker
+      processes with split and join; rebalance_every (operations, None
+      for never) runs it automatically
+    - Keys and values cross process boundaries, so they must pickle;
+      searches answer found or not rather than returning nodes"""
+    # rebalance splits a shard above split_ratio times the mean load and
+    # merges neighbours below merge_ratio times it together
+    split_ratio = 2.0
+    merge_ratio = 0.5
+
+    def __init__(self, boundaries=(), rebalance_every=None, max_shards=None):
+        """One empty shard per range between sorted boundaries; at most
+        max_shards (default 4 per CPU) after rebalancing"""
+        self.boundaries = list(boundaries)
+        self.shards = [Shard() for _ in range(len(self.boundaries) + 1)]
+        self.rebalance_every = rebalance_every
+        self.max_shards = max_shards or 4 * multiprocessing.cpu_count()
+        self.operations = 0
+
+    @classmethod
+    def from_iterable(cls, keys, shards=None, **kwargs):
+        """Sort keys and cut them into shards (default one per CPU) of
+        equal size, each bulk loaded in O(n / shards) by its own process
+        - kwargs are passed on to the constructor"""
+        keys = sorted(keys)
+        shards = shards or multiprocessing.cpu_count()
+        boundaries = []
+        for i in range(1, shards):
+            if not keys:
+                break
+            boundary = keys[i * len(keys) // shards]
+            # Every copy of a boundary key belongs right of it, so a
+            # boundary must not repeat or start the keys
+            if boundary > (boundaries[-1] if boundaries else keys[0]):
+                boundaries.append(boundary)
+        tree = cls(boundaries, **kwargs)
+        tree.insert_many(keys)
+        for shard in tree.shards:
+            shard.load = 0
+        return tree
+
+    def close(self):
+        """Stop every worker process"""
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _shard(self, key):
+        """The shard owning key, counted as loaded"""
+        shard = self.shards[bisect.bisect_right(self.boundaries, key)]
+        shard.load += 1
+        if self.rebalance_every is not None:
+            self.operations += 1
+            if self.operations >= self.rebalance_every:
+                self.rebalance()
+                shard = self.shards[bisect.bisect_right(self.boundaries, key)]
+        return shard
+
+    def _partition(self, keys):
+        """{shard index: positions in keys of the keys it owns}"""
+        positions = {}
+        boundaries = self.boundaries
+        for position, key in enumerate(keys):
+            positions.setdefault(bisect.bisect_right(boundaries, key), []).append(position)
+        return positions
+
+    def _fan_out(self, keys, operation, *args):
+        """Run operation(shard_keys, *args) on every shard owning some of
+        keys, in parallel, returning the shards' results by shard index
+        and the positions from _partition"""
+        positions = self._partition(keys)
+        for i, shard_positions in positions.items():
+            shard = self.shards[i]
+            shard.load += len(shard_positions)
+            shard.send(operation, [keys[p] for p in shard_positions], *args)
+        indexes = list(positions)
+        results = self._receive_all([self.shards[i] for i in indexes])
+        return dict(zip(indexes, results)), positions
+
+    def _fan_out_lookups(self, keys, operation, *args):
+        """_fan_out for an operation answering each key, with the answers
+        put back in the order of keys"""
+        results, positions = self._fan_out(keys, operation, *args)
+        answers = [None] * len(keys)
+        for i, shard_positions in positions.items():
+            for position, answer in zip(shard_positions, results[i]):
+                answers[position] = answer
+        return answers
+
+    def _gather(self, shards, operation, *args):
+        """Run operation(*args) on every shard of shards in parallel,
+        returning the results in shard order"""
+        for shard in shards:
+            shard.send(operation, *args)
+        return self._receive_all(shards)
+
+    def _receive_all(self, shards):
+        """The pending reply of every shard of shards, in order
+        - A worker's error is raised only once every reply is read, so
+          none is left in a pipe to answer the shard's next request"""
+        results = []
+        error = None
+        for shard in shards:
+            try:
+                results.append(shard.receive())
+            except Exception as exception:
+                if error is None:
+                    error = exception
+                results.append(None)
+        if error is not None:
+            raise error
+        return results
+
+    # Point operations
+
+    def insert(self, key):
+        self._shard(key).call('insert', key)
+
+    def delete_key(self, key):
+        return self._shard(key).call('delete_key', key)
+
+    def search(self, key):
+        """True if key is in the tree"""
+        return self._shard(key).call('contains', key)
+
+    __contains__ = search
+
+    def __setitem__(self, key, value):
+        self._shard(key).call('set', key, value)
+
+    def get(self, key, default=None):
+        return self._shard(key).call('get', key, default)
+
+    def __getitem__(self, key):
+        found, value = self._shard(key).call('getitem', key)
+        if not found:
+            raise KeyError(key)
+        return value
+
+    # Batches and scans
+
+    def search_many(self, keys):
+        """[key in tree for key in keys], every shard searching its part
+        of keys in parallel"""
+        return self._fan_out_lookups(list(keys), 'search_many')
+
+    def get_many(self, keys, default=None):
+        """[tree.get(key, default) for key in keys], like search_many"""
+        return self._fan_out_lookups(list(keys), 'get_many', default)
+
+    def insert_many(self, keys):
+        """Insert every key of keys, each shard its own part in parallel,
+        returning the number inserted"""
+        results, _ = self._fan_out(list(keys), 'insert_many')
+        return sum(results.values())
+
+    def delete_many(self, keys):
+        """Delete one node per key of keys, like insert_many, returning
+        the number removed"""
+        results, _ = self._fan_out(list(keys), 'delete_many')
+        return sum(results.values())
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True)):
+        """Sorted list of the keys between lo and hi (None: unbounded),
+        gathered from the shards overlapping the range in parallel"""
+        first = 0 if lo is None else bisect.bisect_right(self.boundaries, lo)
+        last = len(self.shards) - 1 if hi is None else bisect.bisect_right(self.boundaries, hi)
+        keys = []
+        for part in self._gather(self.shards[first:last + 1], 'irange', lo, hi, inclusive):
+            keys.extend(part)
+        return keys
+
+    def __iter__(self):
+        """Keys in order, fetched a shard at a time"""
+        for shard in self.shards:
+            for key in shard.call('irange', None, None, (True, True)):
+                yield key
+
+    def items(self):
+        for shard in self.shards:
+            keys, values = shard.call('items')
+            for item in zip(keys, values):
+                yield item
+
+    def __len__(self):
+        return sum(self.shard_sizes())
+
+    def shard_sizes(self):
+        return self._gather(self.shards, 'len')
+
+    # Rebalancing
+
+    def rebalance(self):
+        """Split hot shards and merge cold neighbours, then start counting
+        load afresh
+        - A split leaves the keys below the shard's median in place and
+          moves the rest, built in O(n) by a new worker process; a merge
+          joins a shard's keys onto its left neighbour in O(m + log n)
+        - Returns the number of shards split and merged"""
+        self.operations = 0
+        mean = float(sum(shard.load for shard in self.shards)) / len(self.shards)
+        changes = 0
+
+        i = 0
+        while i < len(self.shards):
+            shard = self.shards[i]
+            if len(self.shards) < self.max_shards and shard.load > self.split_ratio * mean:
+                median = shard.call('median')
+                if median is not None:
+                    right = Shard(*shard.call('split', median))
+                    shard.load = right.load = shard.load // 2
+                    self.shards.insert(i + 1, right)
+                    self.boundaries.insert(i, median)
+                    changes += 1
+                    i += 1
+            i += 1
+
+        i = 0
+        while i + 1 < len(self.shards):
+            left, right = self.shards[i], self.shards[i + 1]
+            if left.load + right.load < self.merge_ratio * mean:
+                left.call('absorb', *right.call('items'))
+                left.load += right.load
+                right.close()
+                del self.shards[i + 1]
+                del self.boundaries[i]
+                changes += 1
+            else:
+                i += 1
+
+        for shard in self.shards:
+            shard.load = 0
+        return changes
@@ -0,0 +1,262 @@
+import os
+import re
+import struct
+import zlib
+
+import red_black_io
+from red_black import RedBlackTree, clock
+
+# crc32 of everything after it, operation, key codec, key length
+RECORD = struct.Struct('<IccI')
+INSERT = b'+'
+DELETE = b'-'
+SYNC_POLICIES = ('always', 'interval', 'never')
+
+
+def encode_key(key, codec):
+    width_format = red_black_io.CODECS[codec]
+    if width_format is not None:
+        return struct.pack('<' + width_format, key)
+    if codec == b's':
+        return key.encode('utf-8')
+    return key
+
+
+def decode_key(data, codec):
+    width_format = red_black_io.CODECS[codec]
+    if width_format is not None:
+        return struct.unpack('<' + width_format, data)[0]
+    if codec == b's':
+        return data.decode('utf-8')
+    return bytes(data)
+
+
+def encode_record(operation, key):
+    codec = red_black_io.codec_of(key)
+    data = encode_key(key, codec)
+    body = RECORD.pack(0, operation, codec, len(data))[4:] + data
+    return struct.pack('<I', zlib.crc32(body) & 0xffffffff) + body
+
+
+def read_records(data):
+    """(operation, key) of each intact record at the start of data, and
+    the length of that intact prefix: reading stops at the first record
+    that is cut short or fails its checksum"""
+    records = []
+    position = 0
+    while position + RECORD.size <= len(data):
+        crc, operation, codec, length = RECORD.unpack_from(data, position)
+        end = position + RECORD.size + length
+        if end > len(data):
+            break
+        if zlib.crc32(data[position + 4:end]) & 0xffffffff != crc:
+            break
+        if operation not in (INSERT, DELETE) or codec not in red_black_io.CODECS:
+            break
+        try:
+            key = decode_key(data[position + RECORD.size:end], codec)
+        except (struct.error, UnicodeDecodeError):
+            break
+        records.append((operation, key))
+        position = end
+    return records, position
+
+
+def fsync_directory(directory):
+    """Make renames and new files in directory durable, where the
+    platform can open directories"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DurableRedBlackTree(object):
+    """RedBlackTree whose inserts and deletes survive restarts
+    - Every insert/delete_key appends a CRC-protected record to an
+      append-only log before it returns. Records are buffered and written
+      and fsynced in groups according to sync:
+      - 'always': each operation is fsynced before it returns
+      - 'interval': the buffer is written and fsynced once sync_interval
+        seconds have passed since the last sync, checked as operations
+        arrive (call sync() to force it when they stop)
+      - 'never': the buffer is written once it fills; the OS decides
+        when it reaches the disk
+    - checkpoint() dumps the tree with red_black_io and starts a new log;
+      with checkpoint_every set it runs after that many logged operations
+    - Files are checkpoint.<g> (every operation before log <g>) and
+      log.<g>. Opening a directory loads the newest checkpoint and
+      replays the logs from its generation on, dropping a torn tail
+    - Values are not logged; reads go to the tree attribute or the
+      delegating methods below"""
+    buffer_limit = 1 << 16
+
+    def __init__(self, directory, sync='interval', sync_interval=0.01, checkpoint_every=None,
+                 create_tree=RedBlackTree, **kwargs):
+        if sync not in SYNC_POLICIES:
+            raise ValueError("sync must be one of {}".format(", ".join(SYNC_POLICIES)))
+        self.directory = directory
+        self.sync_policy = sync
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.create_tree = create_tree
+        self.tree_kwargs = kwargs
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.operations_since_checkpoint = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._recover()
+        self.last_sync = clock()
+
+    def _path(self, name, generation):
+        return os.path.join(self.directory, '{}.{}'.format(name, generation))
+
+    def _generations(self, name):
+        pattern = re.compile(re.escape(name) + r'\.(\d+)$')
+        matches = (pattern.match(entry) for entry in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def _recover(self):
+        checkpoints = self._generations('checkpoint')
+        self.generation = checkpoints[-1] if checkpoints else 0
+        if checkpoints:
+            self.tree = red_black_io.load(self._path('checkpoint', self.generation),
+                                          self.create_tree, **self.tree_kwargs)
+        else:
+            self.tree = self.create_tree(**self.tree_kwargs)
+
+        logs = [g for g in self._generations('log') if g >= self.generation]
+        for generation in logs:
+            path = self._path('log', generation)
+            with open(path, 'rb') as f:
+                data = f.read()
+            records, intact = read_records(data)
+            for operation, key in records:
+                if operation == INSERT:
+                    self.tree.insert(key)
+                else:
+                    self.tree.delete_key(key)
+            self.operations_since_checkpoint += len(records)
+            if intact < len(data):
+                # A torn tail: nothing after it was ever acknowledged
+                with open(path, 'rb+') as f:
+                    f.truncate(intact)
+                    os.fsync(f.fileno())
+                for later in logs[logs.index(generation) + 1:]:
+                    os.remove(self._path('log', later))
+                logs = logs[:logs.index(generation) + 1]
+                break
+        if checkpoints:
+            self._remove_before(checkpoints[-1])
+        for entry in os.listdir(self.directory):
+            if entry.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, entry))
+        if logs:
+            self.generation = logs[-1]
+        self.log = open(self._path('log', self.generation), 'ab')
+
+    def _remove_before(self, generation):
+        """Drop the checkpoints and logs that checkpoint.<generation> supersedes"""
+        for name in ('checkpoint', 'log'):
+            for old in self._generations(name):
+                if old < generation:
+                    os.remove(self._path(name, old))
+
+    def _append(self, record):
+        """Log record of an operation just applied to the tree"""
+        self.buffer.append(record)
+        self.buffered_bytes += len(record)
+        policy = self.sync_policy
+        if policy == 'always':
+            self.sync()
+        elif policy == 'interval':
+            if clock() - self.last_sync >= self.sync_interval:
+                self.sync()
+            elif self.buffered_bytes >= self.buffer_limit:
+                self._write()
+        elif self.buffered_bytes >= self.buffer_limit:
+            self._write()
+
+        self.operations_since_checkpoint += 1
+        if self.checkpoint_every and self.operations_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _write(self):
+        """Hand the buffered records to the OS in one write"""
+        if self.buffer:
+            self.log.write(b''.join(self.buffer))
+            self.buffer = []
+            self.buffered_bytes = 0
+        self.log.flush()
+
+    def sync(self):
+        """Write and fsync every buffered record"""
+        self._write()
+        os.fsync(self.log.fileno())
+        self.last_sync = clock()
+
+    def checkpoint(self):
+        """Dump the tree and start a new log, then drop the files the
+        dump supersedes; a crash at any point leaves a recoverable set"""
+        self.sync()
+        self.log.close()
+        generation = self.generation + 1
+        self.log = open(self._path('log', generation), 'ab')
+
+        path = self._path('checkpoint', generation)
+        red_black_io.dump(self.tree, path + '.tmp')
+        with open(path + '.tmp', 'rb+') as f:
+            os.fsync(f.fileno())
+        os.rename(path + '.tmp', path)
+        fsync_directory(self.directory)
+
+        self._remove_before(generation)
+        self.generation = generation
+        self.operations_since_checkpoint = 0
+
+    def close(self):
+        if not self.log.closed:
+            self.sync()
+            self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Writers
+
+    def insert(self, key):
+        record = encode_record(INSERT, key)
+        self.tree.insert(key)
+        self._append(record)
+
+    def delete_key(self, key):
+        """Delete key, logging the delete only if key was present"""
+        if not self.tree.delete_key(key):
+            return False
+        self._append(encode_record(DELETE, key))
+        return True
+
+    # Readers
+
+    def search(self, key):
+        return self.tree.search(key)
+
+    def __contains__(self, key):
+        return key in self.tree
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __iter__(self):
+        return iter(self.tree)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        return self.tree.irange(lo, hi, inclusive, reverse)
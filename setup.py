@@ -0,0 +1,27 @@
+"""Builds the optional _red_black extension
+
+    python setup.py build_ext --inplace
+
+red_black.py runs in pure Python when the extension is missing, so a
+failed build (no compiler, Python 2) is not an error."""
+from setuptools import Extension, setup
+
+setup(
+    name='red-black-tree',
+    version='0.1',
+    py_modules=[
+        'red_black',
+        'red_black_array',
+        'red_black_bench',
+        'red_black_concurrent',
+        'red_black_expiry',
+        'red_black_frozen',
+        'red_black_heap',
+        'red_black_interval',
+        'red_black_io',
+        'red_black_persistent',
+        'red_black_sharded',
+        'red_black_wal',
+    ],
+    ext_modules=[Extension('_red_black', ['_red_black.c'], optional=True)],
+)
@@ -1,11 +1,42 @@
-from unittest import TestCase
-from red_black import RedBlackTree
+import bisect
+import copy
+import gc
+import pickle
+import random
+import sys
+from unittest import TestCase, skipIf
+from red_black import (CountedNode, KeyedNode, MultisetTree, NativeNode, Node, OrderStatisticTree,
+                       Profiler, RedBlackTree)
 
 class TestRedBlackTree(TestCase):
     def assertNode(self, node, key, red=False):
         self.assertEqual(node.key, key)
         self.assertEqual(node.red, red)
 
+    def assertRedBlack(self, tree):
+        """Check parent links, key order and the Red-Black properties,
+        returning the keys of the tree in order"""
+        keys = []
+
+        def walk(node, parent):
+            if node == tree.nil:
+                return 1
+            self.assertEqual(node.parent, parent)
+            if node.red:
+                self.assertFalse(node.left.red)
+                self.assertFalse(node.right.red)
+            left_black_height = walk(node.left, node)
+            keys.append(node.key)
+            right_black_height = walk(node.right, node)
+            self.assertEqual(left_black_height, right_black_height)
+            return left_black_height + (0 if node.red else 1)
+
+        self.assertFalse(tree.root.red)
+        walk(tree.root, tree.nil)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(keys), tree.number_of_nodes)
+        return keys
+
     def setUp(self):
         self.tree = RedBlackTree()
 
@@ -17,6 +48,15 @@ class TestRedBlackTree(TestCase):
         tree.insert(5)
         self.assertNode(tree.root, 5)
 
+    def test_insert_returns_the_new_node(self):
+        tree = self.tree
+        first = tree.insert(5)
+        second = tree.insert(5)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.key, 5)
+        tree.delete_node(first)
+        self.assertIs(tree.search(5), second)
+
     def test_insert_one_hundred_keys(self):
         tree = self.tree
         for i in range(100):
@@ -24,6 +64,16 @@ class TestRedBlackTree(TestCase):
 
         self.assertEqual(tree.number_of_nodes, 100)
 
+    def test_insert_descending_keys(self):
+        tree = self.tree
+        for i in range(100, 0, -1):
+            tree.insert(i)
+
+        self.assertEqual(tree.nil, tree.root.parent)
+        self.assertNotEqual(0, tree.black_height(tree.root))
+        self.assertEqual(tree.minimum().key, 1)
+        self.assertEqual(tree.maximum().key, 100)
+
     def test_right_rotate(self):
         tree = self.tree
 
@@ -138,4 +188,1047 @@ class TestRedBlackTree(TestCase):
         tree.delete_key(7)
 
 
-        tree.in_order_walk()
\ No newline at end of file
+        tree.in_order_walk()
+
+    def test_random_inserts_and_deletes_keep_invariants(self):
+        tree = self.tree
+        keys = list(range(500))
+        random.shuffle(keys)
+        for i in keys:
+            tree.insert(i)
+        self.assertEqual(self.assertRedBlack(tree), list(range(500)))
+
+        random.shuffle(keys)
+        for i in keys[:300]:
+            self.assertTrue(tree.delete_key(i))
+        self.assertEqual(self.assertRedBlack(tree), sorted(keys[300:]))
+
+    def test_trees_share_nil_sentinel(self):
+        tree = self.tree
+        other = type(tree)()
+        self.assertIs(tree.nil, other.nil)
+
+        for i in range(20):
+            tree.insert(i)
+            other.insert(i)
+        for i in range(0, 20, 2):
+            tree.delete_key(i)
+        self.assertIsNone(tree.nil.parent)
+        self.assertFalse(tree.nil.red)
+        self.assertEqual(self.assertRedBlack(other), list(range(20)))
+
+    def test_nodes_have_no_instance_dict(self):
+        self.tree.insert(1)
+        self.assertFalse(hasattr(self.tree.root, '__dict__'))
+
+    def test_insert_uses_create_node(self):
+        class LabelledNode(Node):
+            __slots__ = ('label',)
+
+            def __init__(self, key):
+                super(LabelledNode, self).__init__(key)
+                self.label = 'custom'
+
+        tree = RedBlackTree(create_node=LabelledNode)
+        for i in [2, 1, 3]:
+            tree.insert(i)
+
+        self.assertEqual(tree.root.label, 'custom')
+        self.assertEqual(tree.root.left.label, 'custom')
+        self.assertIsNot(tree.nil, self.tree.nil)
+        self.assertEqual(self.assertRedBlack(tree), [1, 2, 3])
+
+    def test_from_sorted_builds_valid_trees(self):
+        for n in range(130):
+            tree = type(self.tree).from_sorted(range(n))
+            self.assertEqual(self.assertRedBlack(tree), list(range(n)))
+
+    def test_from_sorted_tree_accepts_updates(self):
+        tree = type(self.tree).from_sorted(range(0, 200, 2))
+        for i in range(1, 200, 2):
+            tree.insert(i)
+        for i in range(0, 200, 3):
+            self.assertTrue(tree.delete_key(i))
+
+        self.assertEqual(self.assertRedBlack(tree), [i for i in range(200) if i % 3])
+
+    def test_from_sorted_rejects_unsorted_keys(self):
+        self.assertRaises(ValueError, RedBlackTree.from_sorted, [1, 3, 2])
+
+    def test_from_iterable(self):
+        keys = [random.randint(0, 50) for _ in range(100)]
+        tree = RedBlackTree.from_iterable(keys, create_node=Node)
+        self.assertEqual(self.assertRedBlack(tree), sorted(keys))
+
+    def test_insert_many_small_batch_uses_fingers(self):
+        tree = type(self.tree).from_sorted(range(0, 1000, 2))
+        batch = list(range(1, 200, 2)) + [500, 500, 998]
+        random.shuffle(batch)
+
+        self.assertEqual(tree.insert_many(batch), len(batch))
+        self.assertEqual(self.assertRedBlack(tree), sorted(list(range(0, 1000, 2)) + batch))
+
+    def test_insert_many_large_batch_rebuilds(self):
+        tree = self.tree
+        for i in [5, 1, 9]:
+            tree.insert(i)
+        batch = [random.randint(0, 20) for _ in range(50)]
+
+        self.assertEqual(tree.insert_many(batch), 50)
+        self.assertEqual(self.assertRedBlack(tree), sorted([5, 1, 9] + batch))
+        self.assertEqual(tree.insert_many([]), 0)
+
+    def test_delete_many(self):
+        for batch_size in [10, 400]:
+            keys = [random.randint(0, 300) for _ in range(500)]
+            tree = type(self.tree).from_iterable(keys)
+            batch = [random.randint(0, 400) for _ in range(batch_size)]
+
+            expected = sorted(keys)
+            removed = 0
+            for key in batch:
+                if key in expected:
+                    expected.remove(key)
+                    removed += 1
+
+            self.assertEqual(tree.delete_many(batch), removed)
+            self.assertEqual(self.assertRedBlack(tree), expected)
+
+    def test_bulk_rebuilds_keep_values(self):
+        tree = self.tree
+        tree[1] = 'a'
+        tree[2] = 'b'
+        tree.insert(2)
+        tree[4] = 'd'
+        self.assertEqual(tree.insert_many([3, 2, 5, 6, 7]), 5)
+        self.assertEqual(list(tree.items()),
+                         [(1, 'a'), (2, 'b'), (2, None), (2, None), (3, None), (4, 'd'), (5, None),
+                          (6, None), (7, None)])
+        self.assertEqual(tree.delete_many([1, 2, 3, 5, 6, 7]), 6)
+        # Which copy of 2 goes is up to the path the batch takes
+        self.assertEqual(list(tree), [2, 2, 4])
+        self.assertEqual(tree[4], 'd')
+        self.assertRedBlack(tree)
+
+    def test_delete_many_repeated_keys(self):
+        tree = self.tree
+        for i in [4, 4, 4, 4, 2, 6, 4]:
+            tree.insert(i)
+
+        self.assertEqual(tree.delete_many([4, 4, 4]), 3)
+        self.assertEqual(self.assertRedBlack(tree), [2, 4, 4, 6])
+        self.assertEqual(type(tree)().delete_many([1]), 0)
+
+    def test_iteration(self):
+        tree = self.tree
+        self.assertEqual(list(tree), [])
+        self.assertEqual(list(reversed(tree)), [])
+
+        keys = [random.randint(0, 100) for _ in range(300)]
+        for i in keys:
+            tree.insert(i)
+
+        self.assertEqual(list(tree), sorted(keys))
+        self.assertEqual(list(tree.keys()), sorted(keys))
+        self.assertEqual(list(reversed(tree)), sorted(keys, reverse=True))
+        self.assertEqual(list(tree.items()), [(i, None) for i in sorted(keys)])
+
+    def test_irange(self):
+        keys = list(range(0, 100, 3)) * 2
+        tree = type(self.tree).from_iterable(keys)
+        keys.sort()
+
+        for lo, hi in [(None, None), (10, 40), (9, 39), (-5, 4), (98, 200), (50, 10), (None, 12), (90, None)]:
+            for inclusive in [(True, True), (False, False), (True, False), (False, True)]:
+                def within(i):
+                    above = lo is None or (lo <= i if inclusive[0] else lo < i)
+                    below = hi is None or (i <= hi if inclusive[1] else i < hi)
+                    return above and below
+
+                expected = [i for i in keys if within(i)]
+                self.assertEqual(list(tree.irange(lo, hi, inclusive)), expected)
+                self.assertEqual(list(tree.irange(lo, hi, inclusive, reverse=True)), expected[::-1])
+
+    def test_in_order_walk_levels(self):
+        tree = self.tree
+        for i in [2, 1, 3]:
+            tree.insert(i)
+        tree.in_order_walk()
+
+        self.assertEqual(tree.levels, [[1, 1], [0, 2], [1, 3]])
+
+    def test_iteration_of_deep_tree(self):
+        tree = type(self.tree).from_sorted(range(20000))
+        self.assertEqual(sum(1 for _ in tree), 20000)
+        self.assertEqual(next(reversed(tree)), 19999)
+
+    def test_map_interface(self):
+        tree = self.tree
+        self.assertEqual(len(tree), 0)
+        self.assertRaises(KeyError, lambda: tree[1])
+        self.assertEqual(tree.get(1, 'x'), 'x')
+
+        tree[2] = 'b'
+        tree[1] = 'a'
+        tree[2] = 'B'
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(tree[2], 'B')
+        self.assertIn(1, tree)
+        self.assertNotIn(3, tree)
+        self.assertEqual(tree.setdefault(1, 'z'), 'a')
+        self.assertEqual(tree.setdefault(3, 'c'), 'c')
+        self.assertEqual(list(tree.items()), [(1, 'a'), (2, 'B'), (3, 'c')])
+        self.assertEqual(list(tree.values()), ['a', 'B', 'c'])
+
+        self.assertEqual(tree.pop(2), 'B')
+        self.assertEqual(tree.pop(2, None), None)
+        self.assertRaises(KeyError, tree.pop, 2)
+        del tree[1]
+        self.assertRaises(KeyError, tree.__delitem__, 1)
+        self.assertEqual(list(tree.items()), [(3, 'c')])
+
+    def test_map_against_dict(self):
+        tree = self.tree
+        expected = {}
+        for _ in range(3000):
+            key = random.randint(0, 300)
+            action = random.random()
+            if action < 0.5:
+                tree[key] = expected[key] = random.random()
+            elif action < 0.7:
+                self.assertEqual(tree.setdefault(key, action), expected.setdefault(key, action))
+            elif action < 0.85:
+                self.assertEqual(tree.pop(key, None), expected.pop(key, None))
+            else:
+                self.assertEqual(tree.get(key), expected.get(key))
+
+        self.assertEqual(len(tree), len(expected))
+        self.assertEqual(self.assertRedBlack(tree), sorted(expected))
+        self.assertEqual(list(tree.items()), sorted(expected.items()))
+
+    def test_neighbor_queries(self):
+        keys = sorted(random.randint(0, 500) for _ in range(200))
+        tree = type(self.tree).from_sorted(keys)
+
+        def key_of(node):
+            return None if node is None else node.key
+
+        probes = list(range(-5, 510))
+        for probe in probes:
+            i = bisect.bisect_right(keys, probe)
+            self.assertEqual(key_of(tree.floor(probe)), keys[i - 1] if i else None)
+            i = bisect.bisect_left(keys, probe)
+            self.assertEqual(key_of(tree.ceiling(probe)), keys[i] if i < len(keys) else None)
+            self.assertEqual(key_of(tree.lower(probe)), keys[i - 1] if i else None)
+            i = bisect.bisect_right(keys, probe)
+            self.assertEqual(key_of(tree.higher(probe)), keys[i] if i < len(keys) else None)
+
+        probes = sorted(random.randint(-10, 520) for _ in range(300))
+        self.assertEqual([key_of(node) for node in tree.floor_many(probes)],
+                         [key_of(tree.floor(probe)) for probe in probes])
+        self.assertEqual([key_of(node) for node in tree.ceiling_many(probes)],
+                         [key_of(tree.ceiling(probe)) for probe in probes])
+        self.assertRaises(ValueError, tree.floor_many, [2, 1])
+        self.assertRaises(ValueError, tree.ceiling_many, [2, 1])
+
+    def test_neighbor_queries_on_empty_tree(self):
+        tree = self.tree
+        self.assertIsNone(tree.floor(1))
+        self.assertIsNone(tree.ceiling(1))
+        self.assertEqual(tree.floor_many([1, 2]), [None, None])
+        self.assertEqual(tree.ceiling_many([1, 2]), [None, None])
+
+    def test_successor_and_predecessor(self):
+        keys = random.sample(range(1000), 300)
+        tree = self.tree
+        for i in keys:
+            tree.insert(i)
+
+        node = tree.minimum()
+        walked = []
+        while node is not None:
+            walked.append(node.key)
+            node = tree.successor(node)
+        self.assertEqual(walked, sorted(keys))
+
+        node = tree.maximum()
+        walked = []
+        while node is not None:
+            walked.append(node.key)
+            node = tree.predecessor(node)
+        self.assertEqual(walked, sorted(keys, reverse=True))
+
+    def test_search_is_read_only(self):
+        tree = self.tree
+        for i in range(100):
+            tree.insert(i)
+
+        self.assertEqual(tree.search(42).key, 42)
+        self.assertEqual(tree.search(420), tree.nil)
+        self.assertEqual(tree.nodes_considered, 0)
+
+    def test_search_counts_nodes_considered_with_collect_stats(self):
+        tree = type(self.tree)(collect_stats=True)
+        for i in range(100):
+            tree.insert(i)
+
+        self.assertEqual(tree.search(tree.root.key).key, tree.root.key)
+        self.assertEqual(tree.nodes_considered, 0)
+        self.assertEqual(tree.search(tree.minimum().key).key, 0)
+        self.assertTrue(tree.nodes_considered > 0)
+
+    def test_stats_count_rotations_recolorings_and_cases(self):
+        tree = type(self.tree)(collect_stats=True)
+        keys = list(range(500))
+        random.shuffle(keys)
+        # Every descent stays within the bound of the tree it ran on, plus
+        # the node an insert attaches
+        bound = 0
+        for key in keys:
+            bound = max(bound, tree.stats()['height_bound'] + 1)
+            tree.insert(key)
+        for key in keys[:250]:
+            bound = max(bound, tree.stats()['height_bound'])
+            tree.delete_key(key)
+
+        stats = tree.stats()
+        self.assertEqual(stats['rotations'], stats['left_rotations'] + stats['right_rotations'])
+        self.assertTrue(stats['left_rotations'] > 0)
+        self.assertTrue(stats['right_rotations'] > 0)
+        self.assertTrue(stats['recolorings'] > 0)
+        for case in range(1, 4):
+            self.assertTrue(stats['insert_case_{}'.format(case)] > 0)
+        for case in range(1, 5):
+            self.assertTrue(stats['delete_case_{}'.format(case)] > 0)
+        self.assertEqual(stats['descents'], 750)
+        self.assertTrue(1 <= stats['mean_descent_depth'] <= stats['max_descent_depth'])
+        self.assertTrue(stats['max_descent_depth'] <= bound)
+        self.assertEqual(stats['number_of_nodes'], 250)
+        self.assertNotIn('height', stats)
+        height = tree.stats(height=True)['height']
+        self.assertEqual(height, self.height(tree.root, tree.nil))
+        self.assertTrue(height <= stats['height_bound'])
+
+        tree.reset_stats()
+        stats = tree.stats()
+        self.assertEqual(stats['rotations'], 0)
+        self.assertEqual(stats['descents'], 0)
+        self.assertEqual(stats['black_height'], tree.black_height(tree.root) - 1)
+
+    def height(self, node, nil):
+        if node is nil:
+            return 0
+        return 1 + max(self.height(node.left, nil), self.height(node.right, nil))
+
+    def test_stats_height(self):
+        tree = self.tree
+        self.assertEqual(tree.stats(height=True)['height'], 0)
+        tree.insert(1)
+        self.assertEqual(tree.stats(height=True)['height'], 1)
+        for i in range(2, 100):
+            tree.insert(i)
+        stats = tree.stats(height=True)
+        self.assertEqual(stats['height'], self.height(tree.root, tree.nil))
+        self.assertTrue(stats['height'] <= stats['height_bound'])
+
+    def test_stats_counters_stay_zero_when_off(self):
+        tree = self.tree
+        for i in range(100):
+            tree.insert(i)
+        for i in range(50):
+            tree.delete_key(i)
+
+        stats = tree.stats()
+        self.assertEqual(stats['rotations'], 0)
+        self.assertEqual(stats['recolorings'], 0)
+        self.assertEqual(stats['descents'], 0)
+        self.assertEqual(stats['black_height'], tree.black_height(tree.root) - 1)
+
+    def test_stats_black_height_is_maintained(self):
+        def check(tree):
+            self.assertEqual(tree.stats()['black_height'], tree.black_height(tree.root) - 1)
+
+        tree = self.tree
+        check(tree)
+        keys = list(range(300))
+        random.shuffle(keys)
+        for key in keys:
+            tree.insert(key)
+            check(tree)
+        for key in keys:
+            tree.delete_key(key)
+            check(tree)
+
+        tree = type(self.tree).from_sorted(range(0, 1000, 2))
+        check(tree)
+        other = type(self.tree).from_sorted(range(1, 100, 2))
+        tree.union(other)
+        check(tree)
+        check(other)
+        right = tree.split(500)
+        check(tree)
+        check(right)
+        tree.join(500, right)
+        check(tree)
+        check(right)
+
+    def test_profiler_records_phases(self):
+        profiler = Profiler()
+        tree = type(self.tree)(profiler=profiler)
+        for i in range(100):
+            tree.insert(i)
+        for i in range(50):
+            tree.delete_key(i)
+
+        self.assertEqual(profiler.counts['descent'], 150)
+        self.assertEqual(profiler.counts['splice'], 50)
+        self.assertEqual(profiler.counts['fixup'], 150)
+        self.assertTrue(profiler.counts['rotation'] > 0)
+        self.assertTrue(profiler.counts['transplant'] >= 50)
+        for phase in Profiler.PHASES:
+            self.assertEqual(sum(profiler.histograms[phase]), profiler.counts[phase])
+            self.assertTrue(profiler.totals[phase] >= 0)
+        self.assertTrue(profiler.percentile('descent', 99) >= profiler.percentile('descent', 50))
+
+    def test_profiler_callback(self):
+        samples = []
+        tree = RedBlackTree(profiler=lambda phase, elapsed: samples.append(phase))
+        for i in [3, 2, 1]:
+            tree.insert(i)
+
+        self.assertEqual(samples.count('descent'), 3)
+        self.assertEqual(samples.count('fixup'), 3)
+        self.assertEqual(samples.count('rotation'), 1)
+
+    def test_time_flag_records_last_operation(self):
+        tree = self.tree
+        tree.insert(1, time=True)
+        tree.insert(2, time=True)
+        self.assertTrue(0 <= tree.insert_time < 1)
+        self.assertTrue(0 <= tree.insert_fixup_time < 1)
+
+        tree.delete_key(1, time=True)
+        self.assertTrue(0 <= tree.delete_time < 1)
+        self.assertTrue(0 <= tree.delete_fixup_time < 1)
+
+    def test_join(self):
+        create_tree = type(self.tree)
+        for left_size, right_size in [(0, 0), (0, 40), (40, 0), (3, 300), (300, 3), (100, 100)]:
+            left = create_tree.from_sorted(range(left_size))
+            right = create_tree()
+            for i in range(1000, 1000 + right_size):
+                right.insert(i)
+
+            create_tree.join(left, 500, right, 'pivot')
+            self.assertEqual(self.assertRedBlack(left),
+                             list(range(left_size)) + [500] + list(range(1000, 1000 + right_size)))
+            self.assertEqual(left[500], 'pivot')
+            self.assertEqual(len(right), 0)
+            self.assertEqual(right.root, right.nil)
+            left.insert(-1)
+            self.assertRedBlack(left)
+
+    def test_join_rejects_overlapping_keys(self):
+        create_tree = type(self.tree)
+        left = create_tree.from_sorted([1, 5])
+        self.assertRaises(ValueError, left.join, 4, create_tree.from_sorted([6]))
+        self.assertRaises(ValueError, left.join, 6, create_tree.from_sorted([5]))
+        self.assertRaises(ValueError, left.join, 6, left)
+        self.assertEqual(list(left), [1, 5])
+
+    def test_split(self):
+        keys = sorted(random.randint(0, 100) for _ in range(300))
+        for key in [-1, 0, 17, 50, 100, 101]:
+            for inclusive in [False, True]:
+                tree = type(self.tree).from_sorted(keys)
+                right = tree.split(key, inclusive)
+                if inclusive:
+                    expected = [k for k in keys if k <= key]
+                else:
+                    expected = [k for k in keys if k < key]
+                self.assertEqual(self.assertRedBlack(tree), expected)
+                self.assertEqual(self.assertRedBlack(right), keys[len(expected):])
+                self.assertIsInstance(right, type(self.tree))
+
+                right.insert(key)
+                tree.delete_key(key)
+                self.assertRedBlack(right)
+                self.assertRedBlack(tree)
+
+    def test_set_operations_against_sets(self):
+        create_tree = type(self.tree)
+        for _ in range(30):
+            a = set(random.sample(range(500), random.randint(0, 200)))
+            b = set(random.sample(range(500), random.randint(0, 200)))
+            for operation in ['union', 'intersection', 'difference']:
+                tree = create_tree()
+                for key in a:
+                    tree[key] = 'a'
+                other = create_tree.from_iterable(b)
+                getattr(tree, operation)(other)
+
+                self.assertEqual(self.assertRedBlack(tree), sorted(getattr(a, operation)(b)))
+                self.assertEqual(len(other), 0)
+                for key in a & set(tree):
+                    self.assertEqual(tree[key], 'a')
+
+    def test_pickle_and_deepcopy_round_trip(self):
+        tree = type(self.tree).from_iterable([random.randint(0, 50) for _ in range(200)])
+        tree[7] = 'seven'
+        tree[60] = ['sixty']
+        for clone in [pickle.loads(pickle.dumps(tree, 2)), copy.deepcopy(tree)]:
+            self.assertIsInstance(clone, type(tree))
+            self.assertEqual(list(clone.items()), list(tree.items()))
+            self.assertEqual(self.assertRedBlack(clone), list(tree))
+            self.assertIs(type(clone.nil), type(tree.nil))
+            self.assertEqual(clone._core is None, tree._core is None)
+            clone.insert(1000)
+            clone.delete_key(7)
+            self.assertEqual(len(clone), len(tree))
+        self.assertEqual(tree[7], 'seven')
+
+        reverse = type(self.tree).from_iterable([2, -3, 1], reverse=True, key=abs)
+        self.assertEqual(list(copy.deepcopy(reverse)), [-3, 2, 1])
+        self.assertEqual(list(pickle.loads(pickle.dumps(reverse))), [-3, 2, 1])
+
+    def test_counts_after_split_join_and_set_operations(self):
+        """Updates right after an operation that leaves the count to be
+        recounted, before anything reads it"""
+        create_tree = type(self.tree)
+
+        def updated(tree, keys):
+            tree.insert(100)
+            tree.delete_key(keys[0])
+            tree.insert_many([101, 102])
+            tree.delete_many([101])
+            tree[103] = 'x'
+            keys = sorted(keys[1:] + [100, 102, 103])
+            self.assertEqual(len(tree), len(keys))
+            self.assertEqual(self.assertRedBlack(tree), keys)
+
+        tree = create_tree.from_sorted(range(10))
+        right = tree.split(5)
+        updated(right, list(range(5, 10)))
+        updated(tree, list(range(5)))
+
+        left = create_tree.from_sorted(range(3))
+        left.split(1)
+        right = create_tree.from_sorted(range(10, 13))
+        right.split(11)
+        left.join(5, right)
+        updated(left, [0, 5, 10])
+
+        for operation, expected in [('union', list(range(9))), ('intersection', [3, 4, 5]),
+                                    ('difference', [0, 1, 2])]:
+            tree = create_tree.from_sorted(range(6))
+            getattr(tree, operation)(create_tree.from_sorted(range(3, 9)))
+            updated(tree, expected)
+
+    def assertExtremes(self, tree):
+        """Check the cached minimum and maximum against fresh descents"""
+        self.assertIs(tree.minimum(), tree._leftmost(tree.root))
+        self.assertIs(tree.maximum(), tree._rightmost(tree.root))
+
+    def test_cached_extremes_follow_updates(self):
+        tree = self.tree
+        self.assertIsNone(tree.minimum())
+        for _ in range(600):
+            key = random.randint(0, 100)
+            if random.random() < 0.6:
+                tree.insert(key)
+            else:
+                tree.delete_key(key)
+            self.assertExtremes(tree)
+        tree.insert_many(range(-5, 5))
+        self.assertExtremes(tree)
+        tree.delete_many(range(0, 50))
+        self.assertExtremes(tree)
+        right = tree.split(70)
+        self.assertExtremes(tree)
+        self.assertExtremes(right)
+        tree.join(70, right)
+        self.assertExtremes(tree)
+        tree.insert_many(range(1000))
+        self.assertExtremes(tree)
+
+    def test_pop_min_and_max(self):
+        tree = self.tree
+        for key in [5, 1, 9, 1, 7]:
+            tree[key] = key * 10
+        tree.insert(9)
+        self.assertEqual(tree.peek_min(), (1, 10))
+        self.assertEqual(tree.pop_min(), (1, 10))
+        self.assertEqual(tree.pop_max(), (9, None))
+        self.assertEqual(tree.peek_max(), (9, 90))
+        self.assertEqual(list(tree), [5, 7, 9])
+        self.assertEqual(len(tree), 3)
+        while tree:
+            tree.pop_min()
+        self.assertRaises(IndexError, tree.pop_min)
+        self.assertRaises(IndexError, tree.peek_max)
+
+        tree = type(self.tree)(key=len, reverse=True)
+        for word in ['fig', 'apple', 'kiwi']:
+            tree.insert(word)
+        self.assertEqual(tree.pop_min(), ('apple', None))
+        self.assertEqual(tree.pop_max(), ('fig', None))
+        self.assertEqual(list(tree), ['kiwi'])
+
+    def test_key_function(self):
+        calls = []
+
+        def timestamp(record):
+            calls.append(record)
+            return record[0]
+
+        records = [(random.random(), i) for i in range(300)]
+        tree = type(self.tree)(key=timestamp)
+        for record in records:
+            tree.insert(record)
+        self.assertEqual(len(calls), 300)
+        self.assertEqual(self.assertRedBlack(tree), sorted(record[0] for record in records))
+        self.assertEqual(list(tree), sorted(records))
+        self.assertEqual(list(reversed(tree)), sorted(records, reverse=True))
+        self.assertEqual(len(calls), 300)
+
+        record = records[42]
+        self.assertEqual(tree.search(record[0]).item, record)
+        self.assertTrue(record[0] in tree)
+        self.assertEqual(list(tree.irange(0.25, 0.5)),
+                         sorted(r for r in records if 0.25 <= r[0] <= 0.5))
+        self.assertEqual(tree.minimum().item, min(records))
+        self.assertTrue(tree.delete_key(record[0]))
+        self.assertEqual(self.assertRedBlack(tree), sorted(r[0] for r in records if r is not record))
+
+        tree = type(self.tree).from_iterable(records, key=timestamp)
+        self.assertEqual(list(tree), sorted(records))
+        tree.insert_many([(2.0, 'b'), (-1.0, 'a')])
+        self.assertEqual(list(tree.items())[0], ((-1.0, 'a'), None))
+        right = tree.split(0.5)
+        tree.join((0.5, 'pivot'), right)
+        self.assertEqual(self.assertRedBlack(tree), sorted([r[0] for r in records] + [-1.0, 0.5, 2.0]))
+        self.assertEqual(list(tree)[-1], (2.0, 'b'))
+
+    def test_reverse_order(self):
+        keys = list(range(0, 200, 2))
+        random.shuffle(keys)
+        tree = type(self.tree)(reverse=True)
+        for key in keys:
+            tree.insert(key)
+        self.assertEqual(self.assertRedBlack(tree), sorted(keys))
+        descending = sorted(keys, reverse=True)
+        self.assertEqual(list(tree), descending)
+        self.assertEqual(list(reversed(tree)), sorted(keys))
+        self.assertEqual(tree.minimum().key, 198)
+        self.assertEqual(tree.maximum().key, 0)
+        self.assertEqual(tree.successor(tree.search(100)).key, 98)
+        self.assertEqual(tree.predecessor(tree.search(100)).key, 102)
+        self.assertIsNone(tree.successor(tree.search(0)))
+
+        self.assertEqual(tree.floor(51).key, 52)
+        self.assertEqual(tree.ceiling(51).key, 50)
+        self.assertEqual(tree.lower(52).key, 54)
+        self.assertEqual(tree.higher(52).key, 50)
+        self.assertEqual([n.key for n in tree.floor_many([151, 51, 1])], [152, 52, 2])
+        self.assertEqual([n.key for n in tree.ceiling_many([151, 51, 1])], [150, 50, 0])
+        self.assertRaises(ValueError, tree.floor_many, [1, 51])
+
+        self.assertEqual(list(tree.irange(100, 90)), [100, 98, 96, 94, 92, 90])
+        self.assertEqual(list(tree.irange(100, 90, (False, False))), [98, 96, 94, 92])
+        self.assertEqual(list(tree.irange(100, 90, reverse=True)), [90, 92, 94, 96, 98, 100])
+        self.assertEqual(list(tree.irange(hi=190)), [198, 196, 194, 192, 190])
+
+        right = tree.split(100)
+        self.assertEqual(list(tree), [k for k in descending if k > 100])
+        self.assertEqual(list(right), [k for k in descending if k <= 100])
+        tree.join(101, right)
+        self.assertEqual(self.assertRedBlack(tree), sorted(keys + [101]))
+        self.assertEqual(len(right), 0)
+        self.assertRaises(ValueError, tree.join, 300, type(self.tree)(reverse=True))
+        self.assertRaises(ValueError, tree.union, type(self.tree)())
+
+        tree = type(self.tree).from_sorted(descending, reverse=True)
+        self.assertEqual(list(tree), descending)
+        self.assertRaises(ValueError, type(self.tree).from_sorted, [1, 2], reverse=True)
+        self.assertEqual(list(type(self.tree).from_iterable(keys, reverse=True)), descending)
+
+    def test_key_function_with_reverse(self):
+        words = ['pear', 'Apple', 'fig', 'Banana', 'cherry']
+        tree = type(self.tree)(key=lambda word: word.lower(), reverse=True)
+        for word in words:
+            tree.insert(word)
+        self.assertEqual(list(tree), ['pear', 'fig', 'cherry', 'Banana', 'Apple'])
+        self.assertEqual(list(tree.irange('g', 'b')), ['fig', 'cherry', 'Banana'])
+        self.assertEqual(tree.search('apple').item, 'Apple')
+
+
+class PurePythonRedBlackTree(RedBlackTree):
+    """RedBlackTree kept on the pure-Python path even with _red_black built"""
+    def __init__(self, create_node=None, profiler=None, collect_stats=False, key=None, reverse=False):
+        if create_node is None:
+            create_node = Node if key is None else KeyedNode
+        RedBlackTree.__init__(self, create_node, profiler, collect_stats, key, reverse)
+
+
+class TestPurePythonRedBlackTree(TestRedBlackTree):
+    """Runs every RedBlackTree test on pure-Python nodes; with the
+    _red_black extension built, TestRedBlackTree covers the native core"""
+    def setUp(self):
+        self.tree = PurePythonRedBlackTree()
+
+    def test_pure_python_path(self):
+        self.assertIsNone(self.tree._core)
+
+
+@skipIf(NativeNode is None, "_red_black extension is not built")
+class TestNativeCore(TestCase):
+    def shape(self, tree):
+        """Keys and colors in pre-order, nil as None"""
+        shape = []
+        stack = [tree.root]
+        while stack:
+            node = stack.pop()
+            if node is tree.nil:
+                shape.append(None)
+            else:
+                shape.append((node.key, node.red))
+                stack.extend((node.right, node.left))
+        return shape
+
+    def test_default_trees_are_native(self):
+        self.assertIsNotNone(RedBlackTree()._core)
+        self.assertIsInstance(RedBlackTree().nil, NativeNode)
+        self.assertIsNone(OrderStatisticTree()._core)
+
+        class Overriding(RedBlackTree):
+            def left_rotate(self, x):
+                RedBlackTree.left_rotate(self, x)
+
+        self.assertIsNone(Overriding()._core)
+
+    def test_same_shapes_as_pure_python(self):
+        native = RedBlackTree()
+        python = PurePythonRedBlackTree()
+        for _ in range(3000):
+            key = random.randint(0, 300)
+            if random.random() < 0.6:
+                native.insert(key)
+                python.insert(key)
+            else:
+                self.assertEqual(native.delete_key(key), python.delete_key(key))
+        self.assertEqual(self.shape(native), self.shape(python))
+        self.assertEqual(native.stats()['black_height'], python.stats()['black_height'])
+        self.assertEqual(list(native), list(python))
+        self.assertEqual(list(reversed(native)), list(reversed(python)))
+
+    def test_comparison_errors_propagate(self):
+        tree = RedBlackTree()
+        for i in range(10):
+            tree.insert(i)
+        self.assertRaises(TypeError, tree.insert, 'a')
+        self.assertRaises(TypeError, tree.search, 'a')
+        self.assertEqual(list(tree), list(range(10)))
+        self.assertEqual(len(tree), 10)
+
+    def test_mixed_key_types_compare_like_python(self):
+        tree = RedBlackTree()
+        keys = [2 ** 70, -2 ** 70, 1.5, 3, -0.5, 2 ** 62, float('inf')]
+        for key in keys:
+            tree.insert(key)
+        self.assertEqual(list(tree), sorted(keys))
+        self.assertEqual(tree.search(3.0).key, 3)
+        nan = float('nan')
+        tree.insert(nan)
+        self.assertIs(tree.search(nan), tree.nil)
+
+    def test_comparisons_that_delete_nodes(self):
+        """The core holds the nodes it compares against, so a comparison
+        deleting one (and dropping its last reference) cannot crash it"""
+        class Probe(object):
+            def __init__(self, tree, key):
+                self.tree = tree
+                self.key = key
+                self.victim = tree.root.left.key
+
+            def _delete_victim(self, other):
+                if other == self.victim and self.victim is not None:
+                    self.victim = None
+                    self.tree.delete_key(other)
+
+            def __eq__(self, other):
+                self._delete_victim(other)
+                return self.key == other
+
+            def __lt__(self, other):
+                self._delete_victim(other)
+                return self.key < other
+
+            def __gt__(self, other):
+                return self.key > other
+
+            __hash__ = None
+
+        for operation in ('search', 'insert'):
+            tree = RedBlackTree()
+            for i in range(15):
+                tree.insert(i)
+            probe = Probe(tree, 0)
+            victim = probe.victim
+            getattr(tree, operation)(probe)
+            gc.collect()
+            self.assertIsNone(probe.victim)
+            self.assertEqual([key for key in tree if key is not probe],
+                             [i for i in range(15) if i != victim])
+
+    def test_batches_go_through_the_core_and_keep_nodes(self):
+        tree = RedBlackTree.from_sorted(range(10, 20))
+        held = tree.search(15)
+        tree.maximum()
+        tree.minimum()
+        self.assertEqual(tree.insert_many(list(range(30, 20, -1)) + [5, 40]), 12)
+        self.assertIs(tree.search(15), held)
+        self.assertEqual((tree._min.key, tree._max.key), (5, 40))
+        self.assertEqual(tree.delete_many(range(0, 50, 2)), 11)
+        self.assertIs(tree.search(15), held)
+        self.assertEqual((tree._min.key, tree._max.key), (5, 29))
+        self.assertEqual(len(tree), 11)
+        self.assertEqual(tree.stats()['black_height'], tree.black_height(tree.root) - 1)
+
+    def test_batched_bounds_match_python_descents(self):
+        tree = RedBlackTree.from_iterable(random.randint(0, 100) for _ in range(300))
+        probes = sorted(random.randint(-5, 105) for _ in range(200))
+        nil = tree.nil
+        self.assertEqual(tree.floor_many(iter(probes)),
+                         [tree._upper_bound(probe) if tree._upper_bound(probe) is not nil else None
+                          for probe in probes])
+        self.assertEqual(tree.ceiling_many(tuple(probes)),
+                         [tree._lower_bound(probe) if tree._lower_bound(probe) is not nil else None
+                          for probe in probes])
+        self.assertRaises(TypeError, tree.floor_many, [1, 'a'])
+        self.assertRaises(TypeError, tree.ceiling_many, ['a'])
+
+    def test_multiset_insert_returns_the_present_node(self):
+        tree = MultisetTree()
+        for key in [4, 6, 2]:
+            tree.insert(key)
+        node = tree.search(4)
+        references = sys.getrefcount(node)
+        for _ in range(100):
+            self.assertIs(tree.insert(4), node)
+        self.assertEqual(sys.getrefcount(node), references)
+        self.assertEqual(tree.count(4), 101)
+        self.assertEqual(tree.number_of_nodes, 3)
+
+    def test_links_must_be_nodes(self):
+        node = NativeNode(1)
+        self.assertIsNone(node.left)
+        node.left = NativeNode(0)
+        node.left = None
+        self.assertRaises(TypeError, setattr, node, 'left', 0)
+        self.assertRaises(AttributeError, delattr, node, 'key')
+
+    def test_nodes_are_collected(self):
+        def count():
+            gc.collect()
+            return sum(1 for o in gc.get_objects() if isinstance(o, NativeNode))
+
+        before = count()
+        tree = RedBlackTree()
+        for i in range(100):
+            tree.insert(i)
+        for i in range(50):
+            tree.delete_key(i)
+        self.assertEqual(count(), before + 50)
+        del tree
+        self.assertEqual(count(), before)
+
+
+class TestOrderStatisticTree(TestRedBlackTree):
+    """Runs every RedBlackTree test against OrderStatisticTree too,
+    checking subtree sizes alongside the Red-Black properties"""
+    def assertRedBlack(self, tree):
+        keys = TestRedBlackTree.assertRedBlack(self, tree)
+        if isinstance(tree, OrderStatisticTree):
+            self.assertSizes(tree, tree.root)
+        return keys
+
+    def assertSizes(self, tree, node):
+        if node == tree.nil:
+            self.assertEqual(node.size, 0)
+            return 0
+        size = self.assertSizes(tree, node.left) + self.assertSizes(tree, node.right) + 1
+        self.assertEqual(node.size, size)
+        return size
+
+    def setUp(self):
+        self.tree = OrderStatisticTree()
+
+    def test_sizes_after_random_inserts_and_deletes(self):
+        tree = self.tree
+        expected = []
+        for _ in range(2000):
+            key = random.randint(0, 200)
+            if random.random() < 0.6:
+                tree.insert(key)
+                expected.append(key)
+            elif tree.delete_key(key):
+                expected.remove(key)
+        expected.sort()
+
+        self.assertEqual(self.assertRedBlack(tree), expected)
+        for k in range(len(expected)):
+            self.assertEqual(tree.select(k).key, expected[k])
+        self.assertEqual(tree.select(-1).key, expected[-1])
+        for key in range(-1, 202, 7):
+            self.assertEqual(tree.rank(key), len([i for i in expected if i < key]))
+            for width in [0, 3, 50]:
+                self.assertEqual(tree.count_range(key, key + width),
+                                 len([i for i in expected if key <= i <= key + width]))
+
+    def test_batches_and_bulk_load_keep_sizes(self):
+        tree = OrderStatisticTree.from_iterable([random.randint(0, 100) for _ in range(300)])
+        self.assertRedBlack(tree)
+        tree.insert_many(range(20))
+        tree.insert_many(range(0, 1000, 3))
+        tree.delete_many(range(0, 50))
+        tree.delete_many(range(0, 1000, 2))
+        keys = self.assertRedBlack(tree)
+
+        self.assertEqual(tree.rank(500), len([i for i in keys if i < 500]))
+
+    def test_select_out_of_range(self):
+        tree = self.tree
+        self.assertRaises(IndexError, tree.select, 0)
+        tree.insert(1)
+        self.assertRaises(IndexError, tree.select, 1)
+        self.assertRaises(IndexError, tree.select, -2)
+        self.assertEqual(tree.count_range(2, 1), 0)
+
+
+class TestMultisetTree(TestCase):
+    def assertMultiset(self, tree, counts):
+        """Check the tree against counts, a {key: count} dict"""
+        self.assertNotEqual(tree.black_height(tree.root), 0)
+        self.assertEqual(list(tree.counts()), sorted(counts.items(), reverse=tree.reverse))
+        expected = sorted((key for key in counts for _ in range(counts[key])), reverse=tree.reverse)
+        self.assertEqual(list(tree), expected)
+        self.assertEqual(list(reversed(tree)), expected[::-1])
+        self.assertEqual(len(tree), len(expected))
+        self.assertEqual(tree.number_of_nodes, len(counts))
+
+    def test_duplicates_share_a_node(self):
+        tree = MultisetTree()
+        for key in [3, 1, 3, 3, 2, 1]:
+            tree.insert(key)
+        self.assertEqual(tree.count(3), 3)
+        self.assertEqual(tree.count(1), 2)
+        self.assertEqual(tree.count(4), 0)
+        self.assertMultiset(tree, {1: 2, 2: 1, 3: 3})
+        self.assertEqual(list(tree.irange(2, 3)), [2, 3, 3, 3])
+
+        root = tree.root
+        tree.insert(root.key)
+        self.assertIs(tree.root, root)
+        self.assertEqual(tree.number_of_nodes, 3)
+
+    def test_insert_is_one_descent(self):
+        tree = MultisetTree(collect_stats=True)
+        for key in [3, 1, 3, 3, 2, 1]:
+            self.assertEqual(tree.insert(key).key, key)
+        self.assertEqual(tree.stats()['descents'], 6)
+        self.assertIs(tree.insert(3), tree.search(3))
+        self.assertMultiset(tree, {1: 2, 2: 1, 3: 4})
+
+    def test_delete_key_removes_one_copy(self):
+        tree = MultisetTree()
+        for key in [5, 5, 7]:
+            tree.insert(key)
+        self.assertTrue(tree.delete_key(5))
+        self.assertMultiset(tree, {5: 1, 7: 1})
+        self.assertTrue(tree.delete_key(5))
+        self.assertFalse(tree.delete_key(5))
+        self.assertMultiset(tree, {7: 1})
+        tree[7] = 'seven'
+        tree.insert(7)
+        self.assertEqual(tree.pop(7), 'seven')
+        self.assertEqual(tree.count(7), 1)
+
+    def test_random_inserts_and_deletes(self):
+        for create_node in (None, CountedNode):
+            tree = MultisetTree(create_node=create_node)
+            counts = {}
+            for _ in range(3000):
+                key = int(random.paretovariate(1.2)) % 100
+                if random.random() < 0.6:
+                    tree.insert(key)
+                    counts[key] = counts.get(key, 0) + 1
+                elif tree.delete_key(key):
+                    counts[key] -= 1
+                    if not counts[key]:
+                        del counts[key]
+            self.assertMultiset(tree, counts)
+
+    def test_batches_and_bulk_load(self):
+        keys = [random.randint(0, 30) for _ in range(500)]
+        tree = MultisetTree.from_iterable(keys)
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        self.assertMultiset(tree, counts)
+
+        self.assertEqual(tree.insert_many([40, 40, 3, 3, 3]), 5)
+        counts[40] = 2
+        counts[3] = counts.get(3, 0) + 3
+        self.assertEqual(tree.delete_many([40, 3, 3, 99]), 3)
+        counts[40] = 1
+        counts[3] -= 2
+        self.assertMultiset(tree, counts)
+
+        tree.insert_many([50] * 1000)
+        counts[50] = 1000
+        self.assertMultiset(tree, counts)
+        self.assertEqual(tree.delete_many([50] * 2000), 1000)
+        del counts[50]
+        self.assertMultiset(tree, counts)
+
+    def test_rebuild_keeps_values(self):
+        tree = MultisetTree()
+        tree[1] = 'a'
+        tree.insert(1)
+        tree[3] = 'c'
+        self.assertEqual(tree.insert_many([2, 2, 4, 5, 6]), 5)
+        self.assertMultiset(tree, {1: 2, 2: 2, 3: 1, 4: 1, 5: 1, 6: 1})
+        self.assertEqual((tree[1], tree[2], tree[3]), ('a', None, 'c'))
+
+    def test_pickle_keeps_counts_and_values(self):
+        tree = MultisetTree.from_iterable([3, 1, 3, 2, 3])
+        tree[2] = 'two'
+        clone = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(list(clone.counts()), [(1, 1), (2, 1), (3, 3)])
+        self.assertEqual(len(clone), 5)
+        self.assertEqual(clone[2], 'two')
+
+    def test_split_and_join_keep_counts(self):
+        tree = MultisetTree.from_sorted([1, 1, 2, 4, 4, 4])
+        right = tree.split(2, inclusive=True)
+        self.assertMultiset(tree, {1: 2, 2: 1})
+        self.assertMultiset(right, {4: 3})
+        tree.join(3, right)
+        self.assertMultiset(tree, {1: 2, 2: 1, 3: 1, 4: 3})
+        self.assertEqual(len(right), 0)
+
+    def test_reverse(self):
+        tree = MultisetTree.from_iterable([1, 3, 3, 2], reverse=True)
+        self.assertMultiset(tree, {1: 1, 2: 1, 3: 2})
+        self.assertEqual(list(tree.irange(3, 2)), [3, 3, 2])
+
+    def test_pop_min_removes_one_copy(self):
+        tree = MultisetTree.from_iterable([2, 1, 1])
+        self.assertEqual(tree.pop_min(), (1, None))
+        self.assertMultiset(tree, {1: 1, 2: 1})
+        self.assertEqual(tree.pop_min(), (1, None))
+        self.assertEqual(tree.pop_max(), (2, None))
+        self.assertEqual(len(tree), 0)
+
+    def test_rejects_key_function(self):
+        self.assertRaises(ValueError, MultisetTree, key=abs)
@@ -0,0 +1,109 @@
+import random
+from unittest import TestCase
+from red_black_array import ArrayRedBlackTree, NIL
+
+class TestArrayRedBlackTree(TestCase):
+    def assertRedBlack(self, tree):
+        """Check parent links, key order and the Red-Black properties,
+        returning the keys of the tree in order"""
+        keys = []
+
+        def walk(node, parent):
+            if node == NIL:
+                return 1
+            self.assertEqual(tree.parent[node], parent)
+            if tree.red[node]:
+                self.assertFalse(tree.red[tree.left[node]])
+                self.assertFalse(tree.red[tree.right[node]])
+            left_black_height = walk(tree.left[node], node)
+            keys.append(tree.key[node])
+            right_black_height = walk(tree.right[node], node)
+            self.assertEqual(left_black_height, right_black_height)
+            return left_black_height + (0 if tree.red[node] else 1)
+
+        self.assertFalse(tree.red[tree.root])
+        walk(tree.root, NIL)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(keys), tree.number_of_nodes)
+        return keys
+
+    def setUp(self):
+        self.tree = ArrayRedBlackTree()
+
+    def test_insert_one_key(self):
+        tree = self.tree
+        tree.insert(5)
+        self.assertEqual(tree.key[tree.root], 5)
+        self.assertFalse(tree.red[tree.root])
+
+    def test_insert_in_order_and_reverse_order(self):
+        tree = self.tree
+        for i in range(100):
+            tree.insert(i)
+        for i in range(200, 100, -1):
+            tree.insert(i)
+
+        self.assertEqual(self.assertRedBlack(tree), list(range(100)) + list(range(101, 201)))
+        self.assertNotEqual(0, tree.black_height(tree.root))
+
+    def test_search_minimum_maximum(self):
+        tree = self.tree
+        self.assertIsNone(tree.minimum())
+        self.assertIsNone(tree.maximum())
+        self.assertEqual(tree.search(1), tree.nil)
+
+        for i in [3, 7, 2, 9, 8, 5]:
+            tree.insert(i)
+
+        self.assertEqual(tree.key[tree.search(8)], 8)
+        self.assertEqual(tree.search(4), tree.nil)
+        self.assertEqual(tree.key[tree.minimum()], 2)
+        self.assertEqual(tree.key[tree.maximum()], 9)
+        self.assertIn(5, tree)
+
+    def test_delete_key(self):
+        tree = self.tree
+        self.assertFalse(tree.delete_key(1))
+        tree.insert(1)
+        self.assertTrue(tree.delete_key(1))
+        self.assertEqual(tree.root, tree.nil)
+        self.assertEqual(tree.number_of_nodes, 0)
+
+    def test_random_inserts_and_deletes_keep_invariants(self):
+        tree = self.tree
+        keys = list(range(500))
+        random.shuffle(keys)
+        for i in keys:
+            tree.insert(i)
+        self.assertEqual(self.assertRedBlack(tree), list(range(500)))
+
+        random.shuffle(keys)
+        for i in keys[:300]:
+            self.assertTrue(tree.delete_key(i))
+        self.assertEqual(self.assertRedBlack(tree), sorted(keys[300:]))
+
+    def test_deleted_slots_are_reused(self):
+        tree = ArrayRedBlackTree('l')
+        for i in range(50):
+            tree.insert(i)
+        capacity = len(tree.key)
+
+        for i in range(0, 50, 2):
+            tree.delete_key(i)
+        for i in range(100, 125):
+            tree.insert(i)
+
+        self.assertEqual(len(tree.key), capacity)
+        self.assertEqual(self.assertRedBlack(tree), list(range(1, 50, 2)) + list(range(100, 125)))
+
+    def test_snapshot_is_independent(self):
+        tree = self.tree
+        for i in range(20):
+            tree.insert(i)
+
+        snapshot = tree.snapshot()
+        for i in range(10):
+            tree.delete_key(i)
+
+        self.assertEqual(self.assertRedBlack(snapshot), list(range(20)))
+        self.assertEqual(self.assertRedBlack(tree), list(range(10, 20)))
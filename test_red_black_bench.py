@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+import red_black_bench
+
+class TestBench(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_orders_are_permutations(self):
+        for order in red_black_bench.ORDERS:
+            keys = red_black_bench.key_order(order, 101, red_black_bench.random.Random(0))
+            self.assertEqual(sorted(keys), list(range(101)))
+        self.assertEqual(red_black_bench.key_order('adversarial', 5, None), [0, 4, 1, 3, 2])
+
+    def test_every_workload_reports_a_row(self):
+        rows = red_black_bench.run(['RedBlackTree', 'OrderStatisticTree'], list(red_black_bench.WORKLOADS),
+                                   ['random'], [200], repeat=1)
+        self.assertEqual(len(rows), 2 * len(red_black_bench.WORKLOADS))
+        for row in rows:
+            self.assertEqual(set(row), set(red_black_bench.FIELDS))
+            self.assertTrue(row['ops_per_sec'] > 0)
+            if row['workload'] == 'iterate':
+                self.assertIsNone(row['p50_us'])
+            else:
+                self.assertTrue(row['p50_us'] <= row['p99_us'])
+            if row['workload'] in ('search', 'iterate'):
+                self.assertEqual(row['rotations_per_op'], 0)
+            if row['workload'] == 'insert':
+                self.assertTrue(row['rotations_per_op'] > 0)
+
+    def test_output_formats_and_baseline(self):
+        json_path = os.path.join(self.directory, 'run.json')
+        csv_path = os.path.join(self.directory, 'run.csv')
+        arguments = ['--sizes', '100', '--repeat', '1', '--workloads', 'insert', '--orders', 'sequential']
+        self.assertEqual(red_black_bench.main(arguments + ['--format', 'json', '--output', json_path]), 0)
+        self.assertEqual(red_black_bench.main(arguments + ['--format', 'csv', '--output', csv_path]), 0)
+        with open(json_path) as f:
+            self.assertEqual(len(json.load(f)['results']), 1)
+        self.assertEqual(red_black_bench.load_results(csv_path)[0]['n'], 100)
+
+        baseline = red_black_bench.load_results(json_path)
+        self.assertEqual(red_black_bench.main(arguments + ['--format', 'csv', '--output', csv_path,
+                                                           '--baseline', json_path, '--threshold', '0.99']), 0)
+        faster = [dict(row, ops_per_sec=row['ops_per_sec'] * 100) for row in baseline]
+        comparisons = red_black_bench.compare(baseline, faster)
+        self.assertEqual(len(comparisons), 1)
+        self.assertTrue(comparisons[0][3])
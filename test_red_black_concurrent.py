@@ -0,0 +1,149 @@
+import random
+import threading
+from unittest import TestCase
+from red_black import RedBlackTree
+from red_black_concurrent import ConcurrentRedBlackTree, ReadWriteLock
+
+class TestReadWriteLock(TestCase):
+    def test_readers_share_and_writers_exclude(self):
+        lock = ReadWriteLock()
+        lock.acquire_read()
+        lock.acquire_read()
+
+        acquired = []
+        writer = threading.Thread(target=lambda: (lock.acquire_write(), acquired.append(True)))
+        writer.start()
+        writer.join(0.05)
+        self.assertEqual(acquired, [])
+
+        lock.release_read()
+        lock.release_read()
+        writer.join(1)
+        self.assertEqual(acquired, [True])
+        lock.release_write()
+
+
+class TestConcurrentRedBlackTree(TestCase):
+    def setUp(self):
+        self.tree = ConcurrentRedBlackTree()
+
+    def test_map_and_set_operations(self):
+        tree = self.tree
+        tree.insert(2)
+        tree[1] = 'a'
+        self.assertIn(1, tree)
+        self.assertEqual(tree[1], 'a')
+        self.assertEqual(tree.get(3), None)
+        self.assertEqual(list(tree), [1, 2])
+        self.assertEqual(tree.irange(2, 5), [2])
+        self.assertEqual(tree.floor(5).key, 2)
+        self.assertTrue(tree.delete_key(2))
+        self.assertEqual(tree.pop(1), 'a')
+        self.assertEqual(len(tree), 0)
+
+    def test_lookup_falls_back_to_lock_while_writing(self):
+        tree = self.tree
+        tree.insert(1)
+        tree.version += 1
+        self.assertIn(1, tree)
+        self.assertEqual(tree.get(2, 'x'), 'x')
+        self.assertRaises(KeyError, tree.__getitem__, 2)
+        tree.version += 1
+
+    def test_lookups_leave_the_extreme_cache_to_writers(self):
+        underlying = RedBlackTree.from_sorted(range(10))
+        tree = ConcurrentRedBlackTree(underlying)
+        self.assertEqual(tree.minimum().key, 0)
+        self.assertEqual(tree.maximum().key, 9)
+        self.assertIsNone(underlying._min)
+        self.assertIsNone(underlying._max)
+        tree.insert(10)
+        self.assertEqual(underlying._min.key, 0)
+        self.assertEqual(underlying._max.key, 10)
+        self.assertEqual(tree.maximum().key, 10)
+
+        reverse = ConcurrentRedBlackTree(reverse=True)
+        reverse.insert_many([3, 1, 2])
+        self.assertEqual((reverse.minimum().key, reverse.maximum().key), (3, 1))
+
+    def test_lookups_retry_torn_native_searches(self):
+        tree = self.tree
+        tree.insert_many([1, 2, 3])
+        self.assertEqual(tree._core_search is None, tree.tree._core is None)
+        calls = []
+
+        def torn_search(root, nil, key):
+            """Each first descent races a writer that comes and goes"""
+            calls.append(key)
+            if len(calls) % 2:
+                tree.version += 2
+                raise AttributeError("torn")
+            return tree.tree._descend(key, root)
+
+        tree._core_search = torn_search
+        self.assertEqual(tree.search(2).key, 2)
+        self.assertEqual(tree.get(3), None)
+        self.assertNotIn(4, tree)
+        self.assertEqual(calls, [2, 2, 3, 3, 4, 4])
+
+    def test_len_waits_for_writers(self):
+        self.tree.insert_many([1, 2])
+        lengths = []
+        with self.tree.write_locked() as raw:
+            reader = threading.Thread(target=lambda: lengths.append(len(self.tree)))
+            reader.start()
+            reader.join(0.05)
+            self.assertEqual(lengths, [])
+            raw.insert(3)
+        reader.join(1)
+        self.assertEqual(lengths, [3])
+
+    def test_rejects_collect_stats_trees(self):
+        self.assertRaises(ValueError, ConcurrentRedBlackTree, RedBlackTree(collect_stats=True))
+
+    def test_stress_readers_against_writers(self):
+        tree = self.tree
+        tree.insert_many(range(0, 2000, 2))
+        failures = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                keys = tree.irange(random.randint(0, 1000), 2000)
+                if keys != sorted(keys):
+                    failures.append("unsorted scan")
+                with tree.read_locked() as raw:
+                    if raw.black_height(raw.root) == 0:
+                        failures.append("unbalanced")
+                    if raw.number_of_nodes != sum(1 for _ in raw):
+                        failures.append("count mismatch")
+                key = random.randint(0, 2000)
+                node = tree.search(key)
+                if node is not tree.tree.nil and node.key != key:
+                    failures.append("wrong node")
+                floor = tree.floor(key)
+                if floor is not None and floor.key > key:
+                    failures.append("wrong floor")
+
+        def writer(seed):
+            rng = random.Random(seed)
+            for _ in range(1500):
+                key = rng.randint(0, 2000)
+                if rng.random() < 0.5:
+                    tree.insert(key)
+                else:
+                    tree.delete_key(key)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(2)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        self.assertNotEqual(tree.black_height(), 0)
+        self.assertEqual(tree.keys(), sorted(tree.keys()))
@@ -0,0 +1,111 @@
+import random
+from unittest import TestCase
+from red_black_expiry import ExpiryIndex
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestExpiryIndex(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def assertIndex(self, index):
+        """Check the deadline tree against the entries"""
+        tree = index.tree
+        self.assertEqual(len(tree), len(index))
+        self.assertNotEqual(tree.black_height(tree.root), 0)
+        deadlines = [(index.deadline(key), key) for key in tree.values()]
+        self.assertEqual(deadlines, sorted(deadlines, key=lambda pair: pair[0]))
+        self.assertEqual(sorted(key for _, key in deadlines), sorted(index._entries))
+
+    def test_set_get_and_expire(self):
+        index = ExpiryIndex(ttl=10, timer=self.clock)
+        index.set('a', 1)
+        index.set('b', 2, ttl=5)
+        index.set('c', 3, ttl=20)
+        self.assertEqual(index.get('a'), 1)
+        self.clock.now = 5
+        self.assertIsNone(index.get('b'))
+        self.assertFalse('b' in index)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.expire(), [('b', 2)])
+        self.assertEqual(index.expire(), [])
+        self.assertEqual(index.expire(now=10), [('a', 1)])
+        self.assertTrue('c' in index)
+        self.assertEqual(len(index), 1)
+        self.assertIndex(index)
+
+    def test_touch_and_reset_rekey_entries(self):
+        index = ExpiryIndex(ttl=10, timer=self.clock)
+        index.set('a', 1)
+        index.set('b', 2)
+        self.clock.now = 8
+        self.assertTrue(index.touch('a'))
+        self.assertEqual(index.deadline('a'), 18)
+        self.assertTrue(index.touch('b', ttl=1))
+        self.assertFalse(index.touch('missing'))
+        index.set('b', 'two', ttl=30)
+        self.assertEqual(index.expire(now=20), [('a', 1)])
+        self.assertEqual(index.get('b'), 'two')
+        self.assertTrue(index.delete('b'))
+        self.assertFalse(index.delete('b'))
+        self.assertEqual(len(index), 0)
+        self.assertIndex(index)
+
+    def test_random_operations_match_a_dict(self):
+        index = ExpiryIndex(timer=self.clock)
+        deadlines = {}
+        for _ in range(3000):
+            self.clock.now += random.random()
+            key = random.randint(0, 200)
+            operation = random.random()
+            if operation < 0.5:
+                ttl = random.randint(1, 50)
+                index.set(key, key, ttl)
+                deadlines[key] = self.clock.now + ttl
+            elif operation < 0.7:
+                if key in deadlines and self.clock.now < deadlines[key]:
+                    self.assertTrue(index.touch(key, 10))
+                    deadlines[key] = self.clock.now + 10
+                else:
+                    self.assertFalse(index.touch(key, 10))
+            elif operation < 0.8:
+                self.assertEqual(index.delete(key), deadlines.pop(key, None) is not None)
+            elif operation < 0.9:
+                expected = sorted((d, k) for k, d in deadlines.items() if d <= self.clock.now)
+                expired = index.expire()
+                self.assertEqual(sorted(key for key, _ in expired), sorted(k for _, k in expected))
+                for _, key in expected:
+                    del deadlines[key]
+            self.assertEqual(len(index), len(deadlines))
+        self.assertIndex(index)
+
+    def test_maxsize_evicts_earliest_deadline(self):
+        index = ExpiryIndex(ttl=100, maxsize=3, timer=self.clock)
+        for i, key in enumerate('abcd'):
+            self.clock.now = i
+            index.set(key, i)
+        self.assertEqual(sorted(index._entries), ['b', 'c', 'd'])
+        index.set('b', 'again')
+        self.assertEqual(len(index), 3)
+
+    def test_lru_mode(self):
+        index = ExpiryIndex(ttl=100, maxsize=3, lru=True, timer=self.clock)
+        for i, key in enumerate('abc'):
+            self.clock.now = i
+            index.set(key, i)
+        self.clock.now = 3
+        self.assertEqual(index.get('a'), 0)
+        self.clock.now = 4
+        index.set('d', 4)
+        self.assertEqual(sorted(index._entries), ['a', 'c', 'd'])
+        self.assertEqual(index.deadline('a'), 103)
+        self.assertIndex(index)
+
+    def test_ttl_is_required(self):
+        index = ExpiryIndex(timer=self.clock)
+        self.assertRaises(ValueError, index.set, 'a', 1)
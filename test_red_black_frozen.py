@@ -0,0 +1,74 @@
+import bisect
+import random
+from unittest import TestCase, skipIf
+from red_black import MultisetTree, RedBlackTree
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+@skipIf(np is None, "needs NumPy")
+class TestFrozenTree(TestCase):
+    def assertMasked(self, result, expected):
+        """Compare a masked array to a list with None where masked"""
+        mask = np.ma.getmaskarray(result)
+        self.assertEqual([None if m else v for v, m in zip(result.data.tolist(), mask)], expected)
+
+    def assertFrozen(self, frozen, keys):
+        """Check every query against bisect on the sorted keys"""
+        keys = sorted(keys)
+        self.assertEqual(frozen.keys.tolist(), keys)
+        probes = list(range(-2, 2 * len(keys) + 3))
+        array = np.array(probes)
+        self.assertEqual(frozen.rank(array).tolist(), [bisect.bisect_left(keys, p) for p in probes])
+        self.assertEqual(frozen.contains(array).tolist(), [p in keys for p in probes])
+        self.assertMasked(frozen.floor(array), [keys[bisect.bisect_right(keys, p) - 1]
+                                                if bisect.bisect_right(keys, p) else None
+                                                for p in probes])
+        self.assertMasked(frozen.ceiling(array), [keys[bisect.bisect_left(keys, p)]
+                                                  if bisect.bisect_left(keys, p) < len(keys) else None
+                                                  for p in probes])
+        lo = np.array([random.randint(-2, 2 * len(keys)) for _ in probes])
+        hi = lo + np.array([random.randint(-3, 10) for _ in probes])
+        self.assertEqual(frozen.count_range(lo, hi).tolist(),
+                         [max(bisect.bisect_right(keys, h) - bisect.bisect_left(keys, l), 0)
+                          for l, h in zip(lo.tolist(), hi.tolist())])
+
+    def test_queries_match_bisect(self):
+        for n in [0, 1, 2, 3, 7, 8, 9, 100, 1000]:
+            keys = [random.randint(0, 2 * n) for _ in range(n)]
+            tree = RedBlackTree.from_iterable(keys)
+            for eytzinger in (False, True):
+                self.assertFrozen(tree.freeze(eytzinger), keys)
+
+    def test_scalar_probes_and_dtype(self):
+        tree = RedBlackTree.from_iterable([1, 3, 5])
+        for eytzinger in (False, True):
+            frozen = tree.freeze(eytzinger, dtype=np.float64)
+            self.assertEqual(frozen.keys.dtype, np.float64)
+            self.assertTrue(frozen.contains(3))
+            self.assertEqual(frozen.rank(4), 2)
+            self.assertEqual(frozen.floor(4.5), 3)
+            self.assertTrue(np.ma.is_masked(frozen.ceiling(6)))
+
+    def test_string_keys(self):
+        keys = ['pear', 'apple', 'fig', 'kiwi']
+        tree = RedBlackTree.from_iterable(keys)
+        for eytzinger in (False, True):
+            frozen = tree.freeze(eytzinger)
+            self.assertEqual(frozen.contains(['fig', 'grape']).tolist(), [True, False])
+            self.assertEqual(frozen.ceiling(['grape']).tolist(), ['kiwi'])
+
+    def test_snapshot_ignores_later_updates(self):
+        tree = RedBlackTree.from_iterable(range(10))
+        frozen = tree.freeze()
+        tree.insert(20)
+        tree.delete_key(0)
+        self.assertEqual(frozen.contains([0, 20]).tolist(), [True, False])
+        self.assertEqual(tree.freeze(True).contains([0, 20]).tolist(), [False, True])
+
+    def test_reverse_and_multiset_trees(self):
+        keys = [random.randint(0, 30) for _ in range(200)]
+        self.assertFrozen(RedBlackTree.from_iterable(keys, reverse=True).freeze(), keys)
+        self.assertFrozen(MultisetTree.from_iterable(keys).freeze(True), keys)
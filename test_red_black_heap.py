@@ -0,0 +1,56 @@
+import heapq
+import random
+from unittest import TestCase
+import red_black_heap
+from red_black_heap import RedBlackHeap
+
+class TestRedBlackHeap(TestCase):
+    def test_matches_heapq(self):
+        heap = RedBlackHeap()
+        reference = []
+        for _ in range(3000):
+            item = random.randint(0, 200)
+            operation = random.random()
+            if operation < 0.5 or not reference:
+                red_black_heap.heappush(heap, item)
+                heapq.heappush(reference, item)
+            elif operation < 0.7:
+                self.assertEqual(red_black_heap.heappop(heap), heapq.heappop(reference))
+            elif operation < 0.85:
+                self.assertEqual(red_black_heap.heappushpop(heap, item), heapq.heappushpop(reference, item))
+            else:
+                self.assertEqual(red_black_heap.heapreplace(heap, item), heapq.heapreplace(reference, item))
+            self.assertEqual(len(heap), len(reference))
+            if reference:
+                self.assertEqual(heap[0], reference[0])
+        self.assertEqual(list(heap), sorted(reference))
+        self.assertEqual(heap.nsmallest(5), heapq.nsmallest(5, reference))
+        self.assertEqual(heap.nlargest(5), heapq.nlargest(5, reference))
+
+    def test_empty_heap(self):
+        heap = RedBlackHeap()
+        self.assertFalse(heap)
+        self.assertRaises(IndexError, red_black_heap.heappop, heap)
+        self.assertRaises(IndexError, red_black_heap.heapreplace, heap, 1)
+        self.assertRaises(IndexError, lambda: heap[0])
+        self.assertEqual(red_black_heap.heappushpop(heap, 1), 1)
+        self.assertFalse(heap)
+
+    def test_scheduler_with_key(self):
+        tasks = [(3.0, 'c'), (1.0, 'a'), (2.0, 'b1'), (2.0, 'b2'), (5.0, 'e')]
+        heap = RedBlackHeap(tasks, key=lambda task: task[0])
+        self.assertEqual(heap.peek(), (1.0, 'a'))
+        self.assertEqual(heap.peek_max(), (5.0, 'e'))
+        self.assertTrue(heap.remove(3.0))
+        self.assertFalse(heap.remove(4.0))
+        heap.push((2.0, 'b3'))
+        order = []
+        while heap:
+            order.append(heap.pop()[1])
+        self.assertEqual(order, ['a', 'b1', 'b2', 'b3', 'e'])
+
+    def test_only_index_zero(self):
+        heap = RedBlackHeap([3, 1, 2])
+        self.assertEqual(heap[0], 1)
+        self.assertRaises(IndexError, lambda: heap[1])
+        self.assertEqual(heap.pop_max(), 3)
@@ -0,0 +1,140 @@
+import random
+from unittest import TestCase
+from red_black_interval import IntervalTree
+
+class TestIntervalTree(TestCase):
+    def assertIntervalTree(self, tree):
+        """Check colors, black heights, order and every max_end, returning
+        the intervals in order"""
+        nil = tree.nil
+
+        def check(node, parent):
+            if node is nil:
+                return 1, None
+            self.assertIs(node.parent, parent)
+            if node.red:
+                self.assertFalse(node.left.red)
+                self.assertFalse(node.right.red)
+            left_height, left_max = check(node.left, node)
+            right_height, right_max = check(node.right, node)
+            self.assertEqual(left_height, right_height)
+            self.assertEqual(node.max_end, max(e for e in (node.end, left_max, right_max) if e is not None))
+            return left_height + (0 if node.red else 1), node.max_end
+
+        self.assertFalse(tree.root.red)
+        check(tree.root, nil)
+        intervals = list(tree)
+        self.assertEqual([s for s, _ in intervals], sorted(s for s, _ in intervals))
+        self.assertEqual(len(intervals), len(tree))
+        return intervals
+
+    def assertOverlaps(self, tree, intervals, probes=200):
+        for _ in range(probes):
+            lo = random.randint(-10, 1010)
+            hi = lo + random.choice([0, 0, 1, 10, 100])
+            expected = sorted(i for i in intervals if i[0] <= hi and lo <= i[1])
+            self.assertEqual(sorted(tree.overlap_range(lo, hi)), expected)
+            expected = sorted(i for i in intervals if i[0] <= lo <= i[1])
+            self.assertEqual(sorted(tree.overlap(lo)), expected)
+
+    def random_interval(self):
+        start = random.randint(0, 1000)
+        return start, start + random.choice([0, 1, 5, 20, 100, 500])
+
+    def test_overlap_matches_brute_force(self):
+        tree = IntervalTree()
+        intervals = []
+        for _ in range(3000):
+            if intervals and random.random() < 0.4:
+                interval = random.choice(intervals)
+                self.assertTrue(tree.delete_interval(interval))
+                intervals.remove(interval)
+            else:
+                interval = self.random_interval()
+                tree.insert(interval)
+                intervals.append(interval)
+        self.assertEqual(sorted(self.assertIntervalTree(tree)), sorted(intervals))
+        self.assertOverlaps(tree, intervals)
+
+    def test_delete_key_and_delete_many(self):
+        intervals = [self.random_interval() for _ in range(500)]
+        tree = IntervalTree.from_iterable(intervals)
+        for interval in intervals[:100]:
+            self.assertTrue(tree.delete_key(interval[0]))
+        starts = [start for start, _ in intervals[100:300]]
+        self.assertEqual(tree.delete_many(starts), 200)
+        remaining = self.assertIntervalTree(tree)
+        self.assertEqual(len(remaining), 200)
+        self.assertOverlaps(tree, remaining)
+
+    def test_bulk_load(self):
+        for n in [0, 1, 2, 7, 100, 1000]:
+            intervals = [self.random_interval() for _ in range(n)]
+            tree = IntervalTree.from_iterable(intervals)
+            self.assertEqual(self.assertIntervalTree(tree), sorted(intervals))
+            self.assertOverlaps(tree, intervals, probes=20)
+        tree.insert_many([(5, 2000), (6, 6)])
+        intervals += [(5, 2000), (6, 6)]
+        self.assertIntervalTree(tree)
+        self.assertOverlaps(tree, intervals)
+
+    def test_split_and_join(self):
+        intervals = sorted(self.random_interval() for _ in range(400))
+        tree = IntervalTree.from_sorted(intervals)
+        right = tree.split(500)
+        left_intervals = self.assertIntervalTree(tree)
+        right_intervals = self.assertIntervalTree(right)
+        self.assertEqual(sorted(left_intervals + right_intervals), intervals)
+        self.assertOverlaps(tree, left_intervals, probes=50)
+
+        tree.join((500, 10 ** 4), right)
+        intervals.append((500, 10 ** 4))
+        self.assertEqual(sorted(self.assertIntervalTree(tree)), sorted(intervals))
+        self.assertOverlaps(tree, intervals, probes=50)
+
+    def test_queries_yield_in_start_order(self):
+        tree = IntervalTree.from_iterable([(1, 10), (2, 3), (4, 8), (9, 9), (12, 15)])
+        self.assertEqual(list(tree.overlap(3)), [(1, 10), (2, 3)])
+        self.assertEqual(list(tree.overlap_range(8, 12)), [(1, 10), (4, 8), (9, 9), (12, 15)])
+        self.assertEqual(list(tree.overlap(11)), [])
+        self.assertEqual(list(tree.irange(2, 9)), [(2, 3), (4, 8), (9, 9)])
+        self.assertEqual(list(reversed(tree))[0], (12, 15))
+        self.assertEqual(tree.search(4).end, 8)
+        self.assertEqual(tree.pop_min(), ((1, 10), None))
+        self.assertEqual(tree.pop_max(), ((12, 15), None))
+        self.assertIntervalTree(tree)
+
+    def test_values_and_non_numeric_endpoints(self):
+        tree = IntervalTree()
+        tree.insert(('2024-01-01', '2024-03-31'))
+        tree.insert(('2024-02-15', '2024-02-20'))
+        tree.search('2024-02-15').value = 'holiday'
+        self.assertEqual(list(tree.overlap('2024-02-16')),
+                         [('2024-01-01', '2024-03-31'), ('2024-02-15', '2024-02-20')])
+        self.assertEqual(list(tree.items())[1], (('2024-02-15', '2024-02-20'), 'holiday'))
+        self.assertFalse(tree.delete_interval(('2024-02-15', '2024-02-21')))
+
+    def test_assignment_maps_exact_intervals(self):
+        tree = IntervalTree()
+        tree.insert((1, 5))
+        tree[(1, 9)] = 'wide'
+        tree[(1, 5)] = 'narrow'
+        self.assertEqual(tree.setdefault((1, 9), 'other'), 'wide')
+        self.assertEqual(tree.setdefault((2, 3)), None)
+        self.assertEqual(list(tree.items()), [((1, 5), 'narrow'), ((1, 9), 'wide'), ((2, 3), None)])
+        self.assertEqual(len(tree), 3)
+        self.assertIntervalTree(tree)
+        for key in [5, (1, 2, 3), None]:
+            with self.assertRaises(TypeError) as raised:
+                tree[key] = 'x'
+            self.assertIn('(start, end) pairs', str(raised.exception))
+        self.assertRaises(TypeError, tree.insert, 5)
+        self.assertEqual(len(tree), 3)
+
+    def test_rejects_bad_intervals_and_orders(self):
+        tree = IntervalTree()
+        self.assertRaises(ValueError, tree.insert, (5, 4))
+        self.assertEqual(len(tree), 0)
+        self.assertRaises(ValueError, IntervalTree, reverse=True)
+        self.assertRaises(ValueError, IntervalTree, key=abs)
+        self.assertIsNone(tree._core)
@@ -0,0 +1,102 @@
+import os
+import random
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from red_black import MultisetTree, OrderStatisticTree, RedBlackTree
+from red_black_io import HEADER, MappedTree, dump, load, load_keys
+
+class TestSerialization(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tree.rbt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_of_each_codec(self):
+        for keys in [sorted(set(random.randint(-10 ** 12, 10 ** 12) for _ in range(1000))),
+                     sorted(random.random() for _ in range(1000)),
+                     sorted(u'k{}\xe9'.format(i) for i in range(1000)),
+                     sorted(b'k' + str(i).encode('ascii') for i in range(1000)),
+                     []]:
+            dump(RedBlackTree.from_sorted(keys), self.path)
+            self.assertEqual(load_keys(self.path), keys)
+            tree = load(self.path)
+            self.assertEqual(list(tree), keys)
+            self.assertEqual(len(tree), len(keys))
+            self.assertNotEqual(tree.black_height(tree.root), 0)
+
+    def test_load_into_other_tree_types(self):
+        dump(RedBlackTree.from_sorted(range(100)), self.path)
+        tree = load(self.path, OrderStatisticTree)
+        self.assertEqual(tree.select(42).key, 42)
+        tree.insert(1000)
+        self.assertEqual(tree.rank(1000), 100)
+
+    def test_multiset_round_trip_keeps_counts(self):
+        for keys in [[random.randint(0, 20) for _ in range(500)],
+                     [u'b', u'a', u'b', u'c', u'b']]:
+            dump(MultisetTree.from_iterable(keys), self.path)
+            self.assertEqual(load_keys(self.path), sorted(keys))
+            tree = load(self.path, MultisetTree)
+            self.assertEqual(list(tree), sorted(keys))
+            self.assertEqual(list(tree.counts()),
+                             sorted((key, keys.count(key)) for key in set(keys)))
+            with MappedTree(self.path) as mapped:
+                self.assertEqual(len(mapped), len(keys))
+
+    def test_rejects_foreign_and_truncated_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a tree at all, not at all')
+        self.assertRaises(ValueError, load_keys, self.path)
+
+        dump(RedBlackTree.from_sorted(range(100)), self.path)
+        with open(self.path, 'rb+') as f:
+            f.truncate(100)
+        self.assertRaises(ValueError, load_keys, self.path)
+
+    def test_failed_dump_keeps_the_previous_file(self):
+        dump(RedBlackTree.from_sorted(range(10)), self.path)
+        tree = RedBlackTree.from_sorted([1, 2, 2 ** 70])
+        self.assertRaises(struct.error, dump, tree, self.path)
+        self.assertEqual(load_keys(self.path), list(range(10)))
+        self.assertEqual(os.listdir(self.directory), ['tree.rbt'])
+
+    def test_rejects_unsorted_keys(self):
+        dump(RedBlackTree.from_sorted([1, 2, 3]), self.path)
+        with open(self.path, 'rb+') as f:
+            f.seek(HEADER.size)
+            f.write(struct.pack('<3q', 3, 1, 2))
+        self.assertRaises(ValueError, load_keys, self.path)
+        self.assertRaises(ValueError, load, self.path)
+
+    def test_mapped_tree_queries(self):
+        keys = list(range(0, 200, 2))
+        dump(RedBlackTree.from_sorted(keys), self.path)
+        with MappedTree(self.path) as mapped:
+            self.assertEqual(len(mapped), 100)
+            self.assertEqual(list(mapped), keys)
+            self.assertIn(42, mapped)
+            self.assertNotIn(43, mapped)
+            self.assertEqual(mapped.search(42), 21)
+            self.assertEqual(mapped.floor(43), 42)
+            self.assertEqual(mapped.ceiling(43), 44)
+            self.assertIsNone(mapped.floor(-1))
+            self.assertIsNone(mapped.ceiling(199))
+            tree = RedBlackTree.from_sorted(keys)
+            for lo, hi in [(None, None), (10, 20), (11, 19), (-5, 3), (190, 500)]:
+                for inclusive in [(True, True), (False, False), (True, False)]:
+                    for reverse in [False, True]:
+                        self.assertEqual(list(mapped.irange(lo, hi, inclusive, reverse)),
+                                         list(tree.irange(lo, hi, inclusive, reverse)))
+
+    def test_mapped_tree_of_strings(self):
+        keys = sorted(u'key {}'.format(i) for i in range(50))
+        dump(RedBlackTree.from_sorted(keys), self.path)
+        with MappedTree(self.path) as mapped:
+            self.assertEqual(list(mapped), keys)
+            self.assertIn(u'key 7', mapped)
+            self.assertEqual(list(mapped.irange(u'key 1', u'key 2')),
+                             [k for k in keys if u'key 1' <= k <= u'key 2'])
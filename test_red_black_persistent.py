@@ -0,0 +1,96 @@
+import random
+from unittest import TestCase
+from red_black_persistent import PersistentRedBlackTree
+
+class TestPersistentRedBlackTree(TestCase):
+    def assertRedBlack(self, tree):
+        """Check colors, black heights and order, return the keys"""
+        def check(node):
+            if node is None:
+                return 1
+            if node.red:
+                self.assertFalse(node.left is not None and node.left.red)
+                self.assertFalse(node.right is not None and node.right.red)
+            left = check(node.left)
+            self.assertEqual(left, check(node.right))
+            return left if node.red else left + 1
+
+        if tree.root is not None:
+            self.assertFalse(tree.root.red)
+        check(tree.root)
+        keys = list(tree)
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertEqual(len(keys), len(tree))
+        return keys
+
+    def test_random_inserts_and_deletes_against_a_set(self):
+        rng = random.Random(12)
+        tree = PersistentRedBlackTree()
+        expected = set()
+        for _ in range(3000):
+            key = rng.randint(0, 300)
+            if rng.random() < 0.55:
+                tree = tree.insert(key)
+                expected.add(key)
+            else:
+                tree = tree.delete_key(key)
+                expected.discard(key)
+        self.assertEqual(self.assertRedBlack(tree), sorted(expected))
+
+        while expected:
+            key = expected.pop()
+            tree = tree.delete_key(key)
+            self.assertRedBlack(tree)
+        self.assertIsNone(tree.root)
+
+    def test_old_versions_are_unchanged(self):
+        versions = [PersistentRedBlackTree()]
+        for key in range(50):
+            versions.append(versions[-1].insert(key))
+        for key in range(0, 50, 3):
+            versions.append(versions[-1].delete_key(key))
+
+        for i in range(51):
+            self.assertEqual(self.assertRedBlack(versions[i]), list(range(i)))
+        self.assertEqual(list(versions[-1]), [k for k in range(50) if k % 3])
+
+    def test_insert_shares_untouched_nodes(self):
+        tree = PersistentRedBlackTree.from_sorted(range(1023))
+        newer = tree.insert(2000)
+        self.assertIs(tree.root.left, newer.root.left)
+
+    def test_insert_replaces_value(self):
+        tree = PersistentRedBlackTree().insert(1, 'a')
+        newer = tree.insert(1, 'b')
+        self.assertEqual(len(newer), 1)
+        self.assertEqual(tree.get(1), 'a')
+        self.assertEqual(newer.get(1), 'b')
+        self.assertIs(newer.delete_key(5), newer)
+
+    def test_from_sorted(self):
+        for n in range(40):
+            self.assertEqual(self.assertRedBlack(PersistentRedBlackTree.from_sorted(range(n))), list(range(n)))
+        self.assertRaises(ValueError, PersistentRedBlackTree.from_sorted, [1, 1])
+
+    def test_queries(self):
+        tree = PersistentRedBlackTree.from_sorted(range(0, 20, 2))
+        self.assertIn(4, tree)
+        self.assertNotIn(5, tree)
+        self.assertEqual(tree.minimum().key, 0)
+        self.assertEqual(tree.maximum().key, 18)
+        self.assertIsNone(PersistentRedBlackTree().minimum())
+        self.assertEqual(list(reversed(tree)), list(range(18, -1, -2)))
+        self.assertEqual(list(tree.items())[0], (0, None))
+        self.assertNotEqual(tree.black_height(), 0)
+
+    def test_irange_against_slices(self):
+        keys = list(range(0, 40, 2))
+        tree = PersistentRedBlackTree.from_sorted(keys)
+        for lo in (None, -1, 0, 7, 8, 39, 41):
+            for hi in (None, -1, 8, 9, 38, 50):
+                for inclusive in ((True, True), (True, False), (False, True), (False, False)):
+                    expected = [k for k in keys
+                                if (lo is None or k > lo or (inclusive[0] and k == lo))
+                                and (hi is None or k < hi or (inclusive[1] and k == hi))]
+                    self.assertEqual(list(tree.irange(lo, hi, inclusive)), expected)
+                    self.assertEqual(list(tree.irange(lo, hi, inclusive, reverse=True)), expected[::-1])
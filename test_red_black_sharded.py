@@ -0,0 +1,134 @@
+import random
+from unittest import TestCase
+from red_black_sharded import Shard, ShardedRedBlackTree
+
+class Unsortable(object):
+    """Orders against ints, but not against its own kind"""
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        if isinstance(other, Unsortable):
+            raise TypeError("unorderable")
+        return self.key < other
+
+    def __gt__(self, other):
+        return self.key > other
+
+class TestShardedRedBlackTree(TestCase):
+    def assertShards(self, tree, keys):
+        """Check the contents and that every shard keeps to its range"""
+        self.assertEqual(list(tree), sorted(keys))
+        self.assertEqual(len(tree), len(keys))
+        self.assertEqual(tree.boundaries, sorted(set(tree.boundaries)))
+        self.assertEqual(len(tree.shards), len(tree.boundaries) + 1)
+        bounds = [None] + tree.boundaries + [None]
+        for shard, lo, hi in zip(tree.shards, bounds, bounds[1:]):
+            for key in shard.call('irange', None, None, (True, True)):
+                self.assertTrue(lo is None or not key < lo)
+                self.assertTrue(hi is None or key < hi)
+
+    def test_routing_and_batches(self):
+        keys = [random.randint(0, 10 ** 4) for _ in range(2000)]
+        with ShardedRedBlackTree.from_iterable(keys, shards=4) as tree:
+            self.assertEqual(len(tree.shards), 4)
+            self.assertShards(tree, keys)
+            for size in tree.shard_sizes():
+                self.assertTrue(400 < size < 600)
+
+            probes = [random.randint(-10, 10 ** 4 + 10) for _ in range(500)]
+            present = set(keys)
+            self.assertEqual(tree.search_many(probes), [probe in present for probe in probes])
+            self.assertEqual(tree.get_many(probes[:10], 'missing'),
+                             [None if probe in present else 'missing' for probe in probes[:10]])
+            for lo, hi in [(None, None), (100, 5000), (5000, 100), (0, 0), (9000, None)]:
+                expected = [k for k in sorted(keys)
+                            if (lo is None or lo <= k) and (hi is None or k <= hi)]
+                self.assertEqual(tree.irange(lo, hi), expected)
+            self.assertEqual(tree.irange(100, 5000, (False, False)),
+                             [k for k in sorted(keys) if 100 < k < 5000])
+
+            for _ in range(300):
+                key = random.randint(0, 10 ** 4)
+                if random.random() < 0.5:
+                    tree.insert(key)
+                    keys.append(key)
+                elif tree.delete_key(key):
+                    keys.remove(key)
+                self.assertEqual(tree.search(key), key in keys)
+            batch = [random.randint(0, 10 ** 4) for _ in range(300)]
+            self.assertEqual(tree.insert_many(batch), 300)
+            removed = tree.delete_many(keys[:200])
+            self.assertEqual(removed, 200)
+            self.assertShards(tree, keys[200:] + batch)
+
+    def test_values(self):
+        with ShardedRedBlackTree([10, 20]) as tree:
+            for key in [5, 15, 25]:
+                tree[key] = str(key)
+            self.assertEqual(tree[15], '15')
+            self.assertEqual(tree.get(16), None)
+            self.assertRaises(KeyError, lambda: tree[16])
+            self.assertEqual(list(tree.items()), [(5, '5'), (15, '15'), (25, '25')])
+            self.assertEqual(tree.shard_sizes(), [1, 1, 1])
+
+    def test_rebalance_splits_hot_and_merges_cold_shards(self):
+        keys = list(range(0, 4000, 2))
+        with ShardedRedBlackTree.from_iterable(keys, shards=4, max_shards=8) as tree:
+            for _ in range(2000):
+                key = random.randint(0, 999)
+                self.assertEqual(tree.search(key), key % 2 == 0)
+            for key in range(3000, 3010):
+                tree.search(key)
+            changes = tree.rebalance()
+            self.assertTrue(changes >= 2)
+            self.assertTrue(len(tree.boundaries) >= 2)
+            self.assertTrue(tree.boundaries[0] < 1000)
+            self.assertTrue(tree.boundaries[-1] < 2000)
+            self.assertShards(tree, keys)
+
+            tree.insert(3999)
+            keys.append(3999)
+            self.assertShards(tree, keys)
+
+    def test_automatic_rebalance(self):
+        with ShardedRedBlackTree.from_iterable(range(1000), shards=4, rebalance_every=100,
+                                               max_shards=8) as tree:
+            self.assertEqual(tree.boundaries, [250, 500, 750])
+            for key in range(100):
+                tree.search(key % 10)
+            self.assertEqual(tree.operations, 0)
+            self.assertEqual(tree.boundaries, [125, 250])
+            # Split and joined shards count their keys right after updates
+            tree.insert(1000)
+            tree.delete_key(0)
+            self.assertEqual(len(tree), 1000)
+            self.assertShards(tree, list(range(1, 1001)))
+
+    def test_empty_and_duplicate_keys(self):
+        with ShardedRedBlackTree.from_iterable([], shards=3) as tree:
+            self.assertEqual(len(tree.shards), 1)
+            self.assertEqual(tree.irange(), [])
+            self.assertEqual(tree.rebalance(), 0)
+        keys = [7] * 50 + [8] * 50
+        with ShardedRedBlackTree.from_iterable(keys, shards=4) as tree:
+            self.assertEqual(tree.boundaries, [8])
+            self.assertShards(tree, keys)
+
+    def test_failed_batch_leaves_the_tree_usable(self):
+        with ShardedRedBlackTree([100]) as tree:
+            tree.insert_many([1, 2, 150])
+            self.assertRaises(TypeError, tree.insert_many, [Unsortable(200), Unsortable(300), 5])
+            self.assertTrue(tree.search(1))
+            self.assertFalse(tree.search(7))
+            self.assertEqual(tree.shard_sizes(), [3, 1])
+            self.assertShards(tree, [1, 2, 5, 150])
+
+    def test_worker_errors_propagate(self):
+        shard = Shard([1, 2], [None, None])
+        try:
+            self.assertRaises(KeyError, shard.call, 'no such operation')
+            self.assertEqual(shard.call('len'), 2)
+        finally:
+            shard.close()
+        self.assertFalse(shard.process.is_alive())
@@ -0,0 +1,95 @@
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+from red_black import OrderStatisticTree
+from red_black_wal import DurableRedBlackTree
+
+class TestDurableRedBlackTree(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def apply_random_operations(self, tree, count, seed=0):
+        rng = random.Random(seed)
+        expected = []
+        for _ in range(count):
+            key = rng.randint(0, 100)
+            if rng.random() < 0.6:
+                tree.insert(key)
+                expected.append(key)
+            elif tree.delete_key(key):
+                expected.remove(key)
+        return sorted(expected)
+
+    def test_reopen_replays_log(self):
+        for sync in ['always', 'interval', 'never']:
+            directory = os.path.join(self.directory, sync)
+            with DurableRedBlackTree(directory, sync=sync) as tree:
+                expected = self.apply_random_operations(tree, 500)
+            with DurableRedBlackTree(directory, sync=sync) as tree:
+                self.assertEqual(list(tree), expected)
+                self.assertEqual(len(tree), len(expected))
+
+    def test_checkpoints_bound_the_log(self):
+        with DurableRedBlackTree(self.directory, checkpoint_every=100) as tree:
+            expected = self.apply_random_operations(tree, 1000)
+            self.assertTrue(tree.generation > 1)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        with DurableRedBlackTree(self.directory, create_tree=OrderStatisticTree) as tree:
+            self.assertEqual(list(tree), expected)
+            self.assertEqual(tree.tree.rank(50), len([k for k in expected if k < 50]))
+            tree.checkpoint()
+            tree.insert(7)
+        with DurableRedBlackTree(self.directory) as tree:
+            self.assertEqual(list(tree), sorted(expected + [7]))
+
+    def test_recovery_from_truncated_log(self):
+        tree = DurableRedBlackTree(self.directory, sync='always')
+        for key in range(10):
+            tree.insert(key)
+        # Crash without close, tearing the last record in half
+        log = tree._path('log', tree.generation)
+        size = os.path.getsize(log)
+        with open(log, 'rb+') as f:
+            f.truncate(size - 3)
+
+        with DurableRedBlackTree(self.directory, sync='always') as recovered:
+            self.assertEqual(list(recovered), list(range(9)))
+            recovered.insert(100)
+        with DurableRedBlackTree(self.directory) as recovered:
+            self.assertEqual(list(recovered), list(range(9)) + [100])
+
+    def test_corrupt_record_ends_replay(self):
+        with DurableRedBlackTree(self.directory) as tree:
+            for key in [u'a', u'b', u'c']:
+                tree.insert(key)
+            log = tree._path('log', tree.generation)
+        with open(log, 'rb+') as f:
+            data = bytearray(f.read())
+            data[-1] ^= 0xff
+            f.seek(0)
+            f.write(bytes(data))
+
+        with DurableRedBlackTree(self.directory) as tree:
+            self.assertEqual(list(tree), [u'a', u'b'])
+
+    def test_interrupted_checkpoint_is_ignored(self):
+        with DurableRedBlackTree(self.directory) as tree:
+            tree.insert(1)
+            tree.checkpoint()
+            tree.insert(2)
+            generation = tree.generation
+        with open(os.path.join(self.directory, 'checkpoint.{}.tmp'.format(generation + 1)), 'wb') as f:
+            f.write(b'half a checkpoint')
+
+        with DurableRedBlackTree(self.directory) as tree:
+            self.assertEqual(list(tree), [1, 2])
+        self.assertFalse([entry for entry in os.listdir(self.directory) if entry.endswith('.tmp')])
+
+    def test_rejects_unknown_sync_policy(self):
+        self.assertRaises(ValueError, DurableRedBlackTree, self.directory, sync='sometimes')